@@ -2,7 +2,8 @@ import type { VercelRequest, VercelResponse } from "@vercel/node";
 import { getDestinationBySlug, getDestinationByCode, getDestinationsByCountrySlug } from "../_lib/destinationRegistry.js";
 import { buildDestinationPageVM } from "../_lib/buildDestinationPageVM.js";
 import { fetchFlightDeals, fetchMonthlyPriceTrend } from "../_lib/flightDataFetcher.js";
-import type { Deal } from "../_lib/destination.js";
+import { getCached } from "../_lib/cache.js";
+import type { Deal, PriceMonthDatum } from "../_lib/destination.js";
 
 const COUNTRY_MAJOR_AIRPORTS: Record<string, string[]> = {
   vietnam: ["HAN", "SGN", "DAD"],
@@ -51,6 +52,20 @@ function mergeCountryDealsByMonth(fetchResults: Array<{ data: Record<string, Dea
   return merged;
 }
 
+/**
+ * Landing payload the flight bot publishes to the shared store as
+ * bot:dest:<IATA code or country slug> (scripts/flight_bot/destinations.py).
+ * Prices are USD, like flight_data.json.
+ */
+interface BotDestinationPayload {
+  byOrigin?: Record<string, Record<string, Deal[]>>;
+  priceMonths?: PriceMonthDatum[];
+}
+
+async function loadBotDestination(key: string): Promise<BotDestinationPayload | null> {
+  return (await getCached(`bot:dest:${key}`)) as BotDestinationPayload | null;
+}
+
 async function fetchCountryDeals(originCode: string, countrySlug: string): Promise<{
   deals: Record<string, Deal[]>;
   isLive: boolean;
@@ -112,11 +127,12 @@ export default async function handler(req: any, res: any) {
       : staticRecord.origin;
 
     const isCountry = staticRecord.type === "country";
-    const [countryCities, monthlyResult] = await Promise.all([
+    const [countryCities, monthlyResult, botPayload] = await Promise.all([
       isCountry
         ? fetchCountryDeals(safeOrigin.code, staticRecord.slug)
         : Promise.resolve({ deals: {}, isLive: false }),
       fetchMonthlyPriceTrend(safeOrigin.code, destCode),
+      loadBotDestination(isCountry ? staticRecord.slug : destCode),
     ]);
 
     let allDeals: Record<string, Deal[]> = countryCities.deals;
@@ -132,11 +148,17 @@ export default async function handler(req: any, res: any) {
     // Keep country city list hydration behavior unchanged by touching existing helper
     if (isCountry) getDestinationsByCountrySlug(staticRecord.dest.country ?? "");
 
+    // Bot aggregates stand in for what the live APIs did not return, before the static registry
+    const botDeals = botPayload?.byOrigin?.[safeOrigin.code];
+    const useBotDeals = Object.keys(allDeals).length === 0 && !!botDeals && Object.keys(botDeals).length > 0;
+    if (useBotDeals && botDeals) allDeals = botDeals;
+    const priceMonths = monthlyResult.data ?? (botPayload?.priceMonths?.length ? botPayload.priceMonths : null);
+
     const mergedRecord = {
       ...staticRecord,
       origin: safeOrigin,
       deals: Object.keys(allDeals).length > 0 ? allDeals : staticRecord.deals,
-      ...(monthlyResult.data ? { priceMonths: monthlyResult.data } : {}),
+      ...(priceMonths ? { priceMonths } : {}),
     };
 
     const liveState = isLive ? "live" : "static";
@@ -144,7 +166,7 @@ export default async function handler(req: any, res: any) {
     const vm = buildDestinationPageVM(mergedRecord, {
       liveState,
       lastUpdated: new Date().toISOString(),
-      sourceLabel: liveState === "live" ? "Travelpayouts API" : "Static registry",
+      sourceLabel: liveState === "live" ? "Travelpayouts API" : useBotDeals ? "Flight bot data" : "Static registry",
     });
 
     console.log("[DL success] Returning VM for:", targetSlug);
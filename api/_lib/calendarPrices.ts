@@ -17,6 +17,16 @@ type BotRoute = {
     flight_num?: string;
 };
 
+type BotRouteCalendar = {
+    calendar?: Record<string, {
+        price: number;
+        airline_code?: string;
+        airline?: string;
+        transfers?: number;
+        flight_number?: string;
+    }>;
+};
+
 async function fetchAmadeusCalendarPrices(
     origin: string,
     destination: string,
@@ -142,6 +152,29 @@ async function loadBotRoutes(): Promise<BotRoute[]> {
     return [];
 }
 
+/**
+ * Bot fares of one route. The flight bot publishes each route's calendar to the
+ * shared store as bot:route:ORIG-DEST (scripts/flight_bot/cachepublish.py);
+ * flight_data.json is the fallback when the key is missing.
+ */
+async function loadBotRouteFares(origin: string, destination: string): Promise<BotRoute[]> {
+    const published = (await getCached(`bot:route:${origin}-${destination}`)) as BotRouteCalendar | null;
+    if (published?.calendar) {
+        return Object.entries(published.calendar).map(([date, e]) => ({
+            origin,
+            destination,
+            date,
+            price: e.price,
+            airline_code: e.airline_code,
+            airline: e.airline,
+            transfers: e.transfers,
+            flight_num: e.flight_number,
+        }));
+    }
+    const routes = await loadBotRoutes();
+    return routes.filter((r) => r.origin === origin && r.destination === destination);
+}
+
 export async function handleCalendarPrices(
     req: any,
     res: any,
@@ -215,9 +248,8 @@ export async function handleCalendarPrices(
         }
 
         // 2. Secondary Priority: Bot Data
-        const botRoutes = await loadBotRoutes();
+        const botRoutes = await loadBotRouteFares(orig, dest);
         for (const r of botRoutes) {
-            if (r.origin !== orig || r.destination !== dest) continue;
             const dateStr = r.date;
             if (dateStr && (dateStr.startsWith(mo) || dateStr.startsWith(nextMo))) {
                 addPrice(merged, dateStr, r.price || 0, {
@@ -27,18 +27,84 @@ type FlightData = {
   meta: Meta;
 };
 
+// Columnar flight_data.v2.json (scripts/flight_bot/writer.py encode_columnar):
+// one array per field, with airports/airlines/providers/regions/currencies as
+// indexes into `dict`, dates as day offsets from meta.base_date and
+// found_at (minutes) / fetchedAt (ms) as offsets from meta.base_time (unix s).
+type ColumnarData = {
+  meta: Meta & { schema: 2; base_date: string; base_time: number };
+  dict: {
+    airport: string[];
+    airline: ([string] | [string, string])[];
+    provider: string[];
+    region: string[];
+    currency: string[];
+  };
+  routes: {
+    origin: number[];
+    destination: number[];
+    date: number[];
+    price: number[];
+    airline: number[];
+    transfers: number[];
+    flight_number: string[];
+    found_at: (number | null)[];
+    fetchedAt: (number | null)[];
+    provider: number[];
+    region: number[];
+    currency: number[];
+    flags: number[];
+  };
+};
+
+const DAY_MS = 86_400_000;
+
+function decodeColumnar(data: ColumnarData): FlightData {
+  const { meta, dict, routes: cols } = data;
+  const baseDay = Date.parse(`${meta.base_date}T00:00:00Z`);
+  const baseMs = meta.base_time * 1000;
+  const routes: Deal[] = new Array(cols.price.length);
+  for (let i = 0; i < routes.length; i++) {
+    const [code, name] = dict.airline[cols.airline[i]];
+    const foundAt = cols.found_at[i];
+    const fetchedAt = cols.fetchedAt[i];
+    routes[i] = {
+      origin: dict.airport[cols.origin[i]],
+      destination: dict.airport[cols.destination[i]],
+      date: new Date(baseDay + cols.date[i] * DAY_MS).toISOString().slice(0, 10),
+      price: cols.price[i],
+      airline: name ?? code,
+      airline_code: code,
+      transfers: cols.transfers[i],
+      flight_number: cols.flight_number[i],
+      currency: dict.currency[cols.currency[i]],
+      // "YYYY-MM-DD HH:MM", as in flight_data.json
+      found_at: foundAt === null ? "" : new Date(baseMs + foundAt * 60_000).toISOString().slice(0, 16).replace("T", " "),
+      fetchedAt: fetchedAt === null ? 0 : baseMs + fetchedAt,
+      provider: dict.provider[cols.provider[i]],
+    };
+  }
+  return { routes, meta };
+}
+
 let cachedData: FlightData | null = null;
 let fetchPromise: Promise<FlightData> | null = null;
 
+function loadJson(url: string): Promise<any> {
+  return fetch(url, { cache: "no-store" }).then((res) => {
+    if (!res.ok) throw new Error(`Failed to load ${url}`);
+    return res.json();
+  });
+}
+
 function fetchFlightData(): Promise<FlightData> {
   if (cachedData) return Promise.resolve(cachedData);
   if (fetchPromise) return fetchPromise;
 
-  fetchPromise = fetch("/data/flight_data.json", { cache: "no-store" })
-    .then((res) => {
-      if (!res.ok) throw new Error("Failed to load flight_data.json");
-      return res.json();
-    })
+  // The compact v2 file first; flight_data.json while a deploy does not have it yet
+  fetchPromise = loadJson("/data/flight_data.v2.json")
+    .then((data) => (data?.meta?.schema === 2 ? decodeColumnar(data) : Promise.reject()))
+    .catch(() => loadJson("/data/flight_data.json"))
     .then((data) => {
       cachedData = {
         routes: data.routes || [],
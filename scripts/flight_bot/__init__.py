@@ -1,3 +1,14 @@
-from .bot import FlightBot
+"""
+Flight price bot. Submodules are imported on demand: ``import
+scripts.flight_bot`` is cheap, and ``FlightBot`` (which pulls in requests,
+NumPy and the whole pipeline) is only loaded when first accessed.
+"""
 
 __all__ = ["FlightBot"]
+
+
+def __getattr__(name):
+    if name == "FlightBot":
+        from .bot import FlightBot
+        return FlightBot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,53 @@
 """
 Entry point: python -m scripts.flight_bot
+
+    python -m scripts.flight_bot                 # single-process run
+    python -m scripts.flight_bot --shard 1/4     # one worker of a sharded run
+    python -m scripts.flight_bot --reduce        # merge the shard files
+    python -m scripts.flight_bot --daemon        # refresh continuously until SIGTERM
+    python -m scripts.flight_bot --import-report # cold import cost per module
+    python -m scripts.flight_bot --profile [DIR] # any run mode, with profiling artifacts
 """
+import argparse
 import logging
 import sys
+from contextlib import nullcontext
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-from .bot import FlightBot
+from .scheduler import parse_shard_spec
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m scripts.flight_bot")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--shard", type=parse_shard_spec, metavar="INDEX/COUNT",
+                      help="process only this zero-based shard of the task universe")
+    mode.add_argument("--reduce", action="store_true",
+                      help="merge shard partial files into flight_data.json")
+    mode.add_argument("--daemon", action="store_true",
+                      help="stay up, refresh route-months at the configured rate and publish periodically")
+    mode.add_argument("--import-report", action="store_true",
+                      help="print the cold import time of the bot's modules and exit")
+    parser.add_argument("--profile", nargs="?", const="", metavar="DIR",
+                        help="sample stacks and allocations per phase; reports go to DIR "
+                             "(default: a timestamped directory under artifacts/profile)")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    bot = FlightBot()
-    bot.run()
-    sys.exit(0)
+    args = parse_args()
+    if args.import_report:
+        from .importreport import import_report
+        print(import_report())
+        sys.exit(0)
+
+    from .profiling import profiled
+    with profiled(args.profile or None) if args.profile is not None else nullcontext():
+        from .bot import FlightBot
+        bot = FlightBot(shard=args.shard, daemon=args.daemon)
+        code = bot.reduce() if args.reduce else bot.run()
+    sys.exit(code)
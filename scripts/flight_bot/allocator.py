@@ -0,0 +1,187 @@
+"""
+Expected-value allocation of the Amadeus quota.
+
+Amadeus is too scarce to sample fixed days of the first few tasks, so it
+runs after the TravelPayouts phase, one call per (route, date), on the
+probes worth the most new coverage. Candidates come from the route-months
+this run fetched:
+
+    gap         a stretch of future days with no fresh TP fare. The probe
+                goes to its middle and is worth the gap length (at most
+                AMADEUS_GAP_MAX_DAYS), plus AMADEUS_STALE_VALUE if the stretch
+                still holds published fares that TP did not reconfirm
+    suspicious  a fresh fare below AMADEUS_SUSPICIOUS_RATIO of its
+                route-month median, worth AMADEUS_SUSPICIOUS_VALUE
+
+Every value is scaled by 1 + log1p(demand) of the route-month. Selection is
+greedy: a chosen gap splits into two halves that compete again. A
+route-month gets more than AMADEUS_MAX_DATES_PER_ROUTE_MONTH calls only if
+quota is left once every other candidate has been taken.
+"""
+import calendar
+import heapq
+import logging
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from statistics import median
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import (
+    AMADEUS_GAP_MAX_DAYS, AMADEUS_STALE_VALUE, AMADEUS_SUSPICIOUS_RATIO, AMADEUS_SUSPICIOUS_VALUE,
+    AMADEUS_MAX_DATES_PER_ROUTE_MONTH, AMADEUS_MIN_LEAD_DAYS,
+)
+from .demand import DemandTable
+from .models import FlightDeal, RouteTask
+
+logger = logging.getLogger(__name__)
+
+RouteMonth = Tuple[str, str, str]
+
+
+@dataclass
+class Probe:
+    task: RouteTask
+    day: date
+    value: float
+    reason: str                                  # "gap" | "stale" | "suspicious"
+    gap: Optional[Tuple[date, date]] = None      # Inclusive range the probe splits
+
+
+def _month_days(month: str, first: date) -> List[date]:
+    year, mon = map(int, month.split("-"))
+    last = calendar.monthrange(year, mon)[1]
+    return [d for d in (date(year, mon, day) for day in range(1, last + 1)) if d >= first]
+
+
+def _gaps(days: List[date], covered: Set[date]) -> List[Tuple[date, date]]:
+    """Runs of consecutive uncovered days, as inclusive (start, end) ranges."""
+    gaps, start = [], None
+    for day in days:
+        if day in covered:
+            if start is not None:
+                gaps.append((start, day - timedelta(days=1)))
+                start = None
+        elif start is None:
+            start = day
+    if start is not None:
+        gaps.append((start, days[-1]))
+    return gaps
+
+
+class AmadeusAllocator:
+    """Ranks (route, date) probes over the route-months of one run; see the module docstring."""
+
+    def __init__(self, demand: Optional[DemandTable] = None, today: Optional[date] = None):
+        self.demand = demand or DemandTable()
+        self.first_day = (today or datetime.utcnow().date()) + timedelta(days=AMADEUS_MIN_LEAD_DAYS)
+
+    def _scale(self, task: RouteTask) -> float:
+        return 1.0 + math.log1p(self.demand.weight(task.origin, task.destination, task.month))
+
+    def _gap_probe(self, task: RouteTask, gap: Tuple[date, date], stale: Set[date]) -> Probe:
+        start, end = gap
+        length = (end - start).days + 1
+        value = float(min(length, AMADEUS_GAP_MAX_DAYS))
+        has_stale = any(start <= d <= end for d in stale)
+        if has_stale:
+            value += AMADEUS_STALE_VALUE
+        mid = start + timedelta(days=(length - 1) // 2)
+        return Probe(task, mid, value * self._scale(task), "stale" if has_stale else "gap", gap)
+
+    def candidates(self, tasks: Iterable[RouteTask], fresh: Iterable[FlightDeal],
+                   published: Iterable[FlightDeal]) -> Tuple[List[Probe], Dict[RouteMonth, Set[date]]]:
+        """
+        Initial probes for ``tasks``, given the deals TP returned this run
+        (``fresh``) and the dataset (``published``). Also returns the stale
+        days per route-month, which later gap halves are valued against.
+        """
+        by_key: Dict[RouteMonth, RouteTask] = {}
+        for task in tasks:
+            by_key.setdefault((task.origin, task.destination, task.month), task)
+
+        fresh_prices: Dict[RouteMonth, Dict[date, float]] = defaultdict(dict)
+        for deal in fresh:
+            key = (deal.origin, deal.destination, deal.date[:7])
+            if key in by_key and not deal.is_estimated:
+                day = date.fromisoformat(deal.date)
+                prices = fresh_prices[key]
+                prices[day] = min(prices.get(day, deal.price), deal.price)
+
+        stale: Dict[RouteMonth, Set[date]] = defaultdict(set)
+        for deal in published:
+            key = (deal.origin, deal.destination, deal.date[:7])
+            if key in by_key and not deal.is_estimated:
+                day = date.fromisoformat(deal.date)
+                if day >= self.first_day and day not in fresh_prices.get(key, {}):
+                    stale[key].add(day)
+
+        probes: List[Probe] = []
+        for key, task in by_key.items():
+            days = _month_days(task.month, self.first_day)
+            if not days:
+                continue
+            prices = fresh_prices.get(key, {})
+            for gap in _gaps(days, set(prices)):
+                probes.append(self._gap_probe(task, gap, stale.get(key, set())))
+            if len(prices) >= 3:
+                cutoff = AMADEUS_SUSPICIOUS_RATIO * median(prices.values())
+                for day, price in prices.items():
+                    if price < cutoff and day >= self.first_day:
+                        probes.append(Probe(task, day, AMADEUS_SUSPICIOUS_VALUE * self._scale(task), "suspicious"))
+        return probes, stale
+
+    def plan(self, tasks: Iterable[RouteTask], fresh: Iterable[FlightDeal],
+             published: Iterable[FlightDeal], budget: int) -> List[RouteTask]:
+        """Up to ``budget`` single-date tasks, most valuable first."""
+        if budget <= 0:
+            return []
+        probes, stale = self.candidates(tasks, fresh, published)
+        heap = [(-p.value, n, p) for n, p in enumerate(probes)]
+        heapq.heapify(heap)
+        seq = len(heap)
+
+        chosen: List[Probe] = []
+        per_month: Counter = Counter()
+        taken: Set[Tuple[str, str, date]] = set()
+        over_cap: List[Tuple[float, int, Probe]] = []
+        while (heap or over_cap) and len(chosen) < budget:
+            if heap:
+                entry = heapq.heappop(heap)
+                _, _, probe = entry
+            else:
+                # Every route-month is at its cap: spend what is left on the best of the rest
+                _, _, probe = heapq.heappop(over_cap)
+                entry = None
+            task = probe.task
+            key = (task.origin, task.destination, task.month)
+            if (task.origin, task.destination, probe.day) in taken:
+                continue
+            if entry and per_month[key] >= AMADEUS_MAX_DATES_PER_ROUTE_MONTH:
+                heapq.heappush(over_cap, entry)
+                continue
+            chosen.append(probe)
+            per_month[key] += 1
+            taken.add((task.origin, task.destination, probe.day))
+            if probe.gap:
+                # The probe anchors the middle; each half of the gap is a smaller gap
+                start, end = probe.gap
+                for half in ((start, probe.day - timedelta(days=1)), (probe.day + timedelta(days=1), end)):
+                    if half[0] <= half[1]:
+                        split = self._gap_probe(task, half, stale.get(key, set()))
+                        heapq.heappush(heap, (-split.value, seq, split))
+                        seq += 1
+
+        reasons = Counter(p.reason for p in chosen)
+        if chosen:
+            logger.info(
+                f"Amadeus plan: {len(chosen)} calls over {len(per_month)} route-months "
+                f"({', '.join(f'{r}={n}' for r, n in sorted(reasons.items()))}) from {len(probes)} candidates"
+            )
+        return [
+            RouteTask(origin=p.task.origin, destination=p.task.destination, month=p.task.month,
+                      region=p.task.region, priority=p.task.priority, demand=p.task.demand,
+                      dates=[p.day.isoformat()])
+            for p in chosen
+        ]
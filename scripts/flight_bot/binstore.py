@@ -0,0 +1,265 @@
+"""
+Memory-mapped binary companion for flight_data.json.
+
+The companion is a local cache, not a published file: it lives in
+COMPANION_DIR (git-ignored, outside client/public) and is rebuilt whenever
+the JSON changes.
+
+Layout (little-endian):
+    header   80 bytes   magic, version, record size/count, section offsets,
+                        and the content hash of the JSON file it mirrors
+                        (its meta.content_hash, so a checkout that resets
+                        mtimes does not make it stale)
+    records  N * RECORD_DTYPE.itemsize fixed-width rows
+    strings  (M + 1) uint32 offsets followed by a UTF-8 blob
+
+Variable-length values (airline names, flight numbers, regions...) live in the
+string table and records hold their index, so the record section can be opened
+directly with ``numpy.memmap`` (or ``mmap`` + ``struct``) without parsing JSON.
+"""
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GTFBIN01"
+VERSION = 2
+
+# magic, version, record_size, count, records_offset, strings_offset,
+# strings_count, source content hash (raw SHA-256)
+HEADER = struct.Struct("<8sIIQQQQ32s")
+
+FLAG_AMADEUS = 1
+FLAG_ESTIMATED = 2
+
+RECORD_DTYPE = np.dtype([
+    ("origin", "S3"),
+    ("destination", "S3"),
+    ("date", "S10"),
+    ("airline_code", "S3"),
+    ("found_at", "S16"),
+    ("price", "<f8"),
+    ("fetchedAt", "<i8"),
+    ("transfers", "<i2"),
+    ("flags", "u1"),
+    ("airline", "<u4"),
+    ("flight_number", "<u4"),
+    ("provider", "<u4"),
+    ("region", "<u4"),
+    ("currency", "<u4"),
+])
+
+
+def companion_path(json_path: Path) -> Path:
+    """client/public/data/flight_data.json -> COMPANION_DIR/flight_data.bin"""
+    from .config import COMPANION_DIR
+    return Path(COMPANION_DIR) / f"{Path(json_path).stem}.bin"
+
+
+def _source_hash(json_path: Path) -> bytes:
+    """The JSON's meta.content_hash as raw bytes; all zeros when it has none."""
+    from .writer import stored_content_hash
+    digest = stored_content_hash(json_path)
+    return bytes.fromhex(digest) if digest else bytes(32)
+
+
+def write_binary_companion(routes: List[Dict], json_path: Path) -> Path:
+    """
+    Write the binary companion for ``routes``, the records of ``json_path``.
+    Must be called after the JSON has been written so the recorded
+    content hash lets readers detect a stale companion.
+    """
+    json_path = Path(json_path)
+    path = companion_path(json_path)
+
+    strings: List[str] = [""]
+    string_ids: Dict[str, int] = {"": 0}
+
+    def intern(value) -> int:
+        value = "" if value is None else str(value)
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    records = np.zeros(len(routes), dtype=RECORD_DTYPE)
+    if routes:
+        records["origin"] = [r["origin"] for r in routes]
+        records["destination"] = [r["destination"] for r in routes]
+        records["date"] = [r["date"] for r in routes]
+        records["airline_code"] = [(r.get("airline_code") or "")[:3] for r in routes]
+        records["found_at"] = [(r.get("found_at") or "")[:16] for r in routes]
+        records["price"] = [float(r["price"]) for r in routes]
+        records["fetchedAt"] = [int(r.get("fetchedAt") or 0) for r in routes]
+        records["transfers"] = [int(r.get("transfers") or 0) for r in routes]
+        records["flags"] = [
+            (FLAG_AMADEUS if r.get("is_amadeus") else 0) | (FLAG_ESTIMATED if r.get("is_estimated") else 0)
+            for r in routes
+        ]
+        records["flight_number"] = [intern(r.get("flight_number") or r.get("flight_num")) for r in routes]
+        for name in ("airline", "provider", "region", "currency"):
+            records[name] = [intern(r.get(name)) for r in routes]
+
+    blobs = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(blobs) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(b) for b in blobs])
+
+    records_offset = HEADER.size
+    strings_offset = records_offset + records.nbytes
+    header = HEADER.pack(
+        MAGIC, VERSION, RECORD_DTYPE.itemsize, len(records),
+        records_offset, strings_offset, len(strings),
+        _source_hash(json_path),
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".bin.tmp")
+    try:
+        with temp_path.open("wb") as f:
+            f.write(header)
+            f.write(records.tobytes())
+            f.write(offsets.tobytes())
+            f.write(b"".join(blobs))
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(path)
+    except Exception as e:
+        logger.error(f"Failed to write binary companion {path}: {e}")
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+    return path
+
+
+def companion_is_fresh(json_path: Path) -> bool:
+    """True if the companion of ``json_path`` exists and mirrors its current content (header read only)."""
+    try:
+        with companion_path(json_path).open("rb") as f:
+            head = f.read(HEADER.size)
+        magic, version, *_, source_hash = HEADER.unpack(head)
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and version == VERSION and source_hash == _source_hash(json_path) != bytes(32)
+
+
+class BinaryDeals:
+    """Read-only, memory-mapped view over a binary companion file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, record_size, count, records_offset,
+         strings_offset, strings_count, source_hash) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a v{VERSION} flight data companion")
+
+        self.source_hash = source_hash
+        self.records = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=count, offset=records_offset)
+        self._offsets = np.frombuffer(self._mm, dtype="<u4", count=strings_count + 1, offset=strings_offset)
+        self._blob_offset = strings_offset + self._offsets.nbytes
+        self._strings: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def string(self, idx: int) -> str:
+        value = self._strings.get(idx)
+        if value is None:
+            start = self._blob_offset + int(self._offsets[idx])
+            end = self._blob_offset + int(self._offsets[idx + 1])
+            value = self._strings[idx] = self._mm[start:end].decode("utf-8")
+        return value
+
+    def is_fresh_for(self, json_path: Path) -> bool:
+        """True if the companion was built from the current content of ``json_path``."""
+        current = _source_hash(json_path)
+        return current != bytes(32) and current == self.source_hash
+
+    def last_fetched_map(self) -> Dict[str, str]:
+        """Latest found_at per origin_destination_month, computed over the mapped columns."""
+        recs = self.records
+        if not len(recs):
+            return {}
+        keys = np.char.add(np.char.add(np.char.add(recs["origin"], b"_"), np.char.add(recs["destination"], b"_")),
+                           recs["date"].astype("S7"))
+        found = np.where(recs["found_at"] == b"", b"2000-01-01 00:00", recs["found_at"])
+        order = np.lexsort((found, keys))
+        keys, found = keys[order], found[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        return {k.decode("ascii"): v.decode("ascii") for k, v in zip(keys[last], found[last])}
+
+    def to_routes(self, min_date: Optional[str] = None) -> List[Dict]:
+        """Materialize route dicts, skipping rows dated before ``min_date`` without decoding them."""
+        recs = self.records
+        if min_date:
+            recs = recs[recs["date"] >= min_date.encode("ascii")]
+        return self._materialize(recs)
+
+    def routes_at(self, indices) -> List[Dict]:
+        """Materialize only the rows at ``indices`` (record positions), in that order."""
+        return self._materialize(self.records[np.asarray(indices, dtype=np.intp)])
+
+    def _materialize(self, recs: np.ndarray) -> List[Dict]:
+        string = self.string
+        routes = []
+        for (origin, destination, date, airline_code, found_at, price, fetched_at,
+             transfers, flags, airline, flight_number, provider, region, currency) in recs.tolist():
+            r = {
+                "origin": origin.decode("ascii"),
+                "destination": destination.decode("ascii"),
+                "price": price,
+                "date": date.decode("ascii"),
+                "airline": string(airline),
+                "airline_code": airline_code.decode("ascii"),
+                "transfers": transfers,
+                "found_at": found_at.decode("ascii"),
+            }
+            for name, idx in (("flight_number", flight_number), ("provider", provider),
+                              ("region", region), ("currency", currency)):
+                if idx:
+                    r[name] = string(idx)
+            if fetched_at:
+                r["fetchedAt"] = fetched_at
+            if flags & FLAG_AMADEUS:
+                r["is_amadeus"] = True
+            if flags & FLAG_ESTIMATED:
+                r["is_estimated"] = True
+            routes.append(r)
+        return routes
+
+    def close(self) -> None:
+        self.records = None
+        self._offsets = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # A caller still holds a view into the mapping; it is released with the last reference.
+            pass
+
+
+def open_companion(json_path: Path) -> Optional[BinaryDeals]:
+    """Open the companion for ``json_path`` if it exists and is not stale."""
+    path = companion_path(json_path)
+    if not path.exists():
+        return None
+    try:
+        deals = BinaryDeals(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable binary companion {path}: {e}")
+        return None
+    if not deals.is_fresh_for(json_path):
+        logger.info(f"Binary companion {path} is stale; falling back to JSON")
+        deals.close()
+        return None
+    return deals
@@ -0,0 +1,139 @@
+"""
+Per-provider circuit breaker.
+
+closed     calls go through; the outcome of the last BREAKER_WINDOW calls is
+           kept, and the circuit opens once their error rate reaches
+           BREAKER_ERROR_RATE (after BREAKER_MIN_CALLS calls) or after
+           BREAKER_CONSECUTIVE_TIMEOUTS timeouts in a row
+open       calls are refused without touching the network until the cooldown
+           has passed
+half-open  one probe call is let through: success closes the circuit, failure
+           reopens it with a doubled cooldown
+
+The state round-trips through ``CheckpointState.provider_health`` (wall-clock
+timestamps, so it survives across runs). The legacy "up"/"down" strings are
+still accepted there.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from .config import (
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_CONSECUTIVE_TIMEOUTS,
+    BREAKER_COOLDOWN_SECONDS, BREAKER_MAX_COOLDOWN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe breaker for one provider; see the module docstring."""
+
+    def __init__(self, name: str, clock: Callable[[], float] = time.time):
+        self.name = name
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.cooldown = float(BREAKER_COOLDOWN_SECONDS)
+        self.consecutive_timeouts = 0
+        self.trips = 0
+        self._outcomes: deque = deque(maxlen=BREAKER_WINDOW)  # True = failure
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # ─── Gate ──────────────────────────────────────────────────────────────
+    def allow(self) -> bool:
+        """True if a call may go out now (in half-open state, only the single probe)."""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self.opened_at < self.cooldown:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+                logger.info(f"{self.name}: circuit half-open, probing")
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def is_open(self) -> bool:
+        """True while calls are refused (open and still cooling down)."""
+        with self._lock:
+            return self.state == OPEN and self.clock() - self.opened_at < self.cooldown
+
+    # ─── Outcomes ──────────────────────────────────────────────────────────
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_timeouts = 0
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._probing = False
+                self._outcomes.clear()
+                self.cooldown = float(BREAKER_COOLDOWN_SECONDS)
+                logger.info(f"{self.name}: probe succeeded, circuit closed")
+                return
+            self._outcomes.append(False)
+
+    def record_failure(self, timeout: bool = False) -> None:
+        """A failed call; ``timeout`` for timeouts and connection failures."""
+        with self._lock:
+            self.consecutive_timeouts = self.consecutive_timeouts + 1 if timeout else 0
+            if self.state == HALF_OPEN:
+                self._probing = False
+                self._open(min(self.cooldown * 2, BREAKER_MAX_COOLDOWN_SECONDS), "probe failed")
+                return
+            if self.state == OPEN:
+                return
+            self._outcomes.append(True)
+            if self.consecutive_timeouts >= BREAKER_CONSECUTIVE_TIMEOUTS:
+                self._open(self.cooldown, f"{self.consecutive_timeouts} timeouts in a row")
+            elif len(self._outcomes) >= BREAKER_MIN_CALLS and self.error_rate() >= BREAKER_ERROR_RATE:
+                self._open(self.cooldown, f"error rate {self.error_rate():.0%}")
+
+    def error_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _open(self, cooldown: float, reason: str) -> None:
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.cooldown = cooldown
+        self.trips += 1
+        self._outcomes.clear()
+        logger.warning(f"{self.name}: circuit open for {cooldown:.0f}s ({reason})")
+
+    # ─── Persistence ───────────────────────────────────────────────────────
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            # A probe in flight when the run ends counts as not yet recovered
+            state = OPEN if self.state == HALF_OPEN else self.state
+            return {
+                "state": state,
+                "opened_at": round(self.opened_at, 3),
+                "cooldown": self.cooldown,
+                "error_rate": round(self.error_rate(), 3),
+                "trips": self.trips,
+            }
+
+    def restore(self, saved: Optional[Any]) -> None:
+        """Resume from a ``to_dict`` record or a legacy "up"/"down" string."""
+        with self._lock:
+            if isinstance(saved, str):
+                # Legacy values carry no timestamp: a "down" provider is probed right away
+                self.state = OPEN if saved == "down" else CLOSED
+                self.opened_at = 0.0
+            elif isinstance(saved, dict):
+                self.state = OPEN if saved.get("state") in (OPEN, HALF_OPEN) else CLOSED
+                self.opened_at = float(saved.get("opened_at") or 0.0)
+                self.cooldown = float(saved.get("cooldown") or BREAKER_COOLDOWN_SECONDS)
+                self.trips = int(saved.get("trips") or 0)
+            else:
+                return
+        if self.state == OPEN:
+            logger.info(f"{self.name}: circuit was open at the end of the last run")
@@ -0,0 +1,219 @@
+"""
+Bulk publish of per-route and per-destination aggregates to the API's shared store.
+
+api/_lib/calendarPrices.ts merges the bot's fares into every calendar
+response, and it used to read them by loading the whole flight_data.json
+for each cache miss. When REDIS_URL is set, ``finalize_outputs`` also
+pushes the aggregates into the Redis/KV store behind api/_lib/cache.ts
+(key prefix REDIS_KEY_PREFIX):
+
+    bot:route:RGN-BKK      cheapest fare per departure day of the route
+    bot:dest:BKK           destination landing payload (destinations.build_payloads)
+    bot:dest:thailand      country landing payload
+
+calendarPrices.ts reads ``bot:route:${orig}-${dest}`` and
+api/_handlers/destination-landing.ts reads ``bot:dest:${code or slug}``,
+both through ``getCached``; each falls back to what it used before when the
+key is missing. Values are compact JSON strings, which @upstash/redis parses
+back on ``get``. Keys expire after REDIS_TTL_SECONDS, the CACHE_TTL_SECONDS
+that ``setCache`` gives the API's own entries.
+
+Only keys whose content hash changed are written. The hashes live in the
+``bot:digests`` hash, so shards, reduce runs and the daemon share them.
+Changed values go out as one MSET plus an EXPIRE per key, in a MULTI of up
+to REDIS_PIPELINE_CHUNK keys so no key is ever left without its TTL.
+Unchanged keys past half their TTL get their expiry pushed back (the daemon
+cycle is shorter than that, so its keys never lapse), and keys whose
+aggregate disappeared are deleted.
+
+Publishing is best effort like ``setCache``: a store error is logged and
+the run goes on. To try it against a local Redis:
+
+    FLIGHT_BOT_REDIS_URL=redis://localhost:6379/0 python -m scripts.flight_bot.cachepublish
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import config as settings
+from .config import REDIS_KEY_PREFIX, REDIS_PIPELINE_CHUNK, REDIS_TTL_SECONDS
+from .destinations import build_payloads
+from .writer import content_hash
+
+logger = logging.getLogger(__name__)
+
+# (method, args, kwargs) of one pipelined command
+Command = Tuple[str, tuple, dict]
+
+
+def route_payloads(routes: List[Dict], updated_at: str) -> Dict[str, Dict]:
+    """Cheapest fare per departure day of every route, keyed ``route:ORIGIN-DEST``."""
+    days: Dict[Tuple[str, str], Dict[str, Dict]] = defaultdict(dict)
+    for r in routes:
+        calendar = days[(r["origin"], r["destination"])]
+        best = calendar.get(r["date"])
+        if best is None or r["price"] < best["price"]:
+            calendar[r["date"]] = {
+                "price": r["price"],
+                "airline_code": r.get("airline_code") or "",
+                "airline": r.get("airline") or "",
+                "transfers": int(r.get("transfers") or 0),
+                "flight_number": r.get("flight_number") or r.get("flight_num") or "",
+                "is_estimated": bool(r.get("is_estimated")),
+            }
+    return {
+        f"route:{origin}-{destination}": {
+            "meta": {"updated_at": updated_at, "origin": origin, "destination": destination,
+                     "count": len(calendar), "currency": "USD"},
+            "calendar": dict(sorted(calendar.items())),
+        }
+        for (origin, destination), calendar in days.items()
+    }
+
+
+def build_values(routes: List[Dict]) -> Dict[str, Any]:
+    """Every cache value of one publish, by key without the prefix."""
+    updated_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+    values: Dict[str, Any] = route_payloads(routes, updated_at)
+    values.update((f"dest:{key}", payload) for key, payload in build_payloads(routes, updated_at).items())
+    return values
+
+
+class CachePublisher:
+    """Writes changed values to a Redis-compatible store in pipelined chunks."""
+
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX, ttl: int = REDIS_TTL_SECONDS,
+                 chunk: int = REDIS_PIPELINE_CHUNK):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.chunk = chunk
+        self.digests_key = f"{prefix}digests"
+        # Full key -> (content hash, unix time of the last write or expiry refresh)
+        self._digests: Optional[Dict[str, Tuple[str, float]]] = None
+
+    def _execute(self, commands: List[Command]) -> List[Any]:
+        results: List[Any] = []
+        for start in range(0, len(commands), self.chunk):
+            pipe = self.client.pipeline(transaction=False)
+            for method, args, kwargs in commands[start:start + self.chunk]:
+                getattr(pipe, method)(*args, **kwargs)
+            results.extend(pipe.execute())
+        return results
+
+    def _write(self, values: Dict[str, Any]) -> None:
+        """MSET + EXPIRE per key, atomically per chunk (MSET cannot carry a TTL itself)."""
+        keys = list(values)
+        for start in range(0, len(keys), self.chunk):
+            batch = keys[start:start + self.chunk]
+            pipe = self.client.pipeline(transaction=True)
+            pipe.mset({key: json.dumps(values[key], ensure_ascii=False, separators=(",", ":")) for key in batch})
+            for key in batch:
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+
+    def digests(self) -> Dict[str, Tuple[str, float]]:
+        """Hashes of the published keys, read from the store once per process."""
+        if self._digests is None:
+            self._digests = {}
+            for key, value in self.client.hgetall(self.digests_key).items():
+                key, value = (x.decode("utf-8") if isinstance(x, bytes) else x for x in (key, value))
+                digest, _, written = value.partition(":")
+                self._digests[key] = (digest, float(written or 0))
+        return self._digests
+
+    def publish(self, values: Dict[str, Any]) -> Dict[str, int]:
+        """Bring the store in line with ``values``; returns written/refreshed/deleted/unchanged counts."""
+        now = time.time()
+        digests = self.digests()
+        full = {self.prefix + key: value for key, value in values.items()}
+
+        changed: Dict[str, str] = {}
+        refresh: List[str] = []
+        for key, value in full.items():
+            digest = content_hash(value)
+            known = digests.get(key)
+            if known is None or known[0] != digest:
+                changed[key] = digest
+            elif now - known[1] >= self.ttl / 2:
+                refresh.append(key)
+
+        # An unchanged key that already expired is rewritten
+        refreshed = []
+        if refresh:
+            for key, alive in zip(refresh, self._execute([("expire", (key, self.ttl), {}) for key in refresh])):
+                if alive:
+                    refreshed.append(key)
+                else:
+                    changed[key] = digests[key][0]
+        stale = [key for key in digests if key not in full]
+
+        self._write({key: full[key] for key in changed})
+        commands: List[Command] = [
+            ("delete", tuple(stale[i:i + self.chunk]), {}) for i in range(0, len(stale), self.chunk)
+        ]
+        stamped = {key: f"{changed.get(key) or digests[key][0]}:{int(now)}" for key in (*changed, *refreshed)}
+        if stamped:
+            commands.append(("hset", (self.digests_key,), {"mapping": stamped}))
+        if stale:
+            commands.append(("hdel", (self.digests_key, *stale), {}))
+        self._execute(commands)
+
+        for key, value in stamped.items():
+            digest, _, written = value.partition(":")
+            digests[key] = (digest, float(written))
+        for key in stale:
+            digests.pop(key, None)
+        return {"written": len(changed), "refreshed": len(refreshed), "deleted": len(stale),
+                "unchanged": len(full) - len(changed) - len(refreshed)}
+
+
+_publisher: Optional[CachePublisher] = None
+
+
+def _get_publisher() -> Optional[CachePublisher]:
+    """One connection per process (the daemon keeps it warm); None without redis-py."""
+    global _publisher
+    if _publisher is None:
+        try:
+            import redis
+        except ImportError:
+            logger.warning("REDIS_URL is set but the redis package is not installed; skipping cache publish")
+            return None
+        _publisher = CachePublisher(redis.Redis.from_url(settings.REDIS_URL))
+    return _publisher
+
+
+def publish_cache(routes: List[Dict]) -> Optional[Dict[str, int]]:
+    """Publish the aggregates of ``routes`` (finalized flight_data records); None if it did not happen."""
+    global _publisher
+    publisher = _get_publisher()
+    if publisher is None:
+        return None
+    started = time.monotonic()
+    try:
+        stats = publisher.publish(build_values(routes))
+    except Exception as e:
+        logger.error(f"Cache publish failed: {e}")
+        # Reconnect and re-read the digests next time
+        _publisher = None
+        return None
+    logger.info(
+        f"Cache publish: {stats['written']} written, {stats['refreshed']} refreshed, "
+        f"{stats['deleted']} deleted, {stats['unchanged']} unchanged in {time.monotonic() - started:.2f}s"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not settings.REDIS_URL:
+        sys.exit("Set FLIGHT_BOT_REDIS_URL (e.g. redis://localhost:6379/0)")
+    with open(settings.OUTPUT_PATH, "r", encoding="utf-8") as f:
+        published = json.load(f).get("routes", [])
+    sys.exit(0 if publish_cache(published) is not None else 1)
@@ -1,13 +1,50 @@
 """
 Constants, environment variables, and airport lists.
+
+Settings that depend on the environment or today's date are registered with
+``_lazy`` and resolved on first access (module ``__getattr__``), so importing
+config never loads .env.local or dateutil. Read them as ``settings.NAME`` at
+call time rather than importing the name into another module.
 """
 import os
 from datetime import datetime, timezone
-from dateutil.relativedelta import relativedelta
-from dotenv import load_dotenv
 
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".env.local")
-load_dotenv(env_path)
+_env_loaded = False
+_LAZY = {}
+
+
+def load_env() -> None:
+    """Load .env.local into os.environ once; variables already set win."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(env_path)
+        _env_loaded = True
+
+
+def getenv(name: str, default: str = None):
+    load_env()
+    return os.getenv(name, default)
+
+
+def _lazy(name: str, factory) -> None:
+    _LAZY[name] = factory
+
+
+def __getattr__(name: str):
+    factory = _LAZY.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = factory()
+    return value
+
+
+def reset_lazy(*names: str) -> None:
+    """Forget resolved lazy settings so the next access recomputes them (the daemon does at midnight)."""
+    for name in names:
+        globals().pop(name, None)
+
 
 # ─── HTTP / Rate Limiting ──────────────────────────────────────────────────
 REQUEST_TIMEOUT = 10
@@ -16,13 +53,88 @@ MAX_RETRIES = 3
 BACKOFF_FACTOR = 1.0
 RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
+# Latency-aware requests: timeouts follow a rolling p99, slow requests get one hedged duplicate
+LATENCY_WINDOW = 200                         # Recent request latencies kept per provider
+LATENCY_MIN_SAMPLES = 20                     # Below this, REQUEST_TIMEOUT applies and nothing is hedged
+LATENCY_TIMEOUT_FACTOR = 2.0                 # Timeout = p99 x factor, between the bounds below
+LATENCY_MIN_TIMEOUT = 3.0                    # ...and REQUEST_TIMEOUT as the ceiling
+_lazy("TP_HEDGING", lambda: getenv("FLIGHT_BOT_HEDGE", "1") != "0")
+HEDGE_BUDGET_FRACTION = 0.05                 # Share of the run quota hedged duplicates may use
+
+# Origin-wide TP queries: one request per origin-month serves every destination in it
+_lazy("TP_FANIN", lambda: getenv("FLIGHT_BOT_FANIN", "1") != "0")
+TP_FANIN_LIMIT = 1000                        # API maximum for an open-destination query
+TP_FANIN_MIN_DEALS = 1                       # Fewer fan-in fares than this -> per-pair fallback
+
+# Per-pair TP fetches: one grouped-by-day calendar query, else paged prices_for_dates
+_lazy("TP_GROUPED", lambda: getenv("FLIGHT_BOT_GROUPED", "1") != "0")
+TP_GROUPED_MAX_FAILURES = 3                  # Consecutive failures before the run stops trying it
+TP_PAGE_SIZE = 30                            # Starting limit; doubles for routes that fill a page
+TP_MAX_PAGE_SIZE = 1000
+TP_MAX_PAGES = 5
+
+# Metro collapsing (metro.py): one city-level query serves every airport of a multi-airport city
+_lazy("TP_METRO", lambda: getenv("FLIGHT_BOT_METRO", "1") != "0")
+STATIC_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")  # update_static_data.py output
+# Used when cache/airports.json has not been downloaded; TravelPayouts city codes
+METRO_FALLBACK = {"BKK": "BKK", "DMK": "BKK", "PVG": "SHA", "SHA": "SHA", "NRT": "TYO", "HND": "TYO",
+                  "KIX": "OSA", "ITM": "OSA", "ICN": "SEL", "GMP": "SEL", "PEK": "BJS", "PKX": "BJS"}
+
+# ─── Provider Health (circuit breakers) ────────────────────────────────────
+BREAKER_WINDOW = 20                          # Recent calls the error rate is computed over
+BREAKER_MIN_CALLS = 5                        # Calls in the window before the error rate can trip it
+BREAKER_ERROR_RATE = 0.5                     # Error rate that opens the circuit
+BREAKER_CONSECUTIVE_TIMEOUTS = 3             # Timeouts/connection failures in a row that open it at once
+BREAKER_COOLDOWN_SECONDS = 60                # Open time before one half-open probe is let through
+BREAKER_MAX_COOLDOWN_SECONDS = 1800          # Cooldown doubles after each failed probe, up to this
+
 # ─── File Paths ────────────────────────────────────────────────────────────
 OUTPUT_PATH = os.path.join("client", "public", "data", "flight_data.json")
+# Dataset schemas: v1 = one object per deal (OUTPUT_PATH), v2 = columnar flight_data.v2.json next to it
+_lazy("WRITE_V1", lambda: getenv("FLIGHT_BOT_V1", "1") != "0")
+_lazy("WRITE_V2", lambda: getenv("FLIGHT_BOT_V2", "1") != "0")
+# Memory-mapped flight_data.bin for fast cold starts; a local cache, kept out of client/public and git
+_lazy("WRITE_BINARY_COMPANION", lambda: getenv("FLIGHT_BOT_BINARY", "1") != "0")
+COMPANION_DIR = os.path.join("data", "cache")
+
+# ─── Price History ─────────────────────────────────────────────────────────
+HISTORY_DIR = os.path.join("data", "price_history")  # Append-only observation store (history.py)
+TRENDS_OUTPUT_PATH = os.path.join("client", "public", "data", "price_trends.json")
+_lazy("WRITE_HISTORY", lambda: getenv("FLIGHT_BOT_HISTORY", "1") != "0")
+HISTORY_RAW_RETENTION_DAYS = 35              # Older months are kept only as daily min/median rollups
+HISTORY_EXPORT_DAYS = 60                     # Observation days exported to price_trends.json
+
+# ─── Destination Pages ─────────────────────────────────────────────────────
+DESTINATIONS_DIR = os.path.join("client", "public", "data", "destinations")  # destinations.py payloads
+_lazy("WRITE_DESTINATIONS", lambda: getenv("FLIGHT_BOT_DESTINATIONS", "1") != "0")
+DESTINATION_DEALS_PER_MONTH = 30             # Cheapest deals kept per month across all origins
+DESTINATION_ORIGIN_DEALS_PER_MONTH = 10      # ...and per origin airport
 
 # ─── Price Bounds ──────────────────────────────────────────────────────────
 MIN_PRICE_USD = 10
 MAX_PRICE_USD = 5000
 
+# Per-route anomaly filter (modified z-score over median/MAD)
+OUTLIER_MAD_THRESHOLD = 3.5
+OUTLIER_MAD_FLOOR = 0.15                     # MAD never below 15% of the route median
+OUTLIER_MIN_SAMPLES = 5                      # Need this many prices on a route before flagging
+
+# ─── Currency ──────────────────────────────────────────────────────────────
+# Providers quote in these; fx.py converts every fetched batch to USD before validation
+_lazy("TP_MARKET", lambda: getenv("FLIGHT_BOT_TP_MARKET", "th"))                 # Aviasales market (data source)
+_lazy("TP_CURRENCY", lambda: getenv("FLIGHT_BOT_TP_CURRENCY", "USD").upper())
+_lazy("AMADEUS_CURRENCY", lambda: getenv("FLIGHT_BOT_AMADEUS_CURRENCY", "USD").upper())
+FX_URL = "https://open.er-api.com/v6/latest/USD"  # Same no-key source as shared/utils/liveFx.ts
+FX_CACHE_PATH = os.path.join(STATIC_CACHE_DIR, "fx_rates.json")
+FX_FALLBACK_PATH = os.path.join(os.path.dirname(__file__), "fx_fallback.json")  # Offline, approximate
+FX_TTL_SECONDS = 24 * 60 * 60                # CACHE_TTL_SECONDS in shared/utils/liveFx.ts
+
+# ─── Price Estimation ──────────────────────────────────────────────────────
+_lazy("ESTIMATION_CURVE", lambda: getenv("FLIGHT_BOT_ESTIMATION_CURVE", "linear"))  # "linear" | "nearest"
+ESTIMATION_MAX_GAP_DAYS = 2                  # Only fill days this close to a real fare
+ESTIMATION_DISTANCE_MARKUP = 0.02            # +2% per day away from the nearest real fare
+ESTIMATION_MAX_PER_ROUTE = 10                # Estimated days per route, nearest to a real fare first
+
 # ─── Airport Lists ─────────────────────────────────────────────────────────
 SEA_AIRPORTS = [
     "RGN", "MDL", "BKK", "DMK", "SIN", "KUL", "CNX", "HKT",
@@ -80,13 +192,57 @@ POPULAR_ROUTES = [
 
 POPULAR_ROUTES_SET = frozenset(POPULAR_ROUTES)
 
+# ─── Route Demand (demand.py) ──────────────────────────────────────────────
+# Exported alert subscriptions / request counts (JSON or CSV); missing = POPULAR_ROUTES only
+_lazy("DEMAND_PATH", lambda: getenv("FLIGHT_BOT_DEMAND_PATH", os.path.join("data", "route_demand.json")))
+DEMAND_BUDGET_SHARE = 0.4                    # Share of each task limit spent on demanded route-months first
+
 # ─── Scheduling ────────────────────────────────────────────────────────────
 def _generate_months(ahead=6):
     """Auto-generate next N months so the bot never goes stale."""
+    from dateutil.relativedelta import relativedelta
     now = datetime.now(timezone.utc)
     return [(now + relativedelta(months=i)).strftime("%Y-%m") for i in range(ahead)]
 
-MONTHS_TO_SCAN = _generate_months(ahead=9)   # 9 months = more date coverage
+_lazy("MONTHS_TO_SCAN", lambda: _generate_months(ahead=9))  # 9 months = more date coverage
 MAX_REQUESTS_PER_RUN = 1000                  # 5x increase (≈8 min at 0.5s delay)
 AMADEUS_MAX_REQUESTS_PER_RUN = 5            # Conservative cap per run to protect free-tier limits
 CHECKPOINT_EVERY = 50
+FETCH_WORKERS = 4                            # Concurrent fetch threads (1 = lockstep pipeline)
+FETCH_QUEUE_SIZE = 100                       # Fetched task results buffered ahead of the merge stage
+
+# ─── Amadeus Allocation (allocator.py) ─────────────────────────────────────
+AMADEUS_GAP_MAX_DAYS = 14                    # A probe is worth the days of its calendar gap, up to this
+AMADEUS_STALE_VALUE = 3.0                    # Extra worth of a gap holding published fares TP did not reconfirm
+AMADEUS_SUSPICIOUS_RATIO = 0.5               # A fresh fare below this share of its route-month median...
+AMADEUS_SUSPICIOUS_VALUE = 4.0               # ...is worth this much to double-check
+AMADEUS_MAX_DATES_PER_ROUTE_MONTH = 2        # Spread the quota over route-months
+AMADEUS_MIN_LEAD_DAYS = 1                    # Never probe departures earlier than this
+
+# ─── Run Budget ────────────────────────────────────────────────────────────
+_lazy("RUN_DEADLINE_SECONDS", lambda: int(getenv("RUN_DEADLINE_SECONDS", "0")) or None)  # Unset = no deadline
+FINAL_MERGE_RESERVE_SECONDS = 30             # Initial guess, refined from checkpoint merges
+PLANNER_EWMA_ALPHA = 0.2                     # Weight of the newest task latency
+
+# ─── Shared API Cache ──────────────────────────────────────────────────────
+# Redis-compatible store behind api/_lib/cache.ts; api/_lib/calendarPrices.ts reads the
+# route calendars and api/_handlers/destination-landing.ts the landing payloads from it.
+# Unset = no cache publish
+_lazy("REDIS_URL", lambda: getenv("FLIGHT_BOT_REDIS_URL") or getenv("KV_URL") or None)  # e.g. redis://localhost:6379/0
+REDIS_KEY_PREFIX = "bot:"                    # Namespace of every published key
+REDIS_TTL_SECONDS = 30 * 60                  # CACHE_TTL_SECONDS in api/_lib/cache.ts; keep in sync
+REDIS_PIPELINE_CHUNK = 500                   # Commands per round trip
+
+# ─── Daemon ────────────────────────────────────────────────────────────────
+_lazy("DAEMON_CYCLE_SECONDS", lambda: int(getenv("FLIGHT_BOT_DAEMON_CYCLE", "600")))          # One refresh cycle per interval
+_lazy("DAEMON_TP_PER_HOUR", lambda: int(getenv("FLIGHT_BOT_DAEMON_TP_PER_HOUR", "1200")))     # TP request rate
+_lazy("DAEMON_AMADEUS_PER_HOUR", lambda: float(getenv("FLIGHT_BOT_DAEMON_AMADEUS_PER_HOUR", "3")))  # ~2000/month free tier
+_lazy("DAEMON_PUBLISH_SECONDS", lambda: int(getenv("FLIGHT_BOT_DAEMON_PUBLISH", "1800")))     # Publish at least this often...
+_lazy("DAEMON_PUBLISH_CHANGES", lambda: int(getenv("FLIGHT_BOT_DAEMON_PUBLISH_CHANGES", "500")))  # ...or after this many accepted deals
+DAEMON_MAX_BURST_CYCLES = 2                  # Unused rate carries over for at most this many cycles
+
+# ─── Diagnostics ───────────────────────────────────────────────────────────
+PROFILE_DIR = os.path.join("artifacts", "profile")  # --profile writes a timestamped run dir here
+PROFILE_SAMPLE_INTERVAL = 0.005              # Stack sampling period (seconds)
+PROFILE_TOP_ALLOCATIONS = 15                 # Allocation sites listed per phase
+PROFILE_SNAPSHOT_CALLS = 3                   # Calls per phase that get full tracemalloc site diffs
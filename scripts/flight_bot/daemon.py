@@ -0,0 +1,228 @@
+"""
+Daemon mode: one long-lived process refreshing the dataset continuously.
+
+A scheduled run pays its startup on every launch: it parses the dataset,
+rebuilds the freshness map, re-authenticates Amadeus, opens new
+connections and then spends its whole quota in one burst. The daemon pays
+that once and then runs the same pipeline in short cycles:
+
+    warm state     the fetch stage keeps its FetchManager (HTTP sessions,
+                   Amadeus token, metro map, live circuit breakers); the
+                   merged deals, freshness map, demand table and airline
+                   names stay in memory between cycles
+    rate           each cycle is granted the requests its providers earned
+                   since the last one (DAEMON_TP_PER_HOUR,
+                   DAEMON_AMADEUS_PER_HOUR); unused requests carry over for
+                   at most DAEMON_MAX_BURST_CYCLES cycles
+    publishing     outputs are written once DAEMON_PUBLISH_CHANGES accepted
+                   deals are pending or DAEMON_PUBLISH_SECONDS have passed
+                   since the last publish, not after every batch
+    shutdown       SIGTERM or SIGINT expires the current cycle's deadline;
+                   in-flight tasks finish, pending changes are published and
+                   the provider health is checkpointed. A second signal
+                   exits at once.
+
+    python -m scripts.flight_bot --daemon
+"""
+import logging
+import signal
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import config as settings
+from .config import DAEMON_MAX_BURST_CYCLES
+from .demand import DemandTable, load_demand
+from .models import FlightDeal, RuntimeConfig
+from .pipeline import (
+    PipelineContext, Stage, ScheduleStage, FetchStage, ValidateStage, HistoryStage, MergeStage,
+    build_pipeline,
+)
+from .planner import RunPlanner
+from .profiling import phase
+from .scheduler import close_checkpoint
+from .writer import finalize_outputs
+
+logger = logging.getLogger(__name__)
+
+
+class RequestAllowance:
+    """Per-provider request credit that accrues at a fixed hourly rate, capped at a few cycles' worth."""
+
+    def __init__(self, rates: Dict[str, float], cycle_seconds: float, clock=time.monotonic):
+        self.rates = dict(rates)
+        self.cap = {name: rate * cycle_seconds * DAEMON_MAX_BURST_CYCLES / 3600 for name, rate in rates.items()}
+        self.clock = clock
+        self.credit: Dict[str, float] = {name: rate * cycle_seconds / 3600 for name, rate in rates.items()}
+        self.updated_at = clock()
+
+    def quotas(self) -> Dict[str, int]:
+        """Whole requests available now."""
+        now = self.clock()
+        elapsed, self.updated_at = now - self.updated_at, now
+        for name, rate in self.rates.items():
+            self.credit[name] = min(self.credit[name] + rate * elapsed / 3600, self.cap[name])
+        return {name: int(credit) for name, credit in self.credit.items()}
+
+    def spend(self, used: Dict[str, int]) -> None:
+        for name, count in used.items():
+            if name in self.credit:
+                self.credit[name] = max(self.credit[name] - count, 0.0)
+
+
+class PublishStage(Stage):
+    """Counts accepted deals and writes the outputs only when enough changes are pending or a publish is due."""
+    name = "publish"
+
+    def __init__(self, history: Optional[HistoryStage] = None):
+        self.history = history
+        self.pending = 0
+        self.last_published = time.monotonic()
+
+    def due(self) -> bool:
+        if not self.pending:
+            return False
+        return (self.pending >= settings.DAEMON_PUBLISH_CHANGES
+                or time.monotonic() - self.last_published >= settings.DAEMON_PUBLISH_SECONDS)
+
+    def publish(self, config: RuntimeConfig, deals: List[FlightDeal], errors: int = 0) -> float:
+        """Write every output now; returns the seconds it took."""
+        started = time.monotonic()
+        finalize_outputs(
+            deals, Path(config.output_path),
+            Path(config.transport_path) if config.transport_path else None,
+            error_count=errors,
+        )
+        if self.history:
+            self.history.export()
+        elapsed = time.monotonic() - started
+        logger.info(f"Published {len(deals)} deals ({self.pending} changes pending) in {elapsed:.1f}s")
+        self.pending = 0
+        self.last_published = time.monotonic()
+        return elapsed
+
+    def process(self, ctx: PipelineContext) -> None:
+        self.pending += len(ctx.accepted)
+        if self.due():
+            ctx.planner.record_merge(self.publish(ctx.config, ctx.deals, ctx.errors))
+
+    def finish(self, ctx: PipelineContext) -> None:
+        # Nothing to resume inside a cycle: deals not yet published are refetched after a crash
+        close_checkpoint(ctx.checkpoint, ctx.config.checkpoint_path)
+
+
+class FlightDaemon:
+    """Runs refresh cycles over warm state until a shutdown signal arrives."""
+
+    def __init__(self, config: RuntimeConfig):
+        self.config = config
+        self.history = HistoryStage(compact=False)
+        self.publisher = PublishStage(self.history)
+        self.pipeline = build_pipeline(config, [
+            ScheduleStage(), FetchStage(), ValidateStage(), self.history, MergeStage(), self.publisher,
+        ])
+        self.cycle_seconds = settings.DAEMON_CYCLE_SECONDS
+        self.allowance = RequestAllowance({
+            "tp": settings.DAEMON_TP_PER_HOUR,
+            "amadeus": settings.DAEMON_AMADEUS_PER_HOUR,
+        }, self.cycle_seconds)
+        self.stopping = threading.Event()
+        self.ctx: Optional[PipelineContext] = None
+        self.deals: Optional[List[FlightDeal]] = None
+        self.last_fetched_map: Dict[str, str] = {}
+        self.demand = DemandTable()
+        self.demand_mtime: Optional[float] = None
+        self.today = datetime.utcnow().date()
+        self.errors = 0
+        self.cycles = 0
+
+    # ─── Signals ───────────────────────────────────────────────────────────
+    def request_stop(self, signum=None, frame=None) -> None:
+        if self.stopping.is_set():
+            logger.warning("Second shutdown signal: exiting without publishing")
+            raise SystemExit(1)
+        logger.info("Shutdown requested: finishing in-flight tasks")
+        self.stopping.set()
+        if self.ctx is not None:
+            self.ctx.planner.expire()
+
+    def _install_signals(self) -> None:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.request_stop)
+
+    # ─── Warm state ────────────────────────────────────────────────────────
+    def _refresh_demand(self) -> DemandTable:
+        """The demand table, re-read only when its export changes."""
+        path = Path(settings.DEMAND_PATH)
+        mtime = path.stat().st_mtime if path.exists() else None
+        if mtime != self.demand_mtime:
+            self.demand, self.demand_mtime = load_demand(path), mtime
+        return self.demand
+
+    def _roll_date(self) -> None:
+        """The scanned months follow the calendar: recompute them when the UTC day changes."""
+        today = datetime.utcnow().date()
+        if today != self.today:
+            self.today = today
+            settings.reset_lazy("MONTHS_TO_SCAN")
+            logger.info(f"New day {today}: months to scan {settings.MONTHS_TO_SCAN}")
+
+    # ─── Cycles ────────────────────────────────────────────────────────────
+    def cycle(self, quotas: Dict[str, int]) -> None:
+        ctx = PipelineContext(
+            config=self.config,
+            run_id=str(uuid.uuid4())[:8],
+            # The allowance paces the cycles; only a shutdown sets a deadline
+            planner=RunPlanner(None, quotas),
+            last_fetched_map=self.last_fetched_map,
+            demand=self._refresh_demand(),
+        )
+        if self.deals is not None:
+            ctx.deals = self.deals
+        self.ctx = ctx
+        if self.stopping.is_set():
+            ctx.planner.expire()
+        try:
+            self.pipeline.run(ctx)
+        finally:
+            self.ctx = None
+        self.allowance.spend(ctx.planner.used)
+
+        self.deals = ctx.deals
+        self.last_fetched_map = ctx.last_fetched_map
+        # Stamp the route-months that returned deals; refused or empty fetches stay due
+        stamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+        for key in ctx.answered:
+            self.last_fetched_map[key] = stamp
+        self.errors = ctx.errors
+        self.cycles += 1
+
+    def run(self) -> int:
+        self._install_signals()
+        logger.info(
+            f"Flight bot daemon: {self.cycle_seconds}s cycles, tp {settings.DAEMON_TP_PER_HOUR}/h, "
+            f"amadeus {settings.DAEMON_AMADEUS_PER_HOUR}/h, publish every {settings.DAEMON_PUBLISH_SECONDS}s "
+            f"or {settings.DAEMON_PUBLISH_CHANGES} changes"
+        )
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self._roll_date()
+            quotas = self.allowance.quotas()
+            if quotas.get("tp", 0) > 0:
+                self.cycle(quotas)
+            else:
+                logger.info("No TP requests earned yet; waiting for the next cycle")
+            if self.publisher.due() and self.deals is not None:
+                self.publisher.publish(self.config, self.deals, self.errors)
+            self.stopping.wait(max(self.cycle_seconds - (time.monotonic() - started), 0))
+        self.shutdown()
+        return 0
+
+    def shutdown(self) -> None:
+        if self.publisher.pending and self.deals is not None:
+            with phase(self.publisher.name):
+                self.publisher.publish(self.config, self.deals, self.errors)
+        logger.info(f"Flight bot daemon stopped after {self.cycles} cycles")
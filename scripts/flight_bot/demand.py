@@ -0,0 +1,94 @@
+"""
+Route demand table: which route-months real users watch or request.
+
+Read once per run from DEMAND_PATH, an export of price-alert subscriptions
+(flightPriceAlerts) or of route request counts, in either format:
+
+    JSON  [{"origin": "RGN", "destination": "BKK", "departDate": "2026-11-03"}, ...]
+          or {"routes": [...]}, records may carry "month" instead of
+          "departDate" and a "count"/"weight" (default 1)
+    CSV   header row with origin,destination and optionally
+          month/departDate and count/weight columns
+
+A record without a date counts for every scanned month of the route. The
+scheduler uses the table to spend the first share of each run's budget on
+demanded route-months (see ``generate_tasks``).
+"""
+import csv
+import json
+import logging
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from . import config as settings
+
+logger = logging.getLogger(__name__)
+
+ALL_MONTHS = "*"
+
+
+class DemandTable:
+    """Demand weight per (origin, destination, month); month ALL_MONTHS applies to the whole route."""
+
+    def __init__(self, weights: Optional[Dict[Tuple[str, str, str], float]] = None):
+        self.weights: Dict[Tuple[str, str, str], float] = dict(weights or {})
+
+    def __bool__(self) -> bool:
+        return bool(self.weights)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def weight(self, origin: str, destination: str, month: str) -> float:
+        return (self.weights.get((origin, destination, month), 0.0)
+                + self.weights.get((origin, destination, ALL_MONTHS), 0.0))
+
+    def routes(self) -> Set[Tuple[str, str]]:
+        return {(origin, dest) for origin, dest, _ in self.weights}
+
+
+def _records_from_file(path: Path) -> Iterable[dict]:
+    if path.suffix.lower() == ".csv":
+        with path.open("r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+        return
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    yield from (data.get("routes", []) if isinstance(data, dict) else data)
+
+
+def _is_iata(code: str) -> bool:
+    return len(code) == 3 and code.isalpha()
+
+
+def load_demand(path: Optional[Path] = None) -> DemandTable:
+    """Build the demand table from the export; an empty table if there is none."""
+    path = Path(path or settings.DEMAND_PATH)
+    if not path.exists():
+        return DemandTable()
+
+    weights: Dict[Tuple[str, str, str], float] = defaultdict(float)
+    skipped = 0
+    try:
+        for record in _records_from_file(path):
+            origin = str(record.get("origin") or "").strip().upper()
+            dest = str(record.get("destination") or "").strip().upper()
+            # "2026-11-03" (departDate) or "2026-11" (month); missing = every month
+            month = str(record.get("month") or record.get("departDate") or "").strip()[:7] or ALL_MONTHS
+            try:
+                weight = float(record.get("count") or record.get("weight") or 1)
+            except (TypeError, ValueError):
+                weight = 0.0
+            if not (_is_iata(origin) and _is_iata(dest)) or origin == dest or weight <= 0:
+                skipped += 1
+                continue
+            weights[(origin, dest, month)] += weight
+    except Exception as e:
+        logger.error(f"Ignoring unreadable demand file {path}: {e}")
+        return DemandTable()
+
+    table = DemandTable(weights)
+    logger.info(f"Loaded demand for {len(table.routes())} routes ({len(table)} entries) from {path}"
+                + (f", skipped {skipped} invalid records" if skipped else ""))
+    return table
@@ -0,0 +1,265 @@
+"""
+Precomputed destination landing payloads.
+
+After each run the writer stage aggregates the published deals into one
+small file per destination, so the destination-landing API can serve a
+static object instead of rebuilding it from thousands of routes on a cold
+start. The aggregation follows api/_lib/buildDestinationPageVM.ts and
+api/_handlers/destination-landing.ts:
+
+    deals        {"2026-11": [Deal, ...]}, month-keyed (groupDealsByMonth),
+                 deduplicated by airline|from-to|d1|price and sorted by price
+                 (dedupeAndSortDealsByPrice)
+    byOrigin     the same, per origin airport, for origin-specific pages
+    fareTable    cheapest one-way fare per origin (FareTableEntry)
+    airlines     AirlineSummary per carrier, most deals first
+    priceMonths  cheapest fare per month ({"month": "Nov", "value": ...})
+    heatmap      cheapest fare per departure weekday (HeatmapDatum rows)
+    summary      summarizeDeals: totalDeals, avgPrice, cheapest/highest, directCount
+
+Files are written to DESTINATIONS_DIR as ``<IATA>.json`` for every
+destination airport and ``<country-slug>.json`` for the country pages
+(COUNTRY_AIRPORTS mirrors COUNTRY_MAJOR_AIRPORTS in destination-landing.ts),
+plus an ``index.json``. Prices stay in USD like flight_data.json; the API
+formats them. Calendar estimates are left out: only observed fares are shown.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from . import config as settings
+from .config import DESTINATION_DEALS_PER_MONTH, DESTINATION_ORIGIN_DEALS_PER_MONTH
+
+logger = logging.getLogger(__name__)
+
+# Keep in sync with COUNTRY_MAJOR_AIRPORTS in api/_handlers/destination-landing.ts
+COUNTRY_AIRPORTS: Dict[str, List[str]] = {
+    "vietnam": ["HAN", "SGN", "DAD"],
+    "thailand": ["BKK", "CNX", "HKT", "KBV"],
+    "japan": ["NRT", "HND", "OSA", "KIX"],
+    "indonesia": ["CGK", "DPS"],
+    "malaysia": ["KUL", "PEN"],
+    "cambodia": ["PNH", "SAI"],
+    "laos": ["VTE", "LPQ"],
+    "philippines": ["MNL", "CEB"],
+    "south-korea": ["ICN", "GMP"],
+    "taiwan": ["TPE", "KHH"],
+    "china": ["PEK", "PVG", "CAN", "CTU", "SZX"],
+    "hong-kong": ["HKG"],
+    "singapore": ["SIN"],
+    "macau": ["MFM"],
+    "brunei": ["BWN"],
+    "india": ["BOM", "DEL"],
+    "united-arab-emirates": ["DXB", "AUH"],
+}
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+LOGO_URL = "https://pics.avs.io/120/120/{code}.png"
+
+
+def _js_round(value: float) -> int:
+    """Math.round for the non-negative averages (Python's round() rounds halves to even)."""
+    return int(value + 0.5)
+
+
+# ─── Record shapes (api/_lib/destination.ts) ───────────────────────────────
+def _to_deal(route: Dict) -> Dict:
+    """A flight_data.json record as a ``Deal``, the shape flightDataFetcher.ts produces."""
+    code = route.get("airline_code") or ""
+    return {
+        "from": route["origin"],
+        "to": route["destination"],
+        "d1": f"{route['date']}T00:00:00Z",
+        "a1": None,
+        "airline": route.get("airline") or code or "—",
+        "airlineCode": code,
+        "logoUrl": LOGO_URL.format(code=code) if code else "",
+        "stops": int(route.get("transfers") or 0),
+        "duration": "—",
+        "price": route["price"],
+        "found_at": route.get("found_at"),
+    }
+
+
+def _to_fare_entry(deal: Dict) -> Dict:
+    return {
+        "from1": deal["from"],
+        "to1": deal["to"],
+        "d1": deal["d1"],
+        "a1": None,
+        "s1": deal["stops"],
+        "dur1": deal["duration"],
+        "airline": deal["airline"],
+        "airlineCode": deal["airlineCode"],
+        "logoUrl": deal["logoUrl"],
+        "price": deal["price"],
+    }
+
+
+# ─── Aggregations ──────────────────────────────────────────────────────────
+def _dedupe_and_sort(deals: Iterable[Dict]) -> List[Dict]:
+    """dedupeAndSortDealsByPrice: first deal per airline|from-to|d1|price, cheapest first."""
+    seen = {}
+    for deal in deals:
+        key = (deal["airline"], deal["from"], deal["to"], deal["d1"], deal["price"])
+        seen.setdefault(key, deal)
+    return sorted(seen.values(), key=lambda d: d["price"])
+
+
+def _by_month(deals: List[Dict], limit: int) -> Dict[str, List[Dict]]:
+    """groupDealsByMonth over price-sorted deals, keeping the ``limit`` cheapest per month."""
+    months: Dict[str, List[Dict]] = defaultdict(list)
+    for deal in deals:
+        bucket = months[deal["d1"][:7]]
+        if len(bucket) < limit:
+            bucket.append(deal)
+    return dict(sorted(months.items()))
+
+
+def _summary(deals: List[Dict]) -> Dict:
+    """summarizeDeals, without the formatted labels."""
+    if not deals:
+        return {"totalDeals": 0, "avgPrice": 0, "cheapestPrice": None, "cheapestCarrier": None,
+                "highestPrice": None, "directCount": 0}
+    cheapest, priciest = deals[0], deals[-1]
+    return {
+        "totalDeals": len(deals),
+        "avgPrice": _js_round(sum(d["price"] for d in deals) / len(deals)),
+        "cheapestPrice": cheapest["price"],
+        "cheapestCarrier": cheapest["airline"],
+        "highestPrice": priciest["price"],
+        "directCount": sum(1 for d in deals if d["stops"] == 0),
+    }
+
+
+def _airlines(deals: List[Dict]) -> List[Dict]:
+    by_code: Dict[str, List[Dict]] = defaultdict(list)
+    for deal in deals:
+        if deal["airlineCode"]:
+            by_code[deal["airlineCode"]].append(deal)
+    summaries = [{
+        "code": code,
+        "name": group[0]["airline"],
+        "logoUrl": group[0]["logoUrl"],
+        "dealCount": len(group),
+        "commonStops": Counter(d["stops"] for d in group).most_common(1)[0][0],
+        "avgPrice": _js_round(sum(d["price"] for d in group) / len(group)),
+    } for code, group in by_code.items()]
+    # summarizeAirlines takes the carrier with the most deals as the top one
+    return sorted(summaries, key=lambda a: (-a["dealCount"], a["avgPrice"], a["code"]))
+
+
+def _price_months(deals: List[Dict]) -> List[Dict]:
+    """tpMonthlyToPriceMonths: cheapest fare per "YYYY-MM", labelled with the month name."""
+    cheapest: Dict[str, float] = {}
+    for deal in deals:
+        month = deal["d1"][:7]
+        cheapest[month] = min(cheapest.get(month, deal["price"]), deal["price"])
+    return [{"month": MONTH_NAMES[int(month[5:7]) - 1], "value": value}
+            for month, value in sorted(cheapest.items())]
+
+
+def _heatmap(deals: List[Dict]) -> List[Dict]:
+    """Cheapest fare per departure weekday, as the Weekday/Weekend rows of the insights heatmap."""
+    cheapest: Dict[int, float] = {}
+    for deal in deals:
+        weekday = date.fromisoformat(deal["d1"][:10]).weekday()
+        cheapest[weekday] = min(cheapest.get(weekday, deal["price"]), deal["price"])
+    if not cheapest:
+        return []
+    # Levels by tercile of the weekday minimums
+    ranked = sorted(cheapest.values())
+    low, high = ranked[(len(ranked) - 1) // 3], ranked[(2 * (len(ranked) - 1)) // 3]
+
+    def cell(weekday: int) -> Dict:
+        price = cheapest[weekday]
+        level = "low" if price <= low else "high" if price > high else "mid"
+        return {"day": WEEKDAYS[weekday], "price": price, "level": level}
+
+    return [
+        {"month": "Weekday", "values": [cell(w) for w in range(5) if w in cheapest]},
+        {"month": "Weekend", "values": [cell(w) for w in range(5, 7) if w in cheapest]},
+    ]
+
+
+def build_payload(routes: List[Dict], key: str, airports: List[str], updated_at: str) -> Dict:
+    """The landing payload for ``key`` (an IATA code or country slug) over deals to ``airports``."""
+    deals = _dedupe_and_sort(_to_deal(r) for r in routes)
+    by_origin: Dict[str, List[Dict]] = defaultdict(list)
+    for deal in deals:
+        by_origin[deal["from"]].append(deal)
+
+    return {
+        "meta": {
+            "updated_at": updated_at,
+            "key": key,
+            "airports": airports,
+            "count": len(deals),
+            "currency": "USD",
+        },
+        "summary": _summary(deals),
+        "deals": _by_month(deals, DESTINATION_DEALS_PER_MONTH),
+        "byOrigin": {origin: _by_month(group, DESTINATION_ORIGIN_DEALS_PER_MONTH)
+                     for origin, group in sorted(by_origin.items())},
+        "fareTable": [_to_fare_entry(group[0]) for group in sorted(by_origin.values(), key=lambda g: g[0]["price"])],
+        "airlines": _airlines(deals),
+        "priceMonths": _price_months(deals),
+        "heatmap": _heatmap(deals),
+    }
+
+
+def build_payloads(routes: List[Dict], updated_at: Optional[str] = None) -> Dict[str, Dict]:
+    """Landing payload per destination airport and per country with observed deals, by key."""
+    updated_at = updated_at or datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+    by_dest: Dict[str, List[Dict]] = defaultdict(list)
+    for route in routes:
+        if not route.get("is_estimated"):
+            by_dest[route["destination"]].append(route)
+
+    payloads: Dict[str, Dict] = {}
+    for dest, group in by_dest.items():
+        payloads[dest] = build_payload(group, dest, [dest], updated_at)
+    for slug, airports in COUNTRY_AIRPORTS.items():
+        group = [r for airport in airports for r in by_dest.get(airport, [])]
+        if group:
+            payloads[slug] = build_payload(group, slug, [a for a in airports if a in by_dest], updated_at)
+    return payloads
+
+
+def build_index(payloads: Dict[str, Dict], updated_at: str) -> Dict:
+    """index.json: deal count and cheapest fare per payload key."""
+    return {
+        "meta": {"updated_at": updated_at, "count": len(payloads), "currency": "USD"},
+        "destinations": {key: {"count": p["meta"]["count"], "cheapestPrice": p["summary"]["cheapestPrice"]}
+                         for key, p in sorted(payloads.items())},
+    }
+
+
+# ─── Writing ───────────────────────────────────────────────────────────────
+def write_destination_payloads(routes: List[Dict], out_dir: Optional[Path] = None) -> int:
+    """
+    Write one payload per destination airport and per country with deals,
+    plus index.json; payloads of destinations that no longer have deals are
+    removed. Unchanged payloads are not rewritten. Returns the payload count.
+    """
+    from .writer import write_output_json
+
+    out_dir = Path(out_dir or settings.DESTINATIONS_DIR)
+    updated_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+    payloads = build_payloads(routes, updated_at)
+
+    written = sum(write_output_json(out_dir / f"{key}.json", payload) for key, payload in payloads.items())
+    write_output_json(out_dir / "index.json", build_index(payloads, updated_at))
+
+    keep = {f"{key}.json" for key in payloads} | {"index.json"}
+    for path in out_dir.glob("*.json"):
+        if path.name not in keep:
+            for stale in (path, path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")):
+                stale.unlink(missing_ok=True)
+            logger.info(f"Removed destination payload {path.name} (no deals left)")
+
+    logger.info(f"Destination payloads: {len(payloads)} ({written} changed) in {out_dir}")
+    return len(payloads)
@@ -0,0 +1,149 @@
+"""
+Write-time price estimation engine.
+
+Fills gaps in the daily calendar of every route-month from the real
+(non-estimated) observations of all providers in one batched NumPy pass,
+so the frontend and API read finished calendars instead of interpolating
+per request.
+
+Curves (ESTIMATION_CURVE):
+    nearest  price of the nearest real fare
+    linear   straight line between the real fares either side of the gap,
+             falling back to the nearest fare at the edges of the month
+Either curve is then marked up by ESTIMATION_DISTANCE_MARKUP per day away
+from the nearest real fare, and only days within ESTIMATION_MAX_GAP_DAYS
+of one are filled. A route gets at most ESTIMATION_MAX_PER_ROUTE estimates
+(closest to a real fare first), so they stay a minority of the dataset.
+Estimates priced outside MIN_PRICE_USD..MAX_PRICE_USD are dropped, as the
+validator would reject the fare and the CI gate the file.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from . import config as settings
+from .config import (
+    ESTIMATION_MAX_GAP_DAYS, ESTIMATION_DISTANCE_MARKUP, ESTIMATION_MAX_PER_ROUTE, MIN_PRICE_USD, MAX_PRICE_USD,
+)
+
+logger = logging.getLogger(__name__)
+
+_DAYS = 31
+# Fields copied from the nearest real fare onto an estimate
+_TEMPLATE_FIELDS = (
+    "airline", "airline_code", "transfers", "flight_number", "flight_num", "found_at",
+    "fetchedAt", "provider", "is_amadeus", "region", "currency",
+)
+
+
+def estimate_routes(routes: List[Dict], curve: str = None, max_gap: int = None,
+                    markup: float = None, max_per_route: int = None) -> List[Dict]:
+    """Return new ``is_estimated`` route dicts filling calendar gaps around real fares."""
+    curve = curve or settings.ESTIMATION_CURVE
+    max_gap = ESTIMATION_MAX_GAP_DAYS if max_gap is None else max_gap
+    markup = ESTIMATION_DISTANCE_MARKUP if markup is None else markup
+    max_per_route = ESTIMATION_MAX_PER_ROUTE if max_per_route is None else max_per_route
+    if curve not in ("nearest", "linear"):
+        raise ValueError(f"Unknown estimation curve: {curve}")
+
+    real = [r for r in routes if not r.get("is_estimated")]
+    if not real or max_gap <= 0:
+        return []
+
+    # 1. Group real fares by route-month and place them on a (group, day) grid
+    group_keys = np.array([f"{r['origin']}-{r['destination']}-{r['date'][:7]}" for r in real])
+    days = np.array([int(r["date"][8:10]) - 1 for r in real])
+    prices = np.array([float(r["price"]) for r in real])
+    uniq, groups = np.unique(group_keys, return_inverse=True)
+    n_groups = len(uniq)
+
+    # Cheapest row per cell wins
+    order = np.lexsort((prices, days, groups))
+    g_sorted, d_sorted = groups[order], days[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (g_sorted[1:] != g_sorted[:-1]) | (d_sorted[1:] != d_sorted[:-1])
+    cell_rows = order[first]
+
+    source = np.full((n_groups, _DAYS), -1)
+    source[groups[cell_rows], days[cell_rows]] = cell_rows
+    observed = source >= 0
+    grid = np.where(observed, prices[np.maximum(source, 0)], np.nan)
+
+    # 2. Valid target days: inside the month and not in the past
+    months = np.array([k[-7:] for k in uniq], dtype="datetime64[M]")
+    month_start = months.astype("datetime64[D]")
+    month_len = ((months + 1).astype("datetime64[D]") - month_start).astype(int)
+    cols = np.arange(_DAYS)
+    cell_dates = month_start[:, None] + cols[None, :]
+    today = np.datetime64(datetime.utcnow().strftime("%Y-%m-%d"))
+    target = (~observed) & (cols[None, :] < month_len[:, None]) & (cell_dates >= today)
+
+    # 3. Nearest real fare on each side of every cell
+    left = np.maximum.accumulate(np.where(observed, cols, -1), axis=1)
+    right = np.minimum.accumulate(np.where(observed, cols, _DAYS * 2)[:, ::-1], axis=1)[:, ::-1]
+    has_left, has_right = left >= 0, right < _DAYS
+    dist_left = np.where(has_left, cols - left, _DAYS * 2)
+    dist_right = np.where(has_right, right - cols, _DAYS * 2)
+    distance = np.minimum(dist_left, dist_right)
+    nearest = np.where(dist_left <= dist_right, left, right)
+    target &= distance <= max_gap
+
+    rows_idx, cols_idx = np.nonzero(target)
+    if not len(rows_idx):
+        return []
+
+    # Cap per route (across its months): nearest days first, then earliest
+    _, route_of_group = np.unique([k[:7] for k in uniq], return_inverse=True)
+    routes_idx = route_of_group[rows_idx]
+    order = np.lexsort((cell_dates[rows_idx, cols_idx], distance[rows_idx, cols_idx], routes_idx))
+    counts = np.bincount(routes_idx, minlength=route_of_group.max() + 1)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(len(order)) - starts[routes_idx[order]]
+    kept = np.sort(order[rank < max_per_route])
+    rows_idx, cols_idx = rows_idx[kept], cols_idx[kept]
+    if not len(rows_idx):
+        return []
+
+    near = nearest[rows_idx, cols_idx]
+    base = grid[rows_idx, near]
+    if curve == "linear":
+        both = has_left[rows_idx, cols_idx] & has_right[rows_idx, cols_idx]
+        lp = grid[rows_idx, np.maximum(left[rows_idx, cols_idx], 0)]
+        rp = grid[rows_idx, np.minimum(right[rows_idx, cols_idx], _DAYS - 1)]
+        dl = dist_left[rows_idx, cols_idx]
+        span = dl + dist_right[rows_idx, cols_idx]
+        base = np.where(both, lp + (rp - lp) * dl / np.where(both, span, 1), base)
+
+    est_prices = np.round(base * (1 + markup * distance[rows_idx, cols_idx]), 2)
+    # A markup next to a fare near MAX_PRICE_USD would publish a price the validator rejects
+    in_bounds = (est_prices >= MIN_PRICE_USD) & (est_prices <= MAX_PRICE_USD)
+    rows_idx, cols_idx, near, est_prices = (a[in_bounds] for a in (rows_idx, cols_idx, near, est_prices))
+    est_dates = cell_dates[rows_idx, cols_idx].astype(str)
+    templates = source[rows_idx, near]
+
+    # 4. Materialize records, carrier details taken from the nearest real fare
+    estimates = []
+    for tmpl_idx, date, price in zip(templates.tolist(), est_dates.tolist(), est_prices.tolist()):
+        src = real[tmpl_idx]
+        est = {
+            "origin": src["origin"],
+            "destination": src["destination"],
+            "price": price,
+            "date": date,
+        }
+        for field in _TEMPLATE_FIELDS:
+            if field in src:
+                est[field] = src[field]
+        est["is_estimated"] = True
+        estimates.append(est)
+
+    logger.info(f"Estimated {len(estimates)} calendar days across {n_groups} route-months ({curve})")
+    return estimates
+
+
+def with_estimates(routes: List[Dict]) -> List[Dict]:
+    """Drop stale estimates and return the real routes plus freshly estimated ones."""
+    real = [r for r in routes if not r.get("is_estimated")]
+    return real + estimate_routes(real)
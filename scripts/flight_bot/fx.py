@@ -0,0 +1,147 @@
+"""
+USD normalization of provider prices.
+
+Providers may quote in any market and currency (TP_MARKET, TP_CURRENCY,
+AMADEUS_CURRENCY). Every FlightDeal keeps the currency it was quoted in
+until the validate stage converts the whole fetched batch to USD in one
+vectorized pass, so validation, merging and the published files only ever
+compare USD prices.
+
+Rates come from one table of units per USD, loaded once per process and
+again once it is older than FX_TTL_SECONDS:
+
+    1. FX_CACHE_PATH, if younger than FX_TTL_SECONDS
+    2. a download from FX_URL (the no-key source shared/utils/liveFx.ts
+       uses), saved to FX_CACHE_PATH
+    3. the stale cache, else FX_FALLBACK_PATH (approximate rates shipped
+       with the bot) when offline
+
+A deal in a currency the table lacks is dropped with a warning rather than
+published at a wrong price.
+"""
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import FX_URL, FX_CACHE_PATH, FX_FALLBACK_PATH, FX_TTL_SECONDS, REQUEST_TIMEOUT
+from .models import FlightDeal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FxTable:
+    rates: Dict[str, float]   # Units of currency per 1 USD
+    as_of: str                # When the rates were published
+    source: str               # "live" | "cache" | "stale_cache" | "fallback"
+    loaded_at: float = 0.0    # time.time() of the load
+
+    def rate(self, currency: str) -> Optional[float]:
+        rate = self.rates.get(currency.upper())
+        return rate if rate and rate > 0 else None
+
+    def to_usd(self, price: float, currency: str) -> float:
+        rate = self.rate(currency)
+        if rate is None:
+            raise ValueError(f"No USD rate for {currency!r}")
+        return round(price / rate, 2)
+
+
+def _read_table(path: Path, source: str) -> Optional[FxTable]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        rates = {code.upper(): float(rate) for code, rate in data["rates"].items()}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Ignoring unreadable FX table {path}: {e}")
+        return None
+    return FxTable(rates, str(data.get("as_of", "")), source)
+
+
+def _download() -> Optional[FxTable]:
+    import requests
+
+    try:
+        response = requests.get(FX_URL, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("result") != "success" or not isinstance(data.get("rates"), dict):
+            raise ValueError("unexpected response format")
+    except Exception as e:
+        logger.warning(f"FX rate download failed: {e}")
+        return None
+    rates = {code.upper(): float(rate) for code, rate in data["rates"].items()
+             if isinstance(rate, (int, float)) and rate > 0}
+    return FxTable(rates, str(data.get("time_last_update_utc", "")), "live")
+
+
+def load_fx_table(cache_path: Optional[Path] = None, fallback_path: Optional[Path] = None) -> FxTable:
+    """The freshest table available; see the module docstring for the order."""
+    from .writer import write_atomic_json
+
+    cache_path = Path(cache_path or FX_CACHE_PATH)
+    fallback_path = Path(fallback_path or FX_FALLBACK_PATH)
+
+    cached = _read_table(cache_path, "cache")
+    if cached and time.time() - cache_path.stat().st_mtime < FX_TTL_SECONDS:
+        table = cached
+    else:
+        table = _download()
+        if table:
+            write_atomic_json(cache_path, {"base": "USD", "as_of": table.as_of, "rates": table.rates})
+        elif cached:
+            cached.source = "stale_cache"
+            table = cached
+        else:
+            table = _read_table(fallback_path, "fallback") or FxTable({"USD": 1.0}, "", "fallback")
+    table.loaded_at = time.time()
+    logger.info(f"FX rates: {len(table.rates)} currencies ({table.source}, as of {table.as_of or 'unknown'})")
+    return table
+
+
+_table: Optional[FxTable] = None
+_table_lock = threading.Lock()
+
+
+def get_fx_table() -> FxTable:
+    """The process-wide table, reloaded once it is older than FX_TTL_SECONDS (long daemon runs)."""
+    global _table
+    with _table_lock:
+        if _table is None or time.time() - _table.loaded_at >= FX_TTL_SECONDS:
+            _table = load_fx_table()
+        return _table
+
+
+def normalize_deals(deals: List[FlightDeal], table: Optional[FxTable] = None) -> List[FlightDeal]:
+    """
+    Convert every non-USD deal to USD in place (one division per batch);
+    returns the deals that could be priced in USD.
+    """
+    foreign = [d for d in deals if (d.currency or "USD").upper() != "USD"]
+    if not foreign:
+        return deals
+    table = table or get_fx_table()
+
+    codes, inverse = np.unique([d.currency.upper() for d in foreign], return_inverse=True)
+    rates = np.array([table.rate(code) or np.nan for code in codes])[inverse]
+    usd = np.round(np.array([d.price for d in foreign], dtype=np.float64) / rates, 2)
+
+    unpriced = set()
+    for deal, price in zip(foreign, usd.tolist()):
+        if price != price:  # NaN: no rate for the currency
+            unpriced.add(id(deal))
+            continue
+        deal.price, deal.currency = price, "USD"
+    if unpriced:
+        missing = sorted(code for code in codes if table.rate(code) is None)
+        logger.warning(f"Dropped {len(unpriced)} deals quoted in currencies without a USD rate: {', '.join(missing)}")
+        return [d for d in deals if id(d) not in unpriced]
+    return deals
@@ -0,0 +1,301 @@
+"""
+Append-only price history.
+
+merge_incremental keeps only the cheapest current fare per business key;
+this store keeps every real (non-estimated) observation the bot accepted,
+so trends can be read from what prices actually did over time.
+
+Layout under HISTORY_DIR, partitioned by observation month:
+    raw/2026-10/seg-<timestamp>-<id>.npz   one compressed segment per append
+    raw/2026-10/compact.npz                the month's earlier segments, merged
+    rollup/2026-07.npz                     min/median/count per route,
+                                           departure date and observation day
+
+Every file holds one structured array (``rows``) sorted by route, so a
+route's rows are a single ``searchsorted`` slice. Appends never rewrite
+existing files. ``compact`` merges a month's raw segments into its
+compact.npz. Once a month is older than HISTORY_RAW_RETENTION_DAYS it is
+downsampled into its rollup and the raw rows are dropped.
+
+The store is binary and rewritten as it compacts, so it is kept out of git:
+the workflow carries it between runs in the Actions cache.
+"""
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .config import HISTORY_DIR, HISTORY_RAW_RETENTION_DAYS, HISTORY_EXPORT_DAYS
+from .models import FlightDeal
+
+logger = logging.getLogger(__name__)
+
+OBS_DTYPE = np.dtype([
+    ("route", "S7"),          # "RGN-BKK"
+    ("depart", "<i4"),        # departure date, days since 1970-01-01
+    ("observed", "<i8"),      # unix seconds
+    ("price", "<f4"),
+    ("airline", "S3"),
+    ("provider", "S8"),
+])
+
+ROLLUP_DTYPE = np.dtype([
+    ("route", "S7"),
+    ("depart", "<i4"),        # departure date, days since 1970-01-01; -1 in rollups written before it was kept
+    ("day", "<i4"),           # observation day, days since 1970-01-01
+    ("min", "<f4"),
+    ("median", "<f4"),
+    ("count", "<u4"),
+])
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _day_str(day: int) -> str:
+    return str(_EPOCH + int(day))
+
+
+def _save(path: Path, rows: np.ndarray) -> None:
+    """Atomic compressed write of one structured array."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".tmp")
+    try:
+        with temp_path.open("wb") as f:
+            np.savez_compressed(f, rows=rows)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(path)
+    except Exception:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+
+def _load(path: Path) -> np.ndarray:
+    with np.load(path) as data:
+        return data["rows"]
+
+
+def _load_rollup(path: Path) -> np.ndarray:
+    """A rollup file; older ones without a departure date read with ``depart`` -1."""
+    rows = _load(path)
+    if "depart" in rows.dtype.names:
+        return rows
+    out = np.zeros(len(rows), dtype=ROLLUP_DTYPE)
+    for name in rows.dtype.names:
+        out[name] = rows[name]
+    out["depart"] = -1
+    return out
+
+
+def _route_slice(rows: np.ndarray, route: bytes) -> np.ndarray:
+    lo = np.searchsorted(rows["route"], route, side="left")
+    hi = np.searchsorted(rows["route"], route, side="right")
+    return rows[lo:hi]
+
+
+def daily_rollup(obs: np.ndarray) -> np.ndarray:
+    """Downsample observations to one min/median/count row per (route, departure date, observation day)."""
+    if not len(obs):
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+    days = (obs["observed"] // 86400).astype(np.int64)
+    order = np.lexsort((obs["price"], days, obs["depart"], obs["route"]))
+    routes, departs, days, prices = obs["route"][order], obs["depart"][order], days[order], obs["price"][order]
+
+    start = np.ones(len(order), dtype=bool)
+    start[1:] = (routes[1:] != routes[:-1]) | (departs[1:] != departs[:-1]) | (days[1:] != days[:-1])
+    starts = np.flatnonzero(start)
+    counts = np.diff(np.append(starts, len(order)))
+    # Prices are sorted within each group, so the median is at its middle
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+
+    out = np.zeros(len(starts), dtype=ROLLUP_DTYPE)
+    out["route"] = routes[starts]
+    out["depart"] = departs[starts]
+    out["day"] = days[starts]
+    out["min"] = prices[starts]
+    out["median"] = (prices[lo] + prices[hi]) / 2
+    out["count"] = counts
+    return out
+
+
+def _merge_rollups(parts: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Combine rollups sorted by route/departure/day. Rows for the same key (a
+    late segment rolled up after its month already was) keep the lower min
+    and a count-weighted median, which is an approximation.
+    """
+    rows = np.concatenate(parts) if parts else np.zeros(0, dtype=ROLLUP_DTYPE)
+    rows = rows[np.lexsort((rows["day"], rows["depart"], rows["route"]))]
+    if len(rows) < 2:
+        return rows
+    start = np.ones(len(rows), dtype=bool)
+    start[1:] = ((rows["route"][1:] != rows["route"][:-1]) | (rows["depart"][1:] != rows["depart"][:-1])
+                 | (rows["day"][1:] != rows["day"][:-1]))
+    if start.all():
+        return rows
+    starts = np.flatnonzero(start)
+    counts = rows["count"].astype(np.float64)
+    out = rows[starts].copy()
+    out["min"] = np.minimum.reduceat(rows["min"], starts)
+    out["count"] = np.add.reduceat(rows["count"], starts)
+    out["median"] = np.add.reduceat(rows["median"] * counts, starts) / out["count"]
+    return out
+
+
+class PriceHistory:
+    """Columnar observation store; see the module docstring for the layout."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or HISTORY_DIR)
+        self.raw_dir = self.root / "raw"
+        self.rollup_dir = self.root / "rollup"
+
+    # ─── Write ─────────────────────────────────────────────────────────────
+    def append(self, deals: Iterable[FlightDeal]) -> int:
+        """Append real observations as new segments (one per observation month); returns rows written."""
+        real = [d for d in deals if not d.is_estimated]
+        if not real:
+            return 0
+        now = int(time.time())
+        obs = np.zeros(len(real), dtype=OBS_DTYPE)
+        obs["route"] = [f"{d.origin}-{d.destination}" for d in real]
+        obs["depart"] = (np.array([d.date for d in real], dtype="datetime64[D]") - _EPOCH).astype(np.int32)
+        obs["observed"] = [d.fetchedAt // 1000 if d.fetchedAt else now for d in real]
+        obs["price"] = [d.price for d in real]
+        obs["airline"] = [(d.airline_code or "")[:3] for d in real]
+        obs["provider"] = [(d.provider or "")[:8] for d in real]
+
+        months = obs["observed"].astype("datetime64[s]").astype("datetime64[M]")
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        for month in np.unique(months):
+            part = obs[months == month]
+            part = part[np.lexsort((part["observed"], part["route"]))]
+            _save(self.raw_dir / str(month) / f"seg-{stamp}-{uuid.uuid4().hex[:8]}.npz", part)
+        return len(obs)
+
+    def compact(self, retain_days: int = HISTORY_RAW_RETENTION_DAYS) -> None:
+        """Merge each month's raw segments; roll up and drop raw months past retention."""
+        if not self.raw_dir.exists():
+            return
+        cutoff = (datetime.utcnow() - timedelta(days=retain_days)).strftime("%Y-%m")
+        for month_dir in sorted(p for p in self.raw_dir.iterdir() if p.is_dir()):
+            segments = sorted(month_dir.glob("*.npz"))
+            if not segments:
+                continue
+            if month_dir.name < cutoff:
+                obs = np.concatenate([_load(p) for p in segments])
+                rollup_path = self.rollup_dir / f"{month_dir.name}.npz"
+                parts = [_load_rollup(rollup_path)] if rollup_path.exists() else []
+                _save(rollup_path, _merge_rollups(parts + [daily_rollup(obs)]))
+                shutil.rmtree(month_dir)
+                logger.info(f"Price history: rolled up {len(obs)} observations of {month_dir.name}")
+            elif len(segments) > 1:
+                # One fixed name per month, so compaction leaves no trail of replaced files
+                target = month_dir / "compact.npz"
+                obs = np.concatenate([_load(p) for p in segments])
+                obs = obs[np.lexsort((obs["observed"], obs["route"]))]
+                _save(target, obs)
+                for p in segments:
+                    if p != target:
+                        p.unlink()
+
+    # ─── Read ──────────────────────────────────────────────────────────────
+    def observations(self, origin: str, destination: str) -> np.ndarray:
+        """Every raw (not yet rolled up) observation of a route, oldest first."""
+        route = f"{origin}-{destination}".encode("ascii")
+        parts = [_route_slice(_load(p), route) for p in sorted(self.raw_dir.glob("*/*.npz"))]
+        obs = np.concatenate(parts) if parts else np.zeros(0, dtype=OBS_DTYPE)
+        return obs[np.argsort(obs["observed"], kind="stable")]
+
+    def scan(self, origin: str, destination: str, start: Optional[str] = None,
+             end: Optional[str] = None) -> np.ndarray:
+        """Daily min/median/count rows per departure date of a route, between two observation dates (inclusive)."""
+        route = f"{origin}-{destination}".encode("ascii")
+        first = (np.datetime64(start, "D") - _EPOCH).astype(int) if start else None
+        last = (np.datetime64(end, "D") - _EPOCH).astype(int) if end else None
+
+        parts = []
+        for path in sorted(self.rollup_dir.glob("*.npz")):
+            month = np.datetime64(path.stem, "M")
+            if start and (month + 1).astype("datetime64[D]") <= np.datetime64(start, "D"):
+                continue
+            if end and month.astype("datetime64[D]") > np.datetime64(end, "D"):
+                continue
+            parts.append(_route_slice(_load_rollup(path), route))
+        parts.append(daily_rollup(self.observations(origin, destination)))
+
+        rows = _merge_rollups(parts)
+        if first is not None:
+            rows = rows[rows["day"] >= first]
+        if last is not None:
+            rows = rows[rows["day"] <= last]
+        return rows
+
+    def all_rollups(self, since: Optional[str] = None) -> np.ndarray:
+        """Daily rollups of every route, from rollup files and raw segments alike."""
+        parts = [_load_rollup(p) for p in sorted(self.rollup_dir.glob("*.npz"))
+                 if not since or p.stem >= since[:7]]
+        raw = [_load(p) for p in sorted(self.raw_dir.glob("*/*.npz"))]
+        if raw:
+            parts.append(daily_rollup(np.concatenate(raw)))
+        rows = _merge_rollups(parts)
+        if since:
+            rows = rows[rows["day"] >= (np.datetime64(since, "D") - _EPOCH).astype(int)]
+        return rows
+
+    # ─── Export ────────────────────────────────────────────────────────────
+    def export_trends(self, path: Path, days: int = HISTORY_EXPORT_DAYS) -> int:
+        """
+        Write precomputed daily trends per route and departure month for the
+        last ``days`` days:
+        {"meta": {...}, "routes": {"RGN-BKK": {"2026-11": [["2026-10-01", min, median, count], ...]}}}
+        ``min`` is the cheapest fare seen that day for any departure of the
+        month, ``median`` the median of the per-departure-date minimums, so
+        each travel date weighs the same however often it was observed.
+        """
+        since = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+        rows = self.all_rollups(since)
+        rows = rows[rows["depart"] >= 0]
+        months = (_EPOCH + rows["depart"].astype("timedelta64[D]")).astype("datetime64[M]")
+        order = np.lexsort((rows["min"], rows["day"], months, rows["route"]))
+        rows, months = rows[order], months[order]
+
+        routes: Dict[str, Dict[str, List]] = {}
+        if len(rows):
+            start = np.ones(len(rows), dtype=bool)
+            start[1:] = ((rows["route"][1:] != rows["route"][:-1]) | (months[1:] != months[:-1])
+                         | (rows["day"][1:] != rows["day"][:-1]))
+            starts = np.flatnonzero(start)
+            counts = np.diff(np.append(starts, len(rows)))
+            # Sorted by min within each group: the cheapest is first, the median in the middle
+            lo, hi = starts + (counts - 1) // 2, starts + counts // 2
+            medians = (rows["min"][lo] + rows["min"][hi]) / 2
+            totals = np.add.reduceat(rows["count"], starts)
+            for route, month, day, low, median, count in zip(
+                    rows["route"][starts].tolist(), months[starts].astype(str).tolist(), rows["day"][starts].tolist(),
+                    rows["min"][starts].tolist(), medians.tolist(), totals.tolist()):
+                routes.setdefault(route.decode("ascii"), {}).setdefault(month, []).append(
+                    [_day_str(day), round(low, 2), round(median, 2), count]
+                )
+
+        from .writer import write_output_json
+        write_output_json(Path(path), {
+            "meta": {
+                "updated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M"),
+                "since": since,
+                "routes": len(routes),
+                "grouped_by": ["route", "departure_month"],
+                "fields": ["day", "min", "median", "count"],
+                "currency": "USD",
+            },
+            "routes": routes,
+        })
+        return len(routes)
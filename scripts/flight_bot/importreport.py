@@ -0,0 +1,66 @@
+"""
+Import-time report: how much each module of the bot costs to import.
+
+Every target is imported in a fresh interpreter under ``-X importtime`` so
+the numbers are cold-start costs, unaffected by what this process already
+loaded. Used by ``python -m scripts.flight_bot --import-report``.
+"""
+import subprocess
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_MODULES = (
+    "scripts.flight_bot",
+    "scripts.flight_bot.config",
+    "scripts.flight_bot.models",
+    "scripts.flight_bot.writer",
+    "scripts.flight_bot.merger",
+    "scripts.flight_bot.validator",
+    "scripts.flight_bot.pipeline",
+    "scripts.flight_bot.bot",
+)
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """(imported name, self µs, cumulative µs) for every import triggered by ``module``."""
+    return _importtime(f"import {module}")
+
+
+def _importtime(code: str) -> List[Tuple[str, int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code} failed: {proc.stderr.strip().splitlines()[-1]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_report(modules: Sequence[str] = DEFAULT_MODULES, top: int = 8) -> str:
+    # Interpreter startup (site, sitecustomize...) is paid by every target alike
+    startup = {name.strip() for name, _, _ in _importtime("pass")}
+    lines = [f"{'module':<36} {'cold import':>12}  heaviest third-party imports"]
+    for module in modules:
+        try:
+            rows = measure(module)
+        except RuntimeError as e:
+            lines.append(f"{module:<36} {'failed':>12}  {e}")
+            continue
+        total = next((cum for name, _, cum in rows if name == module), sum(s for _, s, _ in rows))
+        # Top-level third-party packages, by cumulative cost
+        heavy: Dict[str, int] = {}
+        for name, _, cum in rows:
+            if (name in startup or "." in name or name.startswith("_") or name == "scripts"
+                    or name in sys.stdlib_module_names):
+                continue
+            heavy[name] = max(heavy.get(name, 0), cum)
+        worst = sorted(heavy.items(), key=lambda kv: -kv[1])[:top]
+        detail = ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in worst if us >= 1000)
+        lines.append(f"{module:<36} {total / 1000:>10.1f}ms  {detail or '-'}")
+    return "\n".join(lines)
@@ -1,8 +1,8 @@
 import logging
 import json
-import os
+from functools import lru_cache
 from typing import List, Dict
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 from .models import FlightDeal
@@ -10,17 +10,99 @@ from .config import OUTPUT_PATH
 
 logger = logging.getLogger(__name__)
 
-def load_existing_data() -> Dict:
-    """Load existing flight_data.json or return empty structure."""
+def decode_columnar(doc: Dict) -> Dict:
+    """A schema 2 document (writer.encode_columnar) as the v1 ``{"meta", "routes"}`` structure."""
+    meta, tables, cols = doc["meta"], doc["dict"], doc["routes"]
+    base_date = date.fromisoformat(meta["base_date"])
+    base_time = int(meta["base_time"])
+    airports, airlines = tables["airport"], tables["airline"]
+    found_cache: Dict[int, str] = {}
+
+    routes = []
+    for (origin, destination, day, price, airline, transfers, flight_number, found_at,
+         fetched_at, provider, region, currency, flags) in zip(
+            cols["origin"], cols["destination"], cols["date"], cols["price"], cols["airline"],
+            cols["transfers"], cols["flight_number"], cols["found_at"], cols["fetchedAt"],
+            cols["provider"], cols["region"], cols["currency"], cols["flags"]):
+        code, *name = airlines[airline]
+        if found_at is not None and found_at not in found_cache:
+            found_cache[found_at] = datetime.utcfromtimestamp((base_time // 60 + found_at) * 60).strftime("%Y-%m-%d %H:%M")
+        routes.append({
+            "origin": airports[origin],
+            "destination": airports[destination],
+            "price": price,
+            "date": (base_date + timedelta(days=day)).isoformat(),
+            "currency": tables["currency"][currency],
+            "airline": name[0] if name else code,
+            "airline_code": code,
+            "transfers": transfers,
+            "found_at": "" if found_at is None else found_cache[found_at],
+            "fetchedAt": 0 if fetched_at is None else base_time * 1000 + fetched_at,
+            "provider": tables["provider"][provider],
+            "is_amadeus": bool(flags & 1),
+            "is_estimated": bool(flags & 2),
+            "region": tables["region"][region],
+            "flight_number": flight_number,
+        })
+    meta = {k: v for k, v in meta.items() if k not in ("schema", "base_date", "base_time", "content_hash")}
+    return {"meta": meta, "routes": routes}
+
+def read_dataset(path: Path) -> Dict:
+    """Parse a flight_data file of either schema into the v1 structure."""
+    with Path(path).open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("meta", {}).get("schema") == 2:
+        return decode_columnar(data)
+    return data
+
+def load_existing_data(prefer_binary: bool = False) -> Dict:
+    """
+    Load existing flight_data.json (or flight_data.v2.json when only the
+    columnar file is written) or return empty structure.
+    With prefer_binary, future-dated routes are read from a fresh binary
+    companion instead (meta is left empty; merges rebuild it anyway).
+    """
     path = Path(OUTPUT_PATH)
+    if prefer_binary:
+        from .binstore import open_companion
+        companion = open_companion(path)
+        if companion is not None:
+            try:
+                routes = companion.to_routes(min_date=datetime.utcnow().strftime("%Y-%m-%d"))
+                logger.info(f"Loaded {len(routes)} routes from binary companion")
+                return {"meta": {}, "routes": routes}
+            finally:
+                companion.close()
+    if not path.exists():
+        path = path.with_name(f"{path.stem}.v2.json")
     if path.exists():
         try:
-            with path.open("r", encoding="utf-8") as f:
-                return json.load(f)
+            return read_dataset(path)
         except Exception as e:
-            logger.error(f"Failed to load existing data from {OUTPUT_PATH}: {e}")
+            logger.error(f"Failed to load existing data from {path}: {e}")
     return {"meta": {}, "routes": []}
 
+def build_last_fetched_map(routes: List[Dict]) -> Dict[str, str]:
+    """Latest found_at per origin_destination_month key."""
+    last_fetched_map: Dict[str, str] = {}
+    for r in routes:
+        key = f"{r['origin']}_{r['destination']}_{r['date'][:7]}"
+        found_at = r.get("found_at") or "2000-01-01 00:00"
+        if key not in last_fetched_map or found_at > last_fetched_map[key]:
+            last_fetched_map[key] = found_at
+    return last_fetched_map
+
+def load_last_fetched_map() -> Dict[str, str]:
+    """Freshness map from the memory-mapped companion, falling back to a full JSON parse."""
+    from .binstore import open_companion
+    companion = open_companion(Path(OUTPUT_PATH))
+    if companion is not None:
+        try:
+            return companion.last_fetched_map()
+        finally:
+            companion.close()
+    return build_last_fetched_map(load_existing_data()["routes"])
+
 def merge_incremental(existing_deals: List[FlightDeal], new_deals: List[FlightDeal]) -> List[FlightDeal]:
     """
     Merge new deals into existing deals using the Idempotency/Business Key policy.
@@ -68,8 +150,9 @@ def merge_incremental(existing_deals: List[FlightDeal], new_deals: List[FlightDe
     return list(merged_map.values())
 
 
+@lru_cache(maxsize=1)
 def _load_static_airlines() -> Dict[str, str]:
-    """Load airline names from local cache."""
+    """Load airline names from local cache (once per process; the daemon keeps them warm)."""
     cache_path = Path(__file__).parent / "cache" / "airlines.json"
     if not cache_path.exists():
         return {}
@@ -95,80 +178,3 @@ def resolve_names(routes: List[Dict]):
             # Only update if current airline is empty or just the code
             if not r.get("airline") or r.get("airline") == code:
                 r["airline"] = airlines[code]
-
-def merge_and_save(existing_data: Dict, new_routes: list, processed_tasks: list, error_count: int):
-    """
-    Legacy merge function used by bot.py.
-    Merges new_routes into existing_data and writes flight_data.json.
-    """
-    import json
-    from datetime import datetime
-
-    today_str = datetime.utcnow().strftime("%Y-%m-%d")
-
-    # Build merged routes list
-    existing_routes = existing_data.get("routes", [])
-    
-    # Create a map keyed by (origin, dest, date, airline) for deduplication
-    merged_map = {}
-    
-    # Add existing routes (skip past dates)
-    for r in existing_routes:
-        if r.get("date", "") < today_str:
-            continue
-        # Ensure we have airline_code for indexing
-        code = r.get("airline_code") or r.get("airline", "")
-        key = f"{r['origin']}-{r['destination']}-{r['date']}-{code}"
-        merged_map[key] = r
-    
-    # Merge new routes (keep cheapest)
-    for r in new_routes:
-        if r.get("date", "") < today_str:
-            continue
-        code = r.get("airline_code") or r.get("airline", "")
-        key = f"{r['origin']}-{r['destination']}-{r['date']}-{code}"
-        existing = merged_map.get(key)
-        if not existing or r["price"] < existing["price"]:
-            merged_map[key] = r
-        elif r["price"] == existing["price"] and r.get("is_amadeus") and not existing.get("is_amadeus"):
-            merged_map[key] = r
-    
-    # Enrich with names before saving
-    final_routes = list(merged_map.values())
-    resolve_names(final_routes)
-
-    # Sort by origin, destination, price
-    sorted_routes = sorted(
-        final_routes,
-        key=lambda x: (x['origin'], x['destination'], x['price'])
-    )
-
-    now_str = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
-    
-    output = {
-        "meta": {
-            "updated_at": now_str,
-            "count": len(sorted_routes),
-            "currency": "USD",
-            "errors": error_count,
-        },
-        "routes": sorted_routes,
-    }
-
-    # Write to file
-    output_path = Path(OUTPUT_PATH)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    temp_path = output_path.with_suffix(".json.tmp")
-    with temp_path.open("w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
-        f.flush()
-        os.fsync(f.fileno())
-    temp_path.replace(output_path)
-    
-    # Update the existing_data in-place so bot.py stays in sync
-    existing_data["routes"] = sorted_routes
-    existing_data["meta"] = output["meta"]
-    
-    logger.info(f"Saved {len(sorted_routes)} routes to {OUTPUT_PATH}")
-
@@ -0,0 +1,97 @@
+"""
+Metropolitan-area grouping of the scanned airports.
+
+Several scanned airports share a city (BKK and DMK are both Bangkok, PVG and
+SHA both Shanghai). TravelPayouts accepts city codes in origin/destination
+and reports the actual ``origin_airport``/``destination_airport`` on every
+item. One city-level query therefore covers every airport pair of the two
+cities, and its items fan back out to airport-level tasks.
+
+Airport → city comes from cache/airports.json (written by
+update_static_data.py), with METRO_FALLBACK when the cache is missing. Only
+cities with two or more scanned airports are collapsed. A single-airport
+city gains nothing from a city query and may pull in unscanned airports.
+"""
+import json
+import logging
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .config import (
+    STATIC_CACHE_DIR, METRO_FALLBACK, SEA_AIRPORTS, JAPAN_AIRPORTS, KOREA_AIRPORTS,
+    INDIA_AIRPORTS, CHINA_AIRPORTS, TAIWAN_AIRPORTS, UAE_AIRPORTS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def scanned_airports() -> set:
+    return set(SEA_AIRPORTS + JAPAN_AIRPORTS + KOREA_AIRPORTS + INDIA_AIRPORTS
+               + CHINA_AIRPORTS + TAIWAN_AIRPORTS + UAE_AIRPORTS)
+
+
+def _load_json(path: Path):
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load {path}: {e}")
+        return None
+
+
+def load_airport_cities(cache_dir: Optional[Path] = None) -> Dict[str, str]:
+    """Airport IATA code -> city code, from the static cache or the built-in fallback."""
+    cache_dir = Path(cache_dir or STATIC_CACHE_DIR)
+    airports = _load_json(cache_dir / "airports.json") if (cache_dir / "airports.json").exists() else None
+    if not airports:
+        return dict(METRO_FALLBACK)
+    return {
+        a["code"]: a["city_code"] for a in airports
+        if a.get("code") and a.get("city_code")
+        and a.get("iata_type", "airport") == "airport" and a.get("flightable", True)
+    }
+
+
+class MetroMap:
+    """Collapses scanned airports of the same city into its city code."""
+
+    def __init__(self, airport_cities: Dict[str, str], universe: Iterable[str],
+                 city_names: Optional[Dict[str, str]] = None):
+        groups = defaultdict(set)
+        for airport in universe:
+            city = airport_cities.get(airport)
+            if city:
+                groups[city].add(airport)
+        self.groups = {city: sorted(airports) for city, airports in groups.items() if len(airports) > 1}
+        self._city_of = {a: city for city, airports in self.groups.items() for a in airports}
+        self.city_names = city_names or {}
+
+    def __bool__(self) -> bool:
+        return bool(self.groups)
+
+    def city(self, airport: str) -> str:
+        """City code if ``airport`` shares its city with another scanned airport, else the airport itself."""
+        return self._city_of.get(airport, airport)
+
+    def collapses(self, origin: str, destination: str) -> bool:
+        return origin in self._city_of or destination in self._city_of
+
+    def query_pair(self, origin: str, destination: str) -> Tuple[str, str]:
+        return self.city(origin), self.city(destination)
+
+    def describe(self) -> str:
+        return ", ".join(
+            f"{self.city_names.get(city, city)} ({city}): {'/'.join(airports)}"
+            for city, airports in sorted(self.groups.items())
+        )
+
+
+def load_metro_map(cache_dir: Optional[Path] = None) -> MetroMap:
+    cache_dir = Path(cache_dir or STATIC_CACHE_DIR)
+    cities = _load_json(cache_dir / "cities.json") if (cache_dir / "cities.json").exists() else None
+    names = {c["code"]: c.get("name") or c["code"] for c in cities or [] if c.get("code")}
+    metro = MetroMap(load_airport_cities(cache_dir), scanned_airports(), names)
+    if metro:
+        logger.info(f"Metro collapsing: {metro.describe()}")
+    return metro
@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
 import time
 
 @dataclass
@@ -20,19 +20,26 @@ class FlightDeal:
     provider: str = "tp"  # "tp" | "amadeus"
     is_amadeus: bool = False
     is_estimated: bool = False
+    region: str = ""      # Scheduler region tag, e.g. "SEA"
 
     def get_idempotency_key(self) -> str:
         """Business key: origin-dest-date-airline"""
         return f"{self.origin}-{self.destination}-{self.date}-{self.airline_code}"
 
     def to_dict(self) -> dict:
-        return {k: v for k, v in self.__dict__.items()}
+        # Wire format keeps the legacy "flight_number" key
+        data = {k: v for k, v in self.__dict__.items()}
+        data["flight_number"] = data.pop("flight_num")
+        return data
 
     @classmethod
     def from_dict(cls, data: dict) -> 'FlightDeal':
         # Filter out keys that aren't in the dataclass
         valid_keys = cls.__dataclass_fields__.keys()
         filtered_data = {k: v for k, v in data.items() if k in valid_keys}
+        # Legacy records use "flight_number"
+        if "flight_num" not in filtered_data and data.get("flight_number"):
+            filtered_data["flight_num"] = str(data["flight_number"])
         return cls(**filtered_data)
 
 @dataclass
@@ -44,6 +51,8 @@ class RouteTask:
     region: str          # "Thailand"
     priority: int = 1
     last_fetched_at: Optional[str] = None # ISO UTC
+    demand: float = 0.0  # Watchers/requests for this route-month (demand.py)
+    dates: List[str] = field(default_factory=list)  # Specific departure days (Amadeus probes); empty = whole month
 
 @dataclass
 class CheckpointState:
@@ -52,7 +61,8 @@ class CheckpointState:
     last_processed_index: int = 0
     completed_keys: List[str] = field(default_factory=list)
     failed_keys: List[str] = field(default_factory=list)
-    provider_health: Dict[str, str] = field(default_factory=lambda: {"tp": "up", "amadeus": "up"})
+    # Circuit breaker state per provider (breaker.py); legacy checkpoints hold "up"/"down"
+    provider_health: Dict[str, Any] = field(default_factory=lambda: {"tp": "up", "amadeus": "up"})
     last_saved_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
 
     def to_dict(self) -> dict:
@@ -64,8 +74,18 @@ class RuntimeConfig:
     tp_token: str
     amadeus_id: Optional[str] = None
     amadeus_secret: Optional[str] = None
+    amadeus_hostname: str = "test"
     max_requests: int = 200
+    amadeus_max_requests: int = 15
     checkpoint_interval: int = 50
+    fetch_workers: int = 1
+    providers: List[str] = field(default_factory=lambda: ["tp", "amadeus"])  # Registry keys, in fetch order
+    shard_index: int = 0                    # This worker's slice of the task universe...
+    shard_count: int = 1                    # ...out of this many (1 = unsharded run)
+    checkpoint_path: Optional[str] = None   # None = scheduler.CHECKPOINT_PATH
+    deadline_seconds: Optional[int] = None  # Wall-clock budget for the run
     output_path: str = "client/public/data/flight_data.json"
-    transport_path: str = "client/public/data/transport.json"
+    # Flight records in transport.json format; off by default because the
+    # checked-in transport.json is the 12Go ground-transport dataset
+    transport_path: Optional[str] = None
     pythonpath: str = "."
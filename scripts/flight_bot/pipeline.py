@@ -0,0 +1,549 @@
+"""
+Unified staged pipeline: schedule → fetch → validate → history → merge → write.
+
+Both entry points (``python -m scripts.flight_bot`` and ``main.main``) run
+the same stages. Work is processed in checkpoint-sized batches: every
+stage's ``process`` runs once per batch, so the expensive merge and write
+happen once per checkpoint instead of once per task. Stages are plain
+objects; a run can replace or add one without touching the loop.
+
+Pipeline runs the stages in lockstep. StreamingPipeline (the default when
+more than one fetch worker is configured) overlaps them: worker threads
+fetch tasks and put deal batches on a bounded queue, while a consumer
+thread runs the stages after fetch (validate, merge, write) in the
+background. A full queue blocks the workers until the consumer catches up.
+
+Deferred providers (Amadeus) sit out the task loop. Once it ends, the
+allocator turns their quota into (route, date) probes over what this run
+fetched, and the stages after fetch process the results as one last batch.
+
+``Pipeline.run`` returns 1 when the run stopped because every provider
+circuit was open, or when it processed tasks but no fetch returned a deal
+and errors were counted; the workflow must not publish such a run.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .config import (
+    MAX_REQUESTS_PER_RUN, AMADEUS_MAX_REQUESTS_PER_RUN, CHECKPOINT_EVERY,
+    FETCH_WORKERS, FETCH_QUEUE_SIZE,
+)
+from . import config as settings
+from .models import RuntimeConfig, CheckpointState, FlightDeal, RouteTask
+from .scheduler import (
+    generate_tasks, load_checkpoint, save_checkpoint_file, close_checkpoint, shard_checkpoint_path,
+)
+from .merger import load_existing_data, load_last_fetched_map, merge_incremental
+from .allocator import AmadeusAllocator
+from .demand import DemandTable, load_demand
+from .fetcher import FetchManager
+from .fx import normalize_deals
+from .history import PriceHistory
+from .planner import RunPlanner
+from .profiling import phase
+from .validator import ValidationReport, validate_deals
+from .writer import finalize_outputs
+
+logger = logging.getLogger(__name__)
+
+# Stop reason that fails the run
+ALL_PROVIDERS_DOWN = "all provider circuits open"
+
+
+def _share(total: int, index: int, count: int) -> int:
+    """Shard ``index``'s part of a run-wide budget; the parts add up to ``total``."""
+    return total // count + (1 if index < total % count else 0)
+
+
+def load_runtime_config(shard: Optional[Tuple[int, int]] = None) -> RuntimeConfig:
+    """
+    Loads bot configuration from environment variables (config.py supplies the defaults).
+    With ``shard=(index, count)`` the request quotas are this shard's share of the
+    run-wide budget and the checkpoint is kept per shard.
+    """
+    settings.load_env()
+    config = RuntimeConfig(
+        tp_token=os.getenv("TRAVELPAYOUTS_TOKEN", ""),
+        amadeus_id=os.getenv("AMADEUS_CLIENT_ID"),
+        amadeus_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
+        amadeus_hostname=os.getenv("AMADEUS_HOSTNAME", "test"),
+        max_requests=int(os.getenv("MAX_REQUESTS_PER_RUN", str(MAX_REQUESTS_PER_RUN))),
+        # AMADEUS_MAX_REQUESTS_PER_RUN counts the old 3-date tasks; the allocator spends it one date per call
+        amadeus_max_requests=AMADEUS_MAX_REQUESTS_PER_RUN * 3,
+        checkpoint_interval=int(os.getenv("CHECKPOINT_EVERY", str(CHECKPOINT_EVERY))),
+        fetch_workers=int(os.getenv("FLIGHT_BOT_WORKERS", str(FETCH_WORKERS))),
+        providers=[p.strip() for p in os.getenv("FLIGHT_BOT_PROVIDERS", "tp,amadeus").split(",") if p.strip()],
+        deadline_seconds=settings.RUN_DEADLINE_SECONDS,
+        transport_path=os.getenv("FLIGHT_BOT_TRANSPORT_PATH") or None,
+    )
+    if shard and shard[1] > 1:
+        index, count = shard
+        config.shard_index, config.shard_count = index, count
+        config.max_requests = _share(config.max_requests, index, count)
+        config.amadeus_max_requests = _share(config.amadeus_max_requests, index, count)
+        config.checkpoint_path = str(shard_checkpoint_path(index, count))
+    return config
+
+
+def task_key(task: RouteTask) -> str:
+    return f"{task.origin}_{task.destination}_{task.month}"
+
+
+@dataclass
+class PipelineContext:
+    """Mutable state shared by the stages of one run."""
+    config: RuntimeConfig
+    run_id: str
+    planner: RunPlanner
+    checkpoint: Optional[CheckpointState] = None
+    last_fetched_map: Dict[str, str] = field(default_factory=dict)
+    demand: DemandTable = field(default_factory=DemandTable)
+    tasks: List[RouteTask] = field(default_factory=list)
+    processed: List[RouteTask] = field(default_factory=list)
+    answered: Set[str] = field(default_factory=set)  # Keys of processed tasks whose fetch returned deals
+    done: Set[str] = field(default_factory=set)
+    # Per-batch buffers
+    batch: List[RouteTask] = field(default_factory=list)
+    fetched: List[FlightDeal] = field(default_factory=list)
+    accepted: List[FlightDeal] = field(default_factory=list)
+    observed: List[FlightDeal] = field(default_factory=list)  # Every accepted deal of the run (allocator input)
+    # Run totals
+    new_deals: int = 0
+    errors: int = 0
+    requests: int = 0
+    fetched_deals: int = 0  # Deals providers returned, before validation
+    failed_tasks: int = 0  # Tasks whose fetch raised
+    validation: ValidationReport = field(default_factory=ValidationReport)
+    stop_reason: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    _deals: Optional[List[FlightDeal]] = None
+
+    @property
+    def deals(self) -> List[FlightDeal]:
+        """Existing dataset, loaded on first use (a run with no work never parses it)."""
+        if self._deals is None:
+            with phase("load"):
+                existing_json = load_existing_data(prefer_binary=True)
+                self._deals = [FlightDeal.from_dict(d) for d in existing_json.get("routes", [])]
+            logger.info(f"Loaded {len(self._deals)} existing deals.")
+        return self._deals
+
+    @deals.setter
+    def deals(self, value: List[FlightDeal]) -> None:
+        self._deals = value
+
+
+class Stage:
+    """Pipeline stage; override the hooks the stage needs."""
+    name = "stage"
+
+    def setup(self, ctx: PipelineContext) -> None:
+        """Runs once before the first batch."""
+
+    def process(self, ctx: PipelineContext) -> None:
+        """Runs once per checkpoint batch."""
+
+    def finish(self, ctx: PipelineContext) -> None:
+        """Runs once after the last batch of a run that did not fail."""
+
+
+class ScheduleStage(Stage):
+    """Builds the task queue and hands out one checkpoint batch at a time."""
+    name = "schedule"
+
+    def setup(self, ctx: PipelineContext) -> None:
+        ctx.checkpoint = load_checkpoint(ctx.run_id, ctx.config.checkpoint_path)
+        ctx.done.update(ctx.checkpoint.completed_keys)
+        if ctx.done:
+            logger.info(f"Resuming: {len(ctx.done)} route-months already done by the interrupted run")
+
+        with phase("load"):
+            # A warm context (daemon mode) arrives with both already in memory
+            if not ctx.last_fetched_map:
+                ctx.last_fetched_map = load_last_fetched_map()
+            if not ctx.demand:
+                ctx.demand = load_demand()
+        # Open with half the TP quota; the planner extends the queue while quota and time allow
+        ctx.tasks = self._next_tasks(ctx, ctx.planner.quota_left("tp") // 2)
+        logger.info(f"Total scheduled tasks: {len(ctx.tasks)}")
+
+    def _next_tasks(self, ctx: PipelineContext, extra: int) -> List[RouteTask]:
+        limit = len(ctx.done) + extra
+        shard = (ctx.config.shard_index, ctx.config.shard_count) if ctx.config.shard_count > 1 else None
+        tasks = generate_tasks(ctx.last_fetched_map, limit=limit, shard=shard, demand=ctx.demand)
+        return [t for t in tasks if task_key(t) not in ctx.done]
+
+    def next_batch(self, ctx: PipelineContext) -> List[RouteTask]:
+        """Next checkpoint-sized slice of the queue, extending the queue once it runs dry."""
+        if not ctx.tasks:
+            extra = ctx.planner.capacity("tp")
+            if extra > 0:
+                ctx.tasks = self._next_tasks(ctx, extra)
+                if ctx.tasks:
+                    logger.info(f"Extending run by {len(ctx.tasks)} tasks")
+        batch = ctx.tasks[:ctx.config.checkpoint_interval]
+        ctx.tasks = ctx.tasks[len(batch):]
+        return batch
+
+    def process(self, ctx: PipelineContext) -> None:
+        ctx.batch = self.next_batch(ctx)
+
+
+class FetchStage(Stage):
+    """Fetches every task of the batch from all providers within budget."""
+    name = "fetch"
+
+    def __init__(self, fetcher: Optional[FetchManager] = None):
+        self.fetcher = fetcher
+
+    def setup(self, ctx: PipelineContext) -> None:
+        if self.fetcher is None:
+            self.fetcher = FetchManager(ctx.config)
+            # Start from the breaker states the last run (or the interrupted one) ended with
+            self.fetcher.restore_health(ctx.checkpoint.provider_health)
+        else:
+            # A warm fetcher (daemon mode) already holds the live breaker states; its
+            # request counters start over with this run's quotas
+            self.fetcher.reset_requests()
+            ctx.checkpoint.provider_health = self.fetcher.health()
+
+    def block_reason(self, ctx: PipelineContext, in_flight: int = 0) -> Optional[str]:
+        """Why no further task should start: TP budget spent, or every provider in an outage."""
+        if self.fetcher.all_down():
+            return ALL_PROVIDERS_DOWN
+        return ctx.planner.block_reason("tp", requests=1 + in_flight)
+
+    def fetch_task(self, ctx: PipelineContext, task: RouteTask, n: int) -> List[FlightDeal]:
+        logger.info(f"[{n}] {task.origin} -> {task.destination} ({task.month}, {task.region})")
+        deals = self.fetcher.fetch_all(task, ctx.planner)
+        if deals:
+            with ctx.lock:
+                ctx.answered.add(task_key(task))
+                ctx.fetched_deals += len(deals)
+        ctx.requests = self.fetcher.requests
+        ctx.errors = self.fetcher.errors
+        # Saved with the next checkpoint
+        ctx.checkpoint.provider_health = self.fetcher.health()
+        return deals
+
+    def plan_deferred(self, ctx: PipelineContext) -> List[RouteTask]:
+        """(route, date) probes for the deferred providers, within their remaining quota."""
+        providers = self.fetcher.deferred_providers()
+        if not providers or not ctx.processed:
+            return []
+        budget = max(ctx.planner.quota_left(p.key) for p in providers)
+        return AmadeusAllocator(ctx.demand).plan(ctx.processed, ctx.observed, ctx.deals, budget)
+
+    def fetch_deferred(self, ctx: PipelineContext, tasks: List[RouteTask]) -> List[FlightDeal]:
+        deals = self.fetcher.fetch_deferred(tasks, ctx.planner)
+        ctx.fetched_deals += len(deals)
+        ctx.requests = self.fetcher.requests
+        ctx.errors = self.fetcher.errors
+        ctx.checkpoint.provider_health = self.fetcher.health()
+        return deals
+
+    def process(self, ctx: PipelineContext) -> None:
+        fetched_tasks = []
+        for task in ctx.batch:
+            reason = self.block_reason(ctx)
+            if reason:
+                ctx.stop_reason = reason
+                break
+            ctx.done.add(task_key(task))
+            ctx.fetched.extend(self.fetch_task(ctx, task, len(ctx.processed) + 1))
+            fetched_tasks.append(task)
+            ctx.processed.append(task)
+
+        # Unfetched tasks of a stopped batch are dropped from this batch
+        ctx.batch = fetched_tasks
+
+
+class ValidateStage(Stage):
+    """USD conversion, then bounds, date and anomaly checks over the whole batch in one pass."""
+    name = "validate"
+
+    def process(self, ctx: PipelineContext) -> None:
+        # Providers may quote in other currencies; bounds and merges compare USD
+        ctx.fetched = normalize_deals(ctx.fetched)
+        ctx.accepted, report = validate_deals(ctx.fetched, ctx.deals)
+        ctx.observed.extend(ctx.accepted)
+        ctx.validation.add(report)
+        if report.rejected:
+            logger.info(f"Validation: {report.summary()}")
+
+
+class HistoryStage(Stage):
+    """Appends every accepted observation to the price history; compacts and exports trends at the end."""
+    name = "history"
+
+    def __init__(self, compact: bool = True):
+        # Shard runs only append; the reduce step compacts once all segments are in
+        self.compact = compact
+        self.store: Optional[PriceHistory] = None
+
+    def setup(self, ctx: PipelineContext) -> None:
+        if settings.WRITE_HISTORY:
+            self.store = PriceHistory()
+
+    def process(self, ctx: PipelineContext) -> None:
+        if self.store and ctx.accepted:
+            self.store.append(ctx.accepted)
+
+    def finish(self, ctx: PipelineContext) -> None:
+        if self.compact:
+            self.export()
+
+    def export(self) -> None:
+        """Compact the appended segments and rewrite price_trends.json."""
+        if self.store:
+            self.store.compact()
+            routes = self.store.export_trends(Path(settings.TRENDS_OUTPUT_PATH))
+            logger.info(f"Price trends exported for {routes} routes")
+
+
+class MergeStage(Stage):
+    """Folds the accepted batch into the dataset (cheapest price per business key, past dates dropped)."""
+    name = "merge"
+
+    def process(self, ctx: PipelineContext) -> None:
+        ctx.deals = merge_incremental(ctx.deals, ctx.accepted)
+        ctx.new_deals += len(ctx.accepted)
+
+
+class WriteStage(Stage):
+    """Writes outputs and the resume checkpoint after every batch."""
+    name = "write"
+
+    def process(self, ctx: PipelineContext) -> None:
+        if not ctx.batch:
+            return
+        started = time.monotonic()
+        finalize_outputs(
+            ctx.deals, Path(ctx.config.output_path),
+            Path(ctx.config.transport_path) if ctx.config.transport_path else None,
+            error_count=ctx.errors,
+        )
+        ctx.checkpoint.completed_keys.extend(task_key(t) for t in ctx.batch)
+        ctx.checkpoint.last_processed_index = len(ctx.checkpoint.completed_keys)
+        save_checkpoint_file(ctx.checkpoint, ctx.config.checkpoint_path)
+        ctx.planner.record_merge(time.monotonic() - started)
+
+    def finish(self, ctx: PipelineContext) -> None:
+        # Outputs are already current after the last batch; the run ended
+        # cleanly, so the next one starts from freshness order again.
+        close_checkpoint(ctx.checkpoint, ctx.config.checkpoint_path)
+
+
+def default_stages() -> List[Stage]:
+    return [ScheduleStage(), FetchStage(), ValidateStage(), HistoryStage(), MergeStage(), WriteStage()]
+
+
+class Pipeline:
+    """Runs the stages batch by batch until the queue or the budget runs out."""
+
+    def __init__(self, config: RuntimeConfig, stages: Optional[List[Stage]] = None):
+        self.config = config
+        self.stages = stages if stages is not None else default_stages()
+
+    def run(self, ctx: Optional[PipelineContext] = None) -> int:
+        """One run over ``ctx``: a fresh context by default, a warm one per daemon cycle."""
+        start_time = time.monotonic()
+        ctx = ctx or PipelineContext(
+            config=self.config,
+            run_id=str(uuid.uuid4())[:8],
+            planner=RunPlanner(self.config.deadline_seconds, {
+                "tp": self.config.max_requests,
+                "amadeus": self.config.amadeus_max_requests,
+            }),
+        )
+        logger.info("=" * 60)
+        logger.info(f"Flight bot run [ID: {ctx.run_id}] starting")
+        if self.config.deadline_seconds:
+            logger.info(f"Run deadline: {self.config.deadline_seconds}s")
+        logger.info("=" * 60)
+
+        for stage in self.stages:
+            with phase(stage.name):
+                stage.setup(ctx)
+
+        self.execute(ctx)
+
+        if ctx.stop_reason:
+            logger.info(f"Stopped early: {ctx.stop_reason}")
+        self.fill_gaps(ctx)
+        for stage in self.stages:
+            with phase(stage.name):
+                stage.finish(ctx)
+
+        elapsed = time.monotonic() - start_time
+        logger.info("=" * 60)
+        logger.info("RUN SUMMARY")
+        logger.info(f"  Tasks processed     : {len(ctx.processed)}")
+        logger.info(f"  HTTP requests       : {ctx.requests}")
+        logger.info(f"  New deals merged    : {ctx.new_deals}")
+        logger.info(f"  Validation          : {ctx.validation.summary()}")
+        logger.info(f"  Errors              : {ctx.errors}")
+        logger.info(f"  Budget              : {ctx.planner.summary()}")
+        logger.info(f"  Duration            : {elapsed:.1f}s")
+        logger.info("=" * 60)
+
+        failure = self.failure(ctx)
+        if failure:
+            logger.critical(f"Run failed: {failure}")
+            return 1
+        return 0
+
+    @staticmethod
+    def failure(ctx: PipelineContext) -> Optional[str]:
+        """Why the run must not count as a success, or None."""
+        if ctx.stop_reason == ALL_PROVIDERS_DOWN:
+            return ctx.stop_reason
+        if ctx.processed and not ctx.fetched_deals and (ctx.errors or ctx.failed_tasks):
+            return (f"no deals from {len(ctx.processed)} tasks "
+                    f"({ctx.errors} provider errors, {ctx.failed_tasks} failed tasks)")
+        return None
+
+    def fill_gaps(self, ctx: PipelineContext) -> None:
+        """Deferred providers fetch the allocator's probes; the stages after fetch process them as one batch."""
+        fetch_at = next((i for i, s in enumerate(self.stages) if isinstance(s, FetchStage)), None)
+        if fetch_at is None:
+            return
+        fetch: FetchStage = self.stages[fetch_at]
+        with phase(fetch.name):
+            probes = fetch.plan_deferred(ctx)
+            if not probes:
+                return
+            deals = fetch.fetch_deferred(ctx, probes)
+        logger.info(f"Amadeus probes: {len(deals)} deals from {len(probes)} planned calls")
+        ctx.batch, ctx.fetched, ctx.accepted = probes, deals, []
+        for stage in self.stages[fetch_at + 1:]:
+            with phase(stage.name):
+                stage.process(ctx)
+
+    def execute(self, ctx: PipelineContext) -> None:
+        """Lockstep loop: every stage processes a batch before the next batch starts."""
+        while not ctx.stop_reason:
+            ctx.batch, ctx.fetched, ctx.accepted = [], [], []
+            for stage in self.stages:
+                with phase(stage.name):
+                    stage.process(ctx)
+                if not ctx.batch:
+                    break
+            if not ctx.batch:
+                break
+
+
+_DONE = object()
+
+
+class StreamingPipeline(Pipeline):
+    """
+    Overlaps network I/O with CPU/disk work: fetch workers feed a bounded
+    queue, a consumer thread validates, merges and checkpoints behind them.
+    """
+
+    def execute(self, ctx: PipelineContext) -> None:
+        fetch_at = next(i for i, s in enumerate(self.stages) if isinstance(s, FetchStage))
+        schedule = next(s for s in self.stages[:fetch_at] if isinstance(s, ScheduleStage))
+        fetch: FetchStage = self.stages[fetch_at]
+        sinks = self.stages[fetch_at + 1:]
+
+        workers = max(self.config.fetch_workers, 1)
+        tasks: "queue.Queue" = queue.Queue(maxsize=workers)
+        results: "queue.Queue" = queue.Queue(maxsize=FETCH_QUEUE_SIZE)
+        in_flight = [0]
+        submitted = 0
+        failure: List[BaseException] = []
+
+        def worker() -> None:
+            while True:
+                item = tasks.get()
+                if item is _DONE:
+                    return
+                n, task = item
+                try:
+                    with phase(fetch.name, memory=False):
+                        deals = fetch.fetch_task(ctx, task, n)
+                except Exception as e:
+                    logger.error(f"Fetch worker failed for {task.origin}->{task.destination}: {e}")
+                    deals = []
+                    with ctx.lock:
+                        ctx.failed_tasks += 1
+                with ctx.lock:
+                    in_flight[0] -= 1
+                results.put((task, deals))  # Blocks while the consumer is behind
+
+        def consumer() -> None:
+            pending_tasks: List[RouteTask] = []
+            pending_deals: List[FlightDeal] = []
+            try:
+                while True:
+                    item = results.get()
+                    if item is not _DONE:
+                        task, deals = item
+                        pending_tasks.append(task)
+                        pending_deals.extend(deals)
+                        ctx.processed.append(task)
+                    full = len(pending_tasks) >= self.config.checkpoint_interval
+                    if pending_tasks and (full or item is _DONE):
+                        ctx.batch, ctx.fetched, ctx.accepted = pending_tasks, pending_deals, []
+                        for stage in sinks:
+                            with phase(stage.name):
+                                stage.process(ctx)
+                        pending_tasks, pending_deals = [], []
+                    if item is _DONE:
+                        return
+            except BaseException as e:
+                failure.append(e)
+                # Keep draining so workers never block on a dead consumer
+                while results.get() is not _DONE:
+                    pass
+
+        threads = [threading.Thread(target=worker, name=f"fetch-{i}", daemon=True) for i in range(workers)]
+        sink_thread = threading.Thread(target=consumer, name="merge-writer", daemon=True)
+        for t in threads:
+            t.start()
+        sink_thread.start()
+
+        try:
+            while not ctx.stop_reason and not failure:
+                with phase(schedule.name):
+                    batch = schedule.next_batch(ctx)
+                if not batch:
+                    break
+                for task in batch:
+                    # Count tasks already handed to workers against the quota
+                    with ctx.lock:
+                        reason = fetch.block_reason(ctx, in_flight[0])
+                        if not reason:
+                            in_flight[0] += 1
+                            ctx.done.add(task_key(task))
+                    if reason:
+                        ctx.stop_reason = reason
+                        break
+                    submitted += 1
+                    tasks.put((submitted, task))
+        finally:
+            for _ in threads:
+                tasks.put(_DONE)
+            for t in threads:
+                t.join()
+            results.put(_DONE)
+            sink_thread.join()
+
+        if failure:
+            raise failure[0]
+
+
+def build_pipeline(config: RuntimeConfig, stages: Optional[List[Stage]] = None) -> Pipeline:
+    """Streaming execution when more than one fetch worker is configured."""
+    if config.fetch_workers > 1:
+        return StreamingPipeline(config, stages)
+    return Pipeline(config, stages)
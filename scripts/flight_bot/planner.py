@@ -0,0 +1,90 @@
+"""
+Budget-aware run planner.
+
+Tracks a wall-clock deadline and per-provider request quotas, learns task
+throughput from live latencies, and tells the run loop whether another task
+still fits before the final merge has to start.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .config import FINAL_MERGE_RESERVE_SECONDS, PLANNER_EWMA_ALPHA
+
+logger = logging.getLogger(__name__)
+
+
+class RunPlanner:
+    """Decides how much work fits between now and the deadline."""
+
+    def __init__(
+        self,
+        deadline_seconds: Optional[float],
+        quotas: Dict[str, int],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.started_at = clock()
+        self.deadline = self.started_at + deadline_seconds if deadline_seconds else None
+        self.quotas = dict(quotas)
+        self.used: Dict[str, int] = {name: 0 for name in quotas}
+        self.task_seconds: Dict[str, float] = {}
+        self.merge_seconds = float(FINAL_MERGE_RESERVE_SECONDS)
+        self._lock = threading.Lock()
+
+    # ─── Observations ──────────────────────────────────────────────────────
+    def record_task(self, provider: str, seconds: float, requests: int = 1) -> None:
+        """Feed one finished task's wall time and request count into the estimates."""
+        with self._lock:
+            self.used[provider] = self.used.get(provider, 0) + requests
+            prev = self.task_seconds.get(provider)
+            self.task_seconds[provider] = seconds if prev is None else (
+                PLANNER_EWMA_ALPHA * seconds + (1 - PLANNER_EWMA_ALPHA) * prev
+            )
+
+    def record_merge(self, seconds: float) -> None:
+        """Checkpoint merges tell us how long the final merge will take (with headroom)."""
+        with self._lock:
+            self.merge_seconds = max(self.merge_seconds * 0.5, seconds * 1.5)
+
+    def expire(self) -> None:
+        """Move the deadline to now: no further task starts (graceful shutdown)."""
+        with self._lock:
+            self.deadline = self.clock()
+
+    # ─── Queries ───────────────────────────────────────────────────────────
+    def time_left(self) -> float:
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - self.clock() - self.merge_seconds
+
+    def quota_left(self, provider: str) -> int:
+        return self.quotas.get(provider, 0) - self.used.get(provider, 0)
+
+    def block_reason(self, provider: str, requests: int = 1) -> Optional[str]:
+        """Why one more task for ``provider`` does not fit, or None if it does."""
+        # Providers without a configured quota are limited by time only
+        if provider in self.quotas and self.quota_left(provider) < requests:
+            return f"{provider} quota exhausted"
+        if self.time_left() < self.task_seconds.get(provider, 0.0):
+            return "deadline reached"
+        return None
+
+    def can_start(self, provider: str, requests: int = 1) -> bool:
+        """True if one more task for ``provider`` fits in both quota and time."""
+        return self.block_reason(provider, requests) is None
+
+    def capacity(self, provider: str, requests_per_task: int = 1) -> int:
+        """Estimated number of further tasks that fit for ``provider``."""
+        by_quota = max(self.quota_left(provider), 0) // max(requests_per_task, 1)
+        per_task = self.task_seconds.get(provider)
+        if self.deadline is None or not per_task:
+            return by_quota
+        by_time = int(max(self.time_left(), 0) / per_task)
+        return min(by_quota, by_time)
+
+    def summary(self) -> str:
+        elapsed = self.clock() - self.started_at
+        used = ", ".join(f"{name}={self.used.get(name, 0)}/{quota}" for name, quota in self.quotas.items())
+        return f"{elapsed:.1f}s elapsed, requests {used}"
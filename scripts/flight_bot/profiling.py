@@ -0,0 +1,205 @@
+"""
+Run profiler for ``--profile``: sampled stacks plus per-phase allocations.
+
+A daemon thread samples every thread's stack via ``sys._current_frames``
+every PROFILE_SAMPLE_INTERVAL seconds. It prefixes each stack with the
+pipeline phase that thread is in (``phase()`` blocks, nestable) and
+counts identical stacks. Sampling is wall-clock, so time a fetch worker
+spends waiting on the network shows up under ``fetch`` as well.
+
+On exit it writes to the artifacts directory:
+    profile.folded   folded stacks ("phase;frame;frame count"), the input
+                     format of flamegraph.pl, speedscope and inferno
+    phases.txt       wall time, calls, samples and net allocation per phase
+    allocations.txt  top allocation sites per phase (tracemalloc diffs)
+
+Net allocation is the traced-memory delta of every call. Allocation sites
+come from full tracemalloc snapshot diffs, which are slow on a large heap.
+They are taken for only the first PROFILE_SNAPSHOT_CALLS calls of each
+phase, and never for phases opened with ``memory=False`` (per-task
+fetches). Both figures cover everything the process allocated while the
+phase was open. With streaming workers, phases that overlap in time share
+them.
+"""
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_SNAPSHOT_CALLS, PROFILE_TOP_ALLOCATIONS
+
+logger = logging.getLogger(__name__)
+
+_active: Optional["Profiler"] = None
+
+# The profiler's own bookkeeping is not part of any phase
+_OWN_FILES = (tracemalloc.__file__, __file__)
+
+
+def phase(name: str, memory: bool = True):
+    """Mark a pipeline phase for the active profiler; free when not profiling."""
+    if _active is None:
+        return nullcontext()
+    return _active.phase(name, memory)
+
+
+class _PhaseStats:
+    __slots__ = ("calls", "seconds", "alloc_bytes", "snapshots", "sites")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.alloc_bytes = 0
+        self.snapshots = 0
+        # "file:line" -> [size diff, count diff]
+        self.sites: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+
+
+class Profiler:
+    def __init__(self, out_dir: Path, interval: float = PROFILE_SAMPLE_INTERVAL,
+                 top: int = PROFILE_TOP_ALLOCATIONS):
+        self.out_dir = Path(out_dir)
+        self.interval = interval
+        self.top = top
+        self.samples: Counter = Counter()
+        self.phases: Dict[str, _PhaseStats] = defaultdict(_PhaseStats)
+        self._stacks: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    # ─── Lifecycle ─────────────────────────────────────────────────────────
+    def start(self) -> None:
+        self._started = time.monotonic()
+        tracemalloc.start()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Path:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self._write(time.monotonic() - self._started, peak)
+        return self.out_dir
+
+    # ─── Phases ────────────────────────────────────────────────────────────
+    @contextmanager
+    def phase(self, name: str, memory: bool = True) -> Iterator[None]:
+        stack = self._stacks.setdefault(threading.get_ident(), [])
+        stack.append(name)
+        path = ";".join(stack)
+        with self._lock:
+            stats = self.phases[path]
+            snapshot = memory and stats.snapshots < PROFILE_SNAPSHOT_CALLS
+            if snapshot:
+                stats.snapshots += 1
+        before = tracemalloc.take_snapshot() if snapshot else None
+        traced_before = tracemalloc.get_traced_memory()[0]
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            traced = tracemalloc.get_traced_memory()[0] - traced_before
+            diff = tracemalloc.take_snapshot().compare_to(before, "lineno") if snapshot else []
+            stack.pop()
+            with self._lock:
+                stats.calls += 1
+                stats.seconds += elapsed
+                stats.alloc_bytes += traced
+                for stat in diff:
+                    frame = stat.traceback[0]
+                    if not stat.size_diff or frame.filename in _OWN_FILES:
+                        continue
+                    site = stats.sites[f"{frame.filename}:{frame.lineno}"]
+                    site[0] += stat.size_diff
+                    site[1] += stat.count_diff
+
+    # ─── Sampling ──────────────────────────────────────────────────────────
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                frames = []
+                overhead = False
+                while frame is not None:
+                    code = frame.f_code
+                    overhead |= code.co_filename == __file__
+                    frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Time spent taking snapshots is charged to the profiler, not the phase
+                phases = ["(profiler)"] if overhead else list(self._stacks.get(tid) or ["(no phase)"])
+                self.samples[";".join(phases + frames[::-1])] += 1
+
+    # ─── Reports ───────────────────────────────────────────────────────────
+    def _write(self, total_seconds: float, peak_bytes: int) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        with (self.out_dir / "profile.folded").open("w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        samples_by_phase: Counter = Counter()
+        for stack, count in self.samples.items():
+            phases = []
+            for part in stack.split(";"):
+                if " (" in part:
+                    break
+                phases.append(part)
+            samples_by_phase[";".join(phases)] += count
+
+        lines = [
+            f"Run wall time {total_seconds:.2f}s, {sum(self.samples.values())} samples "
+            f"every {self.interval * 1000:.0f}ms, peak traced memory {peak_bytes / 1e6:.1f} MB",
+            "",
+            f"{'phase':<32} {'calls':>7} {'seconds':>9} {'samples':>8} {'net alloc':>12}",
+        ]
+        for path in sorted(set(self.phases) | set(samples_by_phase)):
+            stats = self.phases.get(path, _PhaseStats())
+            lines.append(
+                f"{path:<32} {stats.calls:>7} {stats.seconds:>9.2f} "
+                f"{samples_by_phase.get(path, 0):>8} {stats.alloc_bytes / 1e6:>10.2f}MB"
+            )
+        (self.out_dir / "phases.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        lines = []
+        for path, stats in sorted(self.phases.items()):
+            if not stats.sites:
+                continue
+            lines.append(f"== {path} (sites from {stats.snapshots} of {stats.calls} calls, "
+                         f"net {stats.alloc_bytes / 1e6:.2f} MB over all calls)")
+            top = sorted(stats.sites.items(), key=lambda kv: -abs(kv[1][0]))[:self.top]
+            for site, (size, count) in top:
+                lines.append(f"  {size / 1024:>+12.1f} KiB {count:>+9} blocks  {site}")
+            lines.append("")
+        (self.out_dir / "allocations.txt").write_text("\n".join(lines), encoding="utf-8")
+
+
+def default_profile_dir() -> Path:
+    return Path(PROFILE_DIR) / datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+
+
+@contextmanager
+def profiled(out_dir: Optional[Path] = None) -> Iterator[Profiler]:
+    """Profile everything inside the block and write the reports when it exits."""
+    global _active
+    profiler = Profiler(out_dir or default_profile_dir())
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active = None
+        out = profiler.stop()
+        logger.info(f"Profile written to {out} (profile.folded, phases.txt, allocations.txt)")
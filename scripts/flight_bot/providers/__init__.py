@@ -1 +1,48 @@
-# Provider Package
+"""
+Provider registry.
+
+Providers are named by their ``key`` and imported only when a run actually
+enables them, so importing this package costs nothing. Built-in providers
+are listed below. Third-party packages can add more through the
+``flight_bot.providers`` entry-point group, e.g. in pyproject.toml::
+
+    [project.entry-points."flight_bot.providers"]
+    kiwi = "my_package.kiwi:KiwiProvider"
+"""
+import importlib
+import logging
+from typing import Dict, Type
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "flight_bot.providers"
+
+_BUILTIN: Dict[str, str] = {
+    "tp": f"{__name__}.travelpayouts:TravelPayoutsProvider",
+    "amadeus": f"{__name__}.amadeus:AmadeusProvider",
+}
+_loaded: Dict[str, Type] = {}
+
+
+def _entry_points() -> Dict[str, str]:
+    # importlib.metadata scans installed distributions; only pay for it when asked
+    from importlib.metadata import entry_points
+    try:
+        eps = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception as e:
+        logger.warning(f"Could not read {ENTRY_POINT_GROUP} entry points: {e}")
+        return {}
+    return {ep.name: ep.value for ep in eps}
+
+
+def load_provider(key: str) -> Type:
+    """Import and return the provider class registered under ``key``."""
+    cls = _loaded.get(key)
+    if cls is not None:
+        return cls
+    target = _BUILTIN.get(key) or _entry_points().get(key)
+    if target is None:
+        raise ValueError(f"Unknown flight data provider: {key}")
+    module_name, _, attr = target.partition(":")
+    cls = _loaded[key] = getattr(importlib.import_module(module_name), attr)
+    return cls
@@ -2,98 +2,122 @@ import logging
 import time
 from typing import List
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from .base import BaseProvider
+from .. import config as settings
 from ..models import FlightDeal, RouteTask, RuntimeConfig
 
 logger = logging.getLogger(__name__)
 
 class AmadeusProvider(BaseProvider):
+    key = "amadeus"
+    SAMPLE_DAYS = (5, 15, 25)
+    requests_per_task = len(SAMPLE_DAYS)
+    concurrent = False        # Tiny quota and a self-throttled SDK client: one task at a time
+    deferred = True           # Quota goes to the allocator's probes once TravelPayouts is done
+
+    @classmethod
+    def is_configured(cls, config: RuntimeConfig) -> bool:
+        return bool(config.amadeus_id and config.amadeus_secret)
+
     def __init__(self, config: RuntimeConfig):
         super().__init__(config)
-        self.client = None
-        if config.amadeus_id and config.amadeus_secret:
+        self._client = None
+        self._client_ready = False
+
+    @property
+    def client(self):
+        """SDK client, imported and built on the first Amadeus task (None if unavailable)."""
+        if not self._client_ready:
+            self._client_ready = True
+            config = self.config
             try:
                 from amadeus import Client
-                self.client = Client(client_id=config.amadeus_id, client_secret=config.amadeus_secret)
+                self._client = Client(
+                    client_id=config.amadeus_id,
+                    client_secret=config.amadeus_secret,
+                    hostname=config.amadeus_hostname,
+                )
+                logger.info(f"Amadeus client initialized successfully (host: {config.amadeus_hostname})")
             except ImportError:
-                logger.error("Amadeus SDK not installed")
+                logger.warning("Amadeus SDK not installed. Skipping Amadeus.")
+            except Exception as e:
+                logger.warning(f"Amadeus client initialization failed: {e}")
+        return self._client
+
+    @staticmethod
+    def _failure_kind(error: Exception) -> dict:
+        """
+        count_error() flags for an SDK exception. Only server errors (5xx)
+        and NetworkError (timeouts, unreachable hosts) say the provider is
+        unhealthy. A 4xx is about this one request (unknown route, bad
+        parameters), and so is an offer the parser could not read.
+        """
+        # Matched by name: the SDK is an optional import
+        timeout = type(error).__name__ == "NetworkError"
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        server = type(error).__name__ == "ServerError" or (isinstance(status, int) and status >= 500)
+        return {"timeout": timeout, "health": timeout or server}
 
     def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
         if not self.client:
             return []
 
         year, mon = map(int, task.month.split("-"))
-        sample_dates = [5, 15, 25]
         all_deals = []
         
         now_ts = int(datetime.utcnow().timestamp() * 1000)
         now_str = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
 
-        for day in sample_dates:
-            date_str = f"{year}-{mon:02d}-{day:02d}"
-            
+        # Allocator probes name their dates; a plain route-month task samples fixed days
+        dates = task.dates or [f"{year}-{mon:02d}-{day:02d}" for day in self.SAMPLE_DAYS]
+        for date_str in dates:
             # Basic past date check
             if datetime.strptime(date_str, "%Y-%m-%d") < datetime.now():
                 continue
 
+            if not self.count_request():
+                break
             try:
                 response = self.client.shopping.flight_offers_search.get(
                     originLocationCode=task.origin,
                     destinationLocationCode=task.destination,
                     departureDate=date_str,
                     adults=1,
-                    currencyCode="USD",
+                    currencyCode=settings.AMADEUS_CURRENCY,
                     max=1
                 )
+                self.count_success()
                 
                 if response.data:
                     offer = response.data[0]
                     price = float(offer["price"]["total"])
+                    currency = offer["price"].get("currency") or settings.AMADEUS_CURRENCY
                     itinerary = offer["itineraries"][0]
                     segments = itinerary["segments"]
                     
-                    deal = FlightDeal(
+                    # Neighbouring days are filled by the estimation engine at write time
+                    all_deals.append(FlightDeal(
                         origin=task.origin,
                         destination=task.destination,
                         price=price,
                         date=date_str,
+                        currency=currency,
+                        airline=segments[0]["carrierCode"],
                         airline_code=segments[0]["carrierCode"],
                         transfers=len(segments) - 1,
                         flight_num=segments[0]["number"],
                         found_at=now_str,
                         fetchedAt=now_ts,
                         provider="amadeus",
-                        is_amadeus=True
-                    )
-                    all_deals.append(deal)
-                    
-                    # Interpolation logic (±2 days to keep it simple)
-                    for offset in [-2, -1, 1, 2]:
-                        nearby = datetime.strptime(date_str, "%Y-%m-%d") + relativedelta(days=offset)
-                        if nearby.month != mon: continue
-                        
-                        nearby_str = nearby.strftime("%Y-%m-%d")
-                        est_price = round(price * (1 + (abs(offset) * 0.02)), 2)
-                        
-                        all_deals.append(FlightDeal(
-                            origin=task.origin,
-                            destination=task.destination,
-                            price=est_price,
-                            date=nearby_str,
-                            airline_code=deal.airline_code,
-                            transfers=deal.transfers,
-                            flight_num=deal.flight_num,
-                            found_at=now_str,
-                            fetchedAt=now_ts,
-                            provider="amadeus",
-                            is_amadeus=True,
-                            is_estimated=True
-                        ))
+                        is_amadeus=True,
+                        region=task.region,
+                    ))
+                    logger.info(f"  ✓ [Amadeus] {task.origin}->{task.destination} ({date_str}): {price} {currency}")
                 
                 time.sleep(0.5) # Throttle
 
             except Exception as e:
-                logger.warning(f"Amadeus failed for date {date_str}: {e}")
+                logger.warning(f"Amadeus failed {task.origin}->{task.destination} ({date_str}): {e}")
+                self.count_error(**self._failure_kind(e))
                 
         return all_deals
@@ -1,13 +1,72 @@
+import threading
 from abc import ABC, abstractmethod
 from typing import List, Optional
+from ..breaker import CircuitBreaker
 from ..models import FlightDeal, RouteTask, RuntimeConfig
 
 class BaseProvider(ABC):
     """Base class for all flight data providers."""
-    
+
+    key = "base"              # Matches FlightDeal.provider and planner quota names
+    requests_per_task = 1     # Upper bound of API calls made by one fetch_deals()
+    concurrent = True         # False: fetch_deals() calls are serialized across fetch workers
+    deferred = False          # True: skipped per task; fed (route, date) probes by allocator.py after the run
+
     def __init__(self, config: RuntimeConfig):
         self.config = config
         self.name = self.__class__.__name__
+        self.requests = 0
+        self.errors = 0
+        self.request_limit: Optional[int] = None  # Run quota; set by the fetcher from the planner
+        self.lock = threading.Lock()            # Held around fetch_deals() when not concurrent
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+        self.breaker = CircuitBreaker(self.key)
+
+    def count_request(self) -> bool:
+        """
+        Claim one request of the run quota. False (and nothing counted) once
+        it is spent or while the provider's circuit is open.
+        """
+        with self._counter_lock:
+            if self.request_limit is not None and self.requests >= self.request_limit:
+                return False
+            if not self.breaker.allow():
+                return False
+            self.requests += 1
+        self._local.requests = self.thread_requests() + 1
+        return True
+
+    def reset_requests(self) -> None:
+        """Start a new quota period (a daemon cycle) on a provider that stays warm between them."""
+        with self._counter_lock:
+            self.requests = 0
+
+    def count_success(self) -> None:
+        """The request claimed by count_request() got a usable response."""
+        self.breaker.record_success()
+
+    def count_error(self, timeout: bool = False, health: bool = True) -> None:
+        """
+        A failed request; ``timeout`` for timeouts and connection failures.
+        ``health=False`` for errors that say nothing about the provider's
+        health (a 4xx for one bad request), which the breaker ignores.
+        """
+        with self._counter_lock:
+            self.errors += 1
+        if health:
+            self.breaker.record_failure(timeout)
+        else:
+            self.breaker.record_success()
+
+    def thread_requests(self) -> int:
+        """Requests made by the calling thread, so concurrent tasks can be metered exactly."""
+        return getattr(self._local, "requests", 0)
+
+    @classmethod
+    def is_configured(cls, config: RuntimeConfig) -> bool:
+        """False if the run lacks what this provider needs (credentials...); it is then not created."""
+        return True
 
     @abstractmethod
     def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
@@ -15,8 +74,12 @@ class BaseProvider(ABC):
         pass
 
     def normalize_price(self, price: float, from_currency: str) -> float:
-        """Normalize price to USD (LOCKED policy)."""
-        if from_currency == "USD":
+        """
+        One price in USD (LOCKED policy). Fetched batches are converted by
+        fx.normalize_deals in the validate stage; this is for single prices.
+        Raises ValueError for a currency without a rate.
+        """
+        if (from_currency or "USD").upper() == "USD":
             return price
-        # TODO: Implement basic conversion if needed, otherwise skip
-        return price
+        from ..fx import get_fx_table
+        return get_fx_table().to_usd(price, from_currency)
@@ -1,61 +1,339 @@
 import logging
-import requests
-import json
-from typing import List
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+
+import requests
+
 from .base import BaseProvider
+from .. import config as settings
+from ..config import (
+    THROTTLE_DELAY, TP_FANIN_LIMIT, TP_FANIN_MIN_DEALS, TP_GROUPED_MAX_FAILURES, TP_PAGE_SIZE, TP_MAX_PAGE_SIZE, TP_MAX_PAGES,
+    HEDGE_BUDGET_FRACTION,
+)
+from ..metro import MetroMap, load_metro_map
 from ..models import FlightDeal, RouteTask, RuntimeConfig
+from ..session import LatencyTracker, RateLimiter, build_session
 
 logger = logging.getLogger(__name__)
 
 class TravelPayoutsProvider(BaseProvider):
+    """
+    Aviasales v3 prices. With fan-in enabled, the first task of an
+    origin-month sends one open-destination query whose results are split
+    per airport pair and serve every later task of that origin-month; only
+    destinations the fan-in missed fall back to a per-pair request.
+
+    A per-pair request asks grouped_prices for the route-month's cheapest
+    fare per departure day, a full calendar in one call. If that endpoint
+    is unavailable, prices_for_dates is paged instead. The next page is
+    fetched only when a page comes back full, and the page size doubles
+    for routes that fill one.
+
+    Airports that share a city with another scanned airport (BKK/DMK,
+    PVG/SHA) are queried at city level: fan-in asks for the origin city,
+    and per-pair requests ask for the city pair once. Items fan back out to
+    airport pairs by their origin_airport/destination_airport fields.
+
+    Timeouts follow the rolling p99 of this run's latencies. A request still
+    unanswered at the p95 gets one hedged duplicate, within a budget of
+    HEDGE_BUDGET_FRACTION of the run quota, and the first response wins.
+    """
     V3_URL = "https://api.travelpayouts.com/aviasales/v3/prices_for_dates"
+    GROUPED_URL = "https://api.travelpayouts.com/aviasales/v3/grouped_prices"
+
+    key = "tp"
+
+    def __init__(self, config: RuntimeConfig, fanin: Optional[bool] = None, metro: Optional[MetroMap] = None):
+        super().__init__(config)
+        # Pooled connections + urllib3 retries shared by every request of the run
+        self.session = build_session(pool_size=max(10, config.fetch_workers))
+        if config.tp_token:
+            self.session.headers["x-access-token"] = config.tp_token
+        # Shared by all fetch workers so concurrency never exceeds the API rate limit;
+        # each of N shard processes gets 1/N of it
+        self.limiter = RateLimiter(THROTTLE_DELAY * config.shard_count)
+        self.fanin = settings.TP_FANIN if fanin is None else fanin
+        if metro is None:
+            metro = load_metro_map() if settings.TP_METRO else MetroMap({}, [])
+        self.metro = metro
+        # Results of queries that serve several tasks (fan-in, metro pairs):
+        # key -> raw items per (origin airport, destination airport)
+        self._shared_cache: Dict[tuple, Dict[Tuple[str, str], List[dict]]] = {}
+        self._shared_locks: Dict[tuple, threading.Lock] = {}
+        self._shared_guard = threading.Lock()
+        self.grouped = settings.TP_GROUPED
+        self._grouped_failures = 0
+        # "ORIGIN_DEST" -> page size that last held the route-month
+        self._page_sizes: Dict[str, int] = {}
+        self.latency = LatencyTracker()
+        self.hedging = settings.TP_HEDGING
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._hedge_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def reset_requests(self) -> None:
+        super().reset_requests()
+        # The hedge budget is a share of the period's quota
+        with self._hedge_lock:
+            self.hedges = 0
+            self.hedge_wins = 0
 
     def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        pair = (task.origin, task.destination)
+        if self.fanin:
+            items = self._fanin_items(self.metro.city(task.origin), task.month).get(pair, [])
+            if len(items) >= TP_FANIN_MIN_DEALS:
+                deals = self._to_deals(task, items)
+                logger.info(f"  ✓ {task.origin}->{task.destination} ({task.month}): {len(deals)} deals from origin fan-in")
+                return deals
+
+        if self.metro.collapses(*pair):
+            by_pair = self._metro_items(task)
+            if by_pair is not None:
+                deals = self._to_deals(task, by_pair.get(pair, []))
+                if deals:
+                    logger.info(f"  ✓ {task.origin}->{task.destination} ({task.month}): {len(deals)} deals from city-level query")
+                return deals
+
+        items = self._calendar(task) if self.grouped else None
+        if items is None:
+            items = self._paged(task)
+        deals = self._to_deals(task, items)
+        if deals:
+            logger.info(f"  ✓ {task.origin}->{task.destination} ({task.month}): {len(deals)} deals found")
+        return deals
+
+    def _shared(self, key: tuple, fetch, cache_empty: bool = True):
+        """Run ``fetch`` once per key; concurrent workers on the same key wait for that one query."""
+        with self._shared_guard:
+            lock = self._shared_locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self._shared_cache.get(key)
+            if cached is not None:
+                return cached
+            value = fetch()
+            if value or cache_empty:
+                self._shared_cache[key] = value
+            return value
+
+    @staticmethod
+    def _by_airport_pair(items: List[dict]) -> Dict[Tuple[str, str], List[dict]]:
+        """Group items by the airports they actually fly between (city codes when not reported)."""
+        by_pair: Dict[Tuple[str, str], List[dict]] = {}
+        for item in items:
+            origin = item.get("origin_airport") or item.get("origin")
+            dest = item.get("destination_airport") or item.get("destination")
+            if origin and dest:
+                by_pair.setdefault((origin, dest), []).append(item)
+        return by_pair
+
+    def _fanin_items(self, origin: str, month: str) -> Dict[Tuple[str, str], List[dict]]:
+        """Items of the origin-wide (airport or city) query for ``origin``/``month``, fetched once per run."""
+        def fetch():
+            task = RouteTask(origin=origin, destination="*", month=month, region="")
+            by_pair = self._by_airport_pair(self._query(task, {"limit": str(TP_FANIN_LIMIT)}) or [])
+            logger.info(f"  ✓ {origin}->* ({month}): fan-in covers {len(by_pair)} airport pairs")
+            return by_pair
+
+        # A failed fan-in is cached empty; its tasks fall back to per-pair requests
+        return self._shared(("fanin", origin, month), fetch)
+
+    def _metro_items(self, task: RouteTask) -> Optional[Dict[Tuple[str, str], List[dict]]]:
+        """One city-pair query serving every airport pair of the two cities; None if it got nothing."""
+        origin, dest = self.metro.query_pair(task.origin, task.destination)
+
+        def fetch():
+            city_task = RouteTask(origin=origin, destination=dest, month=task.month, region=task.region)
+            return self._by_airport_pair(self._paged(city_task)) or None
+
+        # Not cached when empty: a failed city query leaves each pair its own request
+        return self._shared(("metro", origin, dest, task.month), fetch, cache_empty=False)
+
+    def _calendar(self, task: RouteTask) -> Optional[List[dict]]:
+        """Cheapest fare per departure day; None if the grouped endpoint failed."""
+        data = self._query(task, {
+            "destination": task.destination,
+            "group_by": "departure_at",
+        }, url=self.GROUPED_URL)
+        if isinstance(data, dict):
+            self._grouped_failures = 0
+            return [item for item in data.values() if isinstance(item, dict)]
+        # Only the endpoint's own errors (HTTP errors, bad payloads) argue for giving it up;
+        # quota or breaker refusals, rate limiting and timeouts say nothing about it
+        if self._local.failure in ("http", None):
+            self._grouped_failures += 1
+            if self._grouped_failures >= TP_GROUPED_MAX_FAILURES and self.grouped:
+                self.grouped = False
+                logger.warning("TravelPayouts grouped_prices keeps failing; using paged prices_for_dates")
+        return None
+
+    def _paged(self, task: RouteTask) -> List[dict]:
+        """prices_for_dates, following pages only while they come back full."""
+        route = f"{task.origin}_{task.destination}"
+        limit = self._page_sizes.get(route, TP_PAGE_SIZE)
+        items: List[dict] = []
+        for page in range(1, TP_MAX_PAGES + 1):
+            batch = self._query(task, {
+                "destination": task.destination,
+                "limit": str(limit),
+                "page": str(page),
+            })
+            if not batch:
+                break
+            items.extend(batch)
+            if len(batch) < limit:
+                break
+        if len(items) >= limit:
+            # The route filled a page: start bigger next time
+            self._page_sizes[route] = min(limit * 2, TP_MAX_PAGE_SIZE)
+        return items
+
+    def _query(self, task: RouteTask, extra: Dict[str, str], url: str = V3_URL):
+        """
+        One TravelPayouts call returning the response's ``data``; None on any
+        failure. The calling thread's ``_local.failure`` says why: "refused"
+        (quota or open circuit), "transient" (rate limit, timeout, connection)
+        or "http" (an error status or unreadable response); None if it
+        answered.
+        """
         params = {
             "token": self.config.tp_token,
             "origin": task.origin,
-            "destination": task.destination,
             "departure_at": task.month,
             "sorting": "price",
-            "limit": "30",
-            "market": "th",
-            "currency": "USD",
+            "market": settings.TP_MARKET,
+            "currency": settings.TP_CURRENCY,
+            **extra,
         }
 
+        # Fan-in and paging fallbacks make extra calls; never past the run quota
+        self._local.failure = "refused"
+        if not self.count_request():
+            return None
         try:
-            response = requests.get(self.V3_URL, params=params, timeout=15)
+            response = self._get(url, params)
             if response.status_code == 429:
                 logger.warning(f"TravelPayouts rate limited. Task: {task.origin}->{task.destination}")
-                return []
+                self._local.failure = "transient"
+                self.count_error()
+                return None
             
             if response.status_code >= 400:
-                logger.error(f"TravelPayouts error {response.status_code}")
-                return []
+                logger.error(f"TravelPayouts error {response.status_code}: {task.origin}->{task.destination}")
+                self._local.failure = "http"
+                # A 4xx means the API answered; only server errors count against its health
+                self.count_error(health=response.status_code >= 500)
+                return None
 
-            data = response.json()
-            items = data.get("data", [])
-            
-            deals = []
-            now_ts = int(datetime.utcnow().timestamp() * 1000)
-            now_str = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+            data = response.json().get("data")
+            self._local.failure = None
+            self.count_success()
+            return data
+
+        except (requests.Timeout, requests.ConnectionError) as e:
+            logger.error(f"TravelPayouts unreachable {task.origin}->{task.destination}: {e}")
+            self._local.failure = "transient"
+            self.count_error(timeout=True)
+            return None
+        except Exception as e:
+            logger.error(f"TravelPayouts fetch failed {task.origin}->{task.destination}: {e}")
+            self._local.failure = "http"
+            self.count_error()
+            return None
+
+    def _timed_get(self, url: str, params: Dict[str, str], timeout: float) -> requests.Response:
+        """
+        One GET; the caller has already taken its rate-limiter slot. Failed
+        calls are timed too: a timed-out request counts as at least the
+        timeout, so a slowing upstream raises the p95/p99 instead of dropping
+        out of the window.
+        """
+        started = time.monotonic()
+        floor = 0.0
+        try:
+            return self.session.get(url, params=params, timeout=timeout)
+        except requests.Timeout:
+            floor = timeout
+            raise
+        finally:
+            self.latency.record(max(time.monotonic() - started, floor))
 
-            for item in items:
+    def _get(self, url: str, params: Dict[str, str]) -> requests.Response:
+        """GET with a latency-derived timeout, hedged once if it runs past the p95."""
+        timeout = self.latency.timeout()
+        hedge_after = self.latency.hedge_delay() if self.hedging else None
+        # Wait for the slot before the hedge clock starts: time queued behind other
+        # workers is not upstream latency and must not trigger a hedge
+        self.limiter.wait()
+        if hedge_after is None:
+            return self._timed_get(url, params, timeout)
+
+        if self._pool is None:
+            with self._hedge_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=2 * max(self.config.fetch_workers, 1), thread_name_prefix="tp-http",
+                    )
+        primary = self._pool.submit(self._timed_get, url, params, timeout)
+        try:
+            return primary.result(timeout=hedge_after)
+        except FutureTimeout:
+            pass
+        # The hedge is a request like any other: it takes its own slot, and is
+        # not sent if the primary answered while it waited for one
+        self.limiter.wait()
+        if primary.done() or not self._claim_hedge():
+            return primary.result()
+
+        logger.debug(f"Hedging TravelPayouts request after {hedge_after:.2f}s: {params.get('origin')}->{params.get('destination', '*')}")
+        hedge = self._pool.submit(self._timed_get, url, params, timeout)
+        done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        # First successful response wins; if the first one failed, the other is the last chance
+        winner: Optional[Future] = next((f for f in done if f.exception() is None), None)
+        if winner is None:
+            winner = pending.pop() if pending else primary
+        if winner is hedge:
+            with self._hedge_lock:
+                self.hedge_wins += 1
+        return winner.result()
+
+    def _claim_hedge(self) -> bool:
+        """One hedged duplicate, if the hedge budget and the run quota allow it."""
+        limit = self.request_limit if self.request_limit is not None else self.config.max_requests
+        with self._hedge_lock:
+            if self.hedges >= max(1, int(limit * HEDGE_BUDGET_FRACTION)):
+                return False
+            if not self.count_request():
+                return False
+            self.hedges += 1
+        return True
+
+    def _to_deals(self, task: RouteTask, items: List[dict]) -> List[FlightDeal]:
+        deals = []
+        now_ts = int(datetime.utcnow().timestamp() * 1000)
+        now_str = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+
+        for item in items:
+            try:
                 deals.append(FlightDeal(
                     origin=task.origin,
                     destination=task.destination,
                     price=float(item["price"]),
                     date=item["departure_at"].split("T")[0],
-                    airline_code=item["airline"],
-                    transfers=item["transfers"],
+                    currency=settings.TP_CURRENCY,  # Converted to USD by the validate stage
+                    airline=item.get("airline", ""),
+                    airline_code=item.get("airline", ""),
+                    transfers=item.get("transfers", 0),
                     flight_num=str(item.get("flight_number", "")),
                     found_at=now_str,
                     fetchedAt=now_ts,
-                    provider="tp"
+                    provider="tp",
+                    region=task.region,
                 ))
-            
-            return deals
-
-        except Exception as e:
-            logger.error(f"TravelPayouts fetch failed: {e}")
-            return []
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping malformed TravelPayouts item {task.origin}->{task.destination}: {e}")
+        return deals
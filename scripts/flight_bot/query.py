@@ -0,0 +1,211 @@
+"""
+In-process query library over the published deal dataset.
+
+``DealIndex.load()`` reads flight_data.json (or flight_data.v2.json), or its
+binary companion when that is fresh, into flat NumPy columns. It then builds three sorted
+permutations once:
+
+    route   (origin, destination, date, price)   route slices, date ranges, calendars
+    month   (month, destination, price)          "cheapest to X in month Y", monthly top-K
+    price   (price)                              global top-K, price ranges
+
+Every lookup is a ``searchsorted`` (bisect) into one of them plus a small
+mask, so it never touches rows outside the answer. Record dicts are built
+only for the rows returned.
+
+    index = DealIndex.load()
+    index.cheapest(5, destination="BKK", month="2026-12")
+    index.calendar("RGN", "BKK", "2026-12")
+    index.route("RGN", "SIN", start="2026-11-01", end="2026-11-30", airline="8M")
+"""
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import OUTPUT_PATH
+from .merger import read_dataset
+
+logger = logging.getLogger(__name__)
+
+COLUMNS_DTYPE = np.dtype([
+    ("origin", "S3"),
+    ("destination", "S3"),
+    ("date", "S10"),
+    ("airline_code", "S3"),
+    ("price", "<f8"),
+    ("estimated", "?"),
+])
+
+
+def _key(*parts: str) -> bytes:
+    return "".join(parts).encode("ascii")
+
+
+class DealIndex:
+    """Sorted, array-backed indexes over one snapshot of the dataset."""
+
+    def __init__(self, columns: np.ndarray, materialize: Callable[[np.ndarray], List[Dict]]):
+        self.columns = columns
+        self._materialize = materialize
+
+        c = columns
+        month = c["date"].astype("S7")
+        # route: origin+destination, then date, then price
+        self._route_order = np.lexsort((c["price"], c["date"], c["destination"], c["origin"]))
+        self._route_keys = np.char.add(c["origin"], c["destination"])[self._route_order]
+        self._route_dates = c["date"][self._route_order]
+        # month: month+destination, then price
+        self._month_order = np.lexsort((c["price"], c["destination"], month))
+        self._month_keys = np.char.add(month, c["destination"])[self._month_order]
+        self._month_only = month[self._month_order]
+        # price
+        self._price_order = np.argsort(c["price"], kind="stable")
+        self._prices = c["price"][self._price_order]
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    # ─── Loading ───────────────────────────────────────────────────────────
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "DealIndex":
+        """Index the dataset at ``path``, preferring a fresh binary companion over the JSON."""
+        path = Path(path or OUTPUT_PATH)
+        from .binstore import open_companion
+        companion = open_companion(path)
+        if companion is not None:
+            return cls.from_companion(companion)
+        if not path.exists() and path.with_name(f"{path.stem}.v2.json").exists():
+            path = path.with_name(f"{path.stem}.v2.json")
+        return cls.from_routes(read_dataset(path).get("routes", []))
+
+    @classmethod
+    def from_routes(cls, routes: Sequence[Dict]) -> "DealIndex":
+        columns = np.zeros(len(routes), dtype=COLUMNS_DTYPE)
+        if routes:
+            columns["origin"] = [r["origin"] for r in routes]
+            columns["destination"] = [r["destination"] for r in routes]
+            columns["date"] = [r["date"] for r in routes]
+            columns["airline_code"] = [(r.get("airline_code") or "")[:3] for r in routes]
+            columns["price"] = [float(r["price"]) for r in routes]
+            columns["estimated"] = [bool(r.get("is_estimated")) for r in routes]
+        return cls(columns, lambda rows: [routes[i] for i in rows.tolist()])
+
+    @classmethod
+    def from_companion(cls, companion) -> "DealIndex":
+        from .binstore import FLAG_ESTIMATED
+        recs = companion.records
+        columns = np.zeros(len(recs), dtype=COLUMNS_DTYPE)
+        for name in ("origin", "destination", "date", "airline_code", "price"):
+            columns[name] = recs[name]
+        columns["estimated"] = (recs["flags"] & FLAG_ESTIMATED) != 0
+        return cls(columns, companion.routes_at)
+
+    # ─── Internals ─────────────────────────────────────────────────────────
+    def _rows(self, rows: np.ndarray, airline: Optional[str], include_estimated: bool) -> np.ndarray:
+        """Filter candidate row ids (keeping their order) by airline and estimate flag."""
+        if airline:
+            rows = rows[self.columns["airline_code"][rows] == airline.encode("ascii")]
+        if not include_estimated:
+            rows = rows[~self.columns["estimated"][rows]]
+        return rows
+
+    def _route_rows(self, origin: str, destination: str,
+                    start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Row ids of one route, date-ordered (cheapest first within a date), within [start, end]."""
+        key = _key(origin, destination)
+        lo = np.searchsorted(self._route_keys, key, side="left")
+        hi = np.searchsorted(self._route_keys, key, side="right")
+        dates = self._route_dates[lo:hi]
+        if start:
+            lo, hi = lo + np.searchsorted(dates, start.encode("ascii"), side="left"), hi
+            dates = self._route_dates[lo:hi]
+        if end:
+            # "2026-12" as an end date covers the whole month
+            hi = lo + np.searchsorted(dates, (end + "~").encode("ascii"), side="left")
+        return self._route_order[lo:hi]
+
+    def _month_rows(self, month: str, destination: Optional[str] = None) -> np.ndarray:
+        """Row ids of one month (optionally one destination), price-ordered within each destination."""
+        if destination:
+            key = _key(month, destination)
+            lo = np.searchsorted(self._month_keys, key, side="left")
+            hi = np.searchsorted(self._month_keys, key, side="right")
+        else:
+            key = month.encode("ascii")
+            lo = np.searchsorted(self._month_only, key, side="left")
+            hi = np.searchsorted(self._month_only, key, side="right")
+        return self._month_order[lo:hi]
+
+    def _top(self, rows: np.ndarray, k: int, presorted: bool) -> np.ndarray:
+        if not presorted and len(rows) > k:
+            prices = self.columns["price"][rows]
+            part = np.argpartition(prices, k - 1)[:k]
+            rows = rows[part]
+        if not presorted:
+            rows = rows[np.argsort(self.columns["price"][rows], kind="stable")]
+        return rows[:k]
+
+    # ─── Queries ───────────────────────────────────────────────────────────
+    def route(self, origin: str, destination: str, start: Optional[str] = None, end: Optional[str] = None,
+              airline: Optional[str] = None, include_estimated: bool = True) -> List[Dict]:
+        """Every deal of a route between two dates (inclusive), by date then price."""
+        rows = self._rows(self._route_rows(origin, destination, start, end), airline, include_estimated)
+        return self._materialize(rows)
+
+    def calendar(self, origin: str, destination: str, month: Optional[str] = None,
+                 airline: Optional[str] = None, include_estimated: bool = True) -> Dict[str, Dict]:
+        """Cheapest deal per departure day of a route (optionally one month): {"2026-12-01": deal}."""
+        rows = self._route_rows(origin, destination, month, month)
+        rows = self._rows(rows, airline, include_estimated)
+        if not len(rows):
+            return {}
+        dates = self.columns["date"][rows]
+        # Rows are date-ordered and cheapest first within a date: keep each date's first row
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = dates[1:] != dates[:-1]
+        rows = rows[first]
+        return {d["date"]: d for d in self._materialize(rows)}
+
+    def cheapest(self, k: int = 10, origin: Optional[str] = None, destination: Optional[str] = None,
+                 month: Optional[str] = None, airline: Optional[str] = None,
+                 include_estimated: bool = True) -> List[Dict]:
+        """The ``k`` cheapest deals matching every given filter, cheapest first."""
+        if k <= 0:
+            return []
+        if origin and destination:
+            rows, presorted = self._route_rows(origin, destination, month, month), False
+        elif month:
+            rows = self._month_rows(month, destination)
+            presorted = bool(destination)
+            if origin:
+                rows = rows[self.columns["origin"][rows] == origin.encode("ascii")]
+        else:
+            rows, presorted = self._price_order, True
+            if origin:
+                rows = rows[self.columns["origin"][rows] == origin.encode("ascii")]
+            if destination:
+                rows = rows[self.columns["destination"][rows] == destination.encode("ascii")]
+        rows = self._rows(rows, airline, include_estimated)
+        return self._materialize(self._top(rows, k, presorted))
+
+    def price_range(self, low: float, high: float, limit: Optional[int] = None,
+                    include_estimated: bool = True) -> List[Dict]:
+        """Deals priced within [low, high], cheapest first."""
+        lo = np.searchsorted(self._prices, low, side="left")
+        hi = np.searchsorted(self._prices, high, side="right")
+        rows = self._rows(self._price_order[lo:hi], None, include_estimated)
+        return self._materialize(rows[:limit] if limit else rows)
+
+    def airlines(self, origin: str, destination: str, month: Optional[str] = None) -> Dict[str, float]:
+        """Cheapest fare per airline code on a route: {"FD": 62.0, ...}, cheapest first."""
+        rows = self._route_rows(origin, destination, month, month)
+        codes = self.columns["airline_code"][rows]
+        prices = self.columns["price"][rows]
+        best: Dict[str, float] = {}
+        for code, price in zip(codes.tolist(), prices.tolist()):
+            code = code.decode("ascii")
+            if code and (code not in best or price < best[code]):
+                best[code] = price
+        return dict(sorted(best.items(), key=lambda kv: kv[1]))
@@ -1,30 +1,81 @@
 import json
 import logging
-import os
 from pathlib import Path
-from typing import List, Dict
+import zlib
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 from .config import (
     SEA_AIRPORTS, JAPAN_AIRPORTS, KOREA_AIRPORTS,
     INDIA_AIRPORTS, CHINA_AIRPORTS, TAIWAN_AIRPORTS,
-    MYANMAR_HUBS, MAJOR_ASIAN_HUBS, POPULAR_ROUTES_SET, MONTHS_TO_SCAN, UAE_AIRPORTS
+    MYANMAR_HUBS, MAJOR_ASIAN_HUBS, POPULAR_ROUTES_SET, UAE_AIRPORTS, DEMAND_BUDGET_SHARE,
 )
+from . import config as settings
+from .demand import DemandTable
+from .metro import MetroMap, load_metro_map
 from .models import RouteTask, CheckpointState
 
 logger = logging.getLogger(__name__)
 
 CHECKPOINT_PATH = Path("scripts/flight_bot/.checkpoint.json")
 
-def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[RouteTask]:
-    """Build and sort the full list of fetch tasks, oldest-first, with fair scheduling."""
+def shard_checkpoint_path(index: int, count: int) -> Path:
+    """Per-shard resume checkpoint, so local shard processes don't clobber each other."""
+    return CHECKPOINT_PATH.with_name(f"{CHECKPOINT_PATH.name}.shard-{index}-of-{count}")
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """"2/4" -> (2, 4); shard indices are zero-based."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like INDEX/COUNT, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+def shard_of(origin: str, count: int, metro: Optional[MetroMap] = None) -> int:
+    """
+    Stable shard number of every route from ``origin``; identical across
+    processes and machines. Keyed on the origin's metro city, so the
+    origin-wide fan-in and city-level queries each run in exactly one shard.
+    """
+    city = metro.city(origin) if metro is not None else origin
+    return zlib.crc32(city.encode("ascii")) % count
+
+def _demand_score(task: RouteTask, now: datetime) -> float:
+    """Demand x hours since the last fetch: watched and stale route-months go first."""
+    try:
+        last = datetime.strptime(task.last_fetched_at or "2000-01-01 00:00", "%Y-%m-%d %H:%M")
+    except ValueError:
+        last = datetime(2000, 1, 1)
+    return task.demand * max((now - last).total_seconds() / 3600, 1.0)
+
+def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None,
+                   shard: Optional[Tuple[int, int]] = None,
+                   demand: Optional[DemandTable] = None) -> List[RouteTask]:
+    """
+    Build and sort the full list of fetch tasks, oldest-first, with fair scheduling.
+    With ``shard=(index, count)`` only routes of that shard are kept, before the
+    tier quotas are applied, so every shard gets a full ``limit`` of its own routes.
+
+    With a ``demand`` table, demanded routes join POPULAR_ROUTES in tier 0 and
+    demanded route-months get the first DEMAND_BUDGET_SHARE of ``limit``,
+    ordered by demand x staleness.
+    """
     tasks = []
     seen_tasks = set()
+    demand = demand or DemandTable()
+    # Rebuilt every run: the fixed list plus whatever users currently watch
+    tier0_routes = POPULAR_ROUTES_SET | demand.routes()
+    # The same city grouping the TravelPayouts provider queries with
+    metro = (load_metro_map() if settings.TP_METRO else None) if shard else None
 
     def add_task(origin, dest, region_tag):
         # 1. Same origin/destination skip
         if origin == dest:
             return
+        if shard and shard_of(origin, shard[1], metro) != shard[0]:
+            return
             
         # 2. Invalid airport code check
         if not origin or len(origin) != 3 or not origin.isalpha():
@@ -32,7 +83,7 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
         if not dest or len(dest) != 3 or not dest.isalpha():
             return
             
-        for month in MONTHS_TO_SCAN:
+        for month in settings.MONTHS_TO_SCAN:
             # 3. Month range sanity check
             if not month or len(month) != 7 or "-" not in month:
                 continue
@@ -47,7 +98,7 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
             last_fetched = last_fetched_map.get(key, "2000-01-01 00:00")
 
             # Tiered priority logic (0 represents highest priority)
-            if (origin, dest) in POPULAR_ROUTES_SET:
+            if (origin, dest) in tier0_routes:
                 priority = 0
             elif origin in MYANMAR_HUBS or dest in MYANMAR_HUBS:
                 priority = 1  # Tier 1: Myanmar hubs to anywhere
@@ -62,7 +113,8 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
                 month=month,
                 region=region_tag,
                 priority=priority,
-                last_fetched_at=last_fetched
+                last_fetched_at=last_fetched,
+                demand=demand.weight(origin, dest, month),
             ))
 
     # 1. Tier 3 & Intra-SEA Routes (prioritized based on Tier logic during insertion)
@@ -98,8 +150,19 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
     # 3. Tier 2: Major Asian Hubs <-> Rest of Asia
     add_hub_connections(MAJOR_ASIAN_HUBS)
 
-    # 4. Fair Scheduling & Target Limits
+    # 4. Demanded route-months first
+    now = datetime.utcnow()
+    demanded = sorted((t for t in tasks if t.demand > 0), key=lambda t: -_demand_score(t, now))
+
+    # 5. Fair Scheduling & Target Limits
     if limit is not None:
+        selected = demanded[:int(limit * DEMAND_BUDGET_SHARE)]
+        if demanded:
+            logger.info(f"Demand: {len(selected)}/{len(demanded)} demanded route-months scheduled first")
+        tier_limit = limit - len(selected)
+        chosen = {id(t) for t in selected}
+        tasks = [t for t in tasks if id(t) not in chosen]
+
         tier0 = [t for t in tasks if t.priority == 0]
         tier1 = [t for t in tasks if t.priority == 1]
         tier2 = [t for t in tasks if t.priority == 2]
@@ -109,12 +172,11 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
             t_list.sort(key=lambda x: x.last_fetched_at)
 
         # Per-tier fetch quota: 25%, 35%, 25%, 15%
-        t0_quota = int(limit * 0.25)
-        t1_quota = int(limit * 0.35)
-        t2_quota = int(limit * 0.25)
-        t3_quota = int(limit * 0.15)
+        t0_quota = int(tier_limit * 0.25)
+        t1_quota = int(tier_limit * 0.35)
+        t2_quota = int(tier_limit * 0.25)
+        t3_quota = int(tier_limit * 0.15)
 
-        selected = []
         selected.extend(tier0[:t0_quota])
         selected.extend(tier1[:t1_quota])
         selected.extend(tier2[:t2_quota])
@@ -130,15 +192,17 @@ def generate_tasks(last_fetched_map: Dict[str, str], limit: int = None) -> List[
         logger.info(f"Priority distribution metrics: Tier 0: {len(tier0[:t0_quota])}/{t0_quota}, Tier 1: {len(tier1[:t1_quota])}/{t1_quota}, Tier 2: {len(tier2[:t2_quota])}/{t2_quota}, Tier 3: {len(tier3[:t3_quota])}/{t3_quota}")
         return selected
 
-    # Sort: Priority first (1 before 2), then last_fetched_at (oldest first)
-    tasks.sort(key=lambda x: (x.priority, x.last_fetched_at))
-    return tasks
+    # Sort: demanded first, then priority (1 before 2), then last_fetched_at (oldest first)
+    chosen = {id(t) for t in demanded}
+    rest = sorted((t for t in tasks if id(t) not in chosen), key=lambda x: (x.priority, x.last_fetched_at))
+    return demanded + rest
 
-def load_checkpoint(run_id: str) -> CheckpointState:
+def load_checkpoint(run_id: str, path: Optional[Path] = None) -> CheckpointState:
     """Load checkpoint from file if it exists, otherwise return fresh state."""
-    if CHECKPOINT_PATH.exists():
+    path = Path(path or CHECKPOINT_PATH)
+    if path.exists():
         try:
-            with CHECKPOINT_PATH.open("r", encoding="utf-8") as f:
+            with path.open("r", encoding="utf-8") as f:
                 data = json.load(f)
                 logger.info(f"Loaded existing checkpoint at index {data.get('last_processed_index')}")
                 # We reuse the run_id from the file if it's recent (optional policy)
@@ -148,16 +212,15 @@ def load_checkpoint(run_id: str) -> CheckpointState:
             
     return CheckpointState(run_id=run_id)
 
-def save_checkpoint_file(state: CheckpointState):
+def save_checkpoint_file(state: CheckpointState, path: Optional[Path] = None):
     """Save checkpoint state to file."""
     try:
         state.last_saved_at = datetime.utcnow().isoformat()
-        with CHECKPOINT_PATH.open("w", encoding="utf-8") as f:
+        with Path(path or CHECKPOINT_PATH).open("w", encoding="utf-8") as f:
             json.dump(state.to_dict(), f, indent=2)
     except Exception as e:
         logger.error(f"Failed to save checkpoint: {e}")
 
-def delete_checkpoint():
-    """Delete checkpoint file on completion."""
-    if CHECKPOINT_PATH.exists():
-        CHECKPOINT_PATH.unlink()
+def close_checkpoint(state: CheckpointState, path: Optional[Path] = None):
+    """Clean end of run: drop the resume progress but keep what the run learned about provider health."""
+    save_checkpoint_file(CheckpointState(run_id=state.run_id, provider_health=state.provider_health), path)
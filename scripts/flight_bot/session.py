@@ -1,14 +1,71 @@
 """
-HTTP session builder with retry logic.
+HTTP session builder with retry logic, plus a request spacer and a latency
+tracker shared by fetch workers.
 """
+import threading
+import time
+from collections import deque
+from typing import Optional
+
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from .config import MAX_RETRIES, BACKOFF_FACTOR, RETRY_STATUS_CODES
+from .config import (
+    MAX_RETRIES, BACKOFF_FACTOR, RETRY_STATUS_CODES, REQUEST_TIMEOUT,
+    LATENCY_WINDOW, LATENCY_MIN_SAMPLES, LATENCY_TIMEOUT_FACTOR, LATENCY_MIN_TIMEOUT,
+)
+
+
+class RateLimiter:
+    """Spaces calls at least ``interval`` seconds apart across all threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LatencyTracker:
+    """Rolling window of request latencies; derives the timeout and the hedge delay from it."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """``q`` in [0, 1]; None until LATENCY_MIN_SAMPLES latencies are known."""
+        with self._lock:
+            if len(self._samples) < LATENCY_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def timeout(self) -> float:
+        """p99 x LATENCY_TIMEOUT_FACTOR, within [LATENCY_MIN_TIMEOUT, REQUEST_TIMEOUT]."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return float(REQUEST_TIMEOUT)
+        return min(max(p99 * LATENCY_TIMEOUT_FACTOR, LATENCY_MIN_TIMEOUT), float(REQUEST_TIMEOUT))
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging a request (the p95); None while still warming up."""
+        return self.percentile(0.95)
 
 
-def build_session() -> requests.Session:
+def build_session(pool_size: int = 10) -> requests.Session:
     session = requests.Session()
     retry_strategy = Retry(
         total=MAX_RETRIES,
@@ -18,7 +75,7 @@ def build_session() -> requests.Session:
         respect_retry_after_header=True,
         raise_on_status=False,
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=pool_size)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
     return session
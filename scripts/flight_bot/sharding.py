@@ -0,0 +1,154 @@
+"""
+Distributed runs: split the task universe into N shards, reduce the results.
+
+Each origin (all its destinations and months) belongs to exactly one shard,
+chosen by a stable CRC32 of its metro city code, so every worker (matrix
+job or local process) can compute its own slice with no coordination, and
+the origin-wide fan-in and city-level queries are never repeated across
+shards. A shard run
+fetches and validates like a normal run. It writes only its own deals to
+a partial file next to flight_data.json and never touches the production
+outputs. ``reduce_shards`` then folds every partial into flight_data.json
+with ``merge_incremental`` semantics, holding a file lock so concurrent
+reducers cannot interleave.
+"""
+import json
+import logging
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .merger import load_existing_data, merge_incremental
+from .models import FlightDeal
+from .pipeline import (
+    PipelineContext, Stage, ScheduleStage, FetchStage, ValidateStage, HistoryStage, task_key,
+)
+from . import config as settings
+from .history import PriceHistory
+from .scheduler import save_checkpoint_file, close_checkpoint
+from .writer import finalize_outputs, write_atomic_json
+
+logger = logging.getLogger(__name__)
+
+_PARTIAL_RE = re.compile(r"\.shard-(\d+)-of-(\d+)\.json$")
+
+
+def partial_path(output_path: Path, index: int, count: int) -> Path:
+    """flight_data.json -> flight_data.shard-1-of-4.json"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}.shard-{index}-of-{count}.json")
+
+
+def find_partials(output_path: Path) -> List[Path]:
+    output_path = Path(output_path)
+    return sorted(
+        p for p in output_path.parent.glob(f"{output_path.stem}.shard-*.json")
+        if _PARTIAL_RE.search(p.name)
+    )
+
+
+def _load_partial(path: Path) -> Tuple[List[FlightDeal], dict]:
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [FlightDeal.from_dict(d) for d in data.get("routes", [])], data.get("meta", {})
+
+
+class ShardWriteStage(Stage):
+    """Accumulates this shard's accepted deals and rewrites its partial file every batch."""
+    name = "shard-write"
+
+    def __init__(self):
+        self.deals: List[FlightDeal] = []
+
+    def setup(self, ctx: PipelineContext) -> None:
+        self.path = partial_path(ctx.config.output_path, ctx.config.shard_index, ctx.config.shard_count)
+        # A partial left by an interrupted run has not been reduced yet: keep building on it
+        if self.path.exists():
+            try:
+                self.deals, _ = _load_partial(self.path)
+                logger.info(f"Continuing unreduced shard file {self.path} ({len(self.deals)} deals)")
+            except Exception as e:
+                logger.error(f"Ignoring unreadable shard file {self.path}: {e}")
+
+    def process(self, ctx: PipelineContext) -> None:
+        self.deals = merge_incremental(self.deals, ctx.accepted)
+        ctx.new_deals += len(ctx.accepted)
+        if not ctx.batch:
+            return
+        write_atomic_json(self.path, {
+            "meta": {
+                "shard": ctx.config.shard_index,
+                "shards": ctx.config.shard_count,
+                "run_id": ctx.run_id,
+                "count": len(self.deals),
+                "errors": ctx.errors,
+            },
+            "routes": [d.to_dict() for d in self.deals],
+        })
+        ctx.checkpoint.completed_keys.extend(task_key(t) for t in ctx.batch)
+        ctx.checkpoint.last_processed_index = len(ctx.checkpoint.completed_keys)
+        save_checkpoint_file(ctx.checkpoint, ctx.config.checkpoint_path)
+
+    def finish(self, ctx: PipelineContext) -> None:
+        close_checkpoint(ctx.checkpoint, ctx.config.checkpoint_path)
+
+
+def shard_stages() -> List[Stage]:
+    """Schedule → fetch → validate → history → partial file; the reduce step does the real merge."""
+    return [ScheduleStage(), FetchStage(), ValidateStage(), HistoryStage(compact=False), ShardWriteStage()]
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on ``path`` (POSIX); a no-op where fcntl is unavailable."""
+    try:
+        import fcntl
+    except ImportError:
+        logger.warning("fcntl not available; reducing without a file lock")
+        yield
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def reduce_shards(output_path: Path, partials: Optional[List[Path]] = None,
+                  transport_path: Optional[Path] = None) -> int:
+    """
+    Merge shard partial files into ``output_path`` and delete them.
+    Returns the number of shard files merged.
+    """
+    output_path = Path(output_path)
+    with file_lock(output_path.with_name(output_path.name + ".lock")):
+        partials = find_partials(output_path) if partials is None else partials
+        if not partials:
+            logger.info("No shard files to reduce")
+            return 0
+
+        existing = [FlightDeal.from_dict(d) for d in load_existing_data(prefer_binary=True).get("routes", [])]
+        new_deals: List[FlightDeal] = []
+        errors = 0
+        for path in partials:
+            deals, meta = _load_partial(path)
+            new_deals.extend(deals)
+            errors += int(meta.get("errors", 0))
+        logger.info(f"Reducing {len(partials)} shard files ({len(new_deals)} deals) into {output_path}")
+
+        merged = merge_incremental(existing, new_deals)
+        finalize_outputs(merged, output_path, transport_path, error_count=errors)
+        for path in partials:
+            path.unlink()
+
+        # Shards appended their observations as separate segments; fold them in once
+        if settings.WRITE_HISTORY:
+            history = PriceHistory()
+            history.compact()
+            history.export_trends(Path(settings.TRENDS_OUTPUT_PATH))
+        return len(partials)
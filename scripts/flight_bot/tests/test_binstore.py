@@ -0,0 +1,67 @@
+"""
+Binary companion round trips: write_binary_companion -> open_companion.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import pytest
+
+from scripts.flight_bot.binstore import companion_is_fresh, open_companion, write_binary_companion
+from scripts.flight_bot.writer import write_output_json
+
+ROUTES = [
+    {"origin": "RGN", "destination": "BKK", "price": 89.5, "date": "2026-11-03", "airline": "Thai AirAsia",
+     "airline_code": "FD", "transfers": 0, "found_at": "2026-10-19 08:00", "flight_number": "FD252",
+     "provider": "tp", "region": "Thailand", "fetchedAt": 1792396800000},
+    {"origin": "RGN", "destination": "BKK", "price": 120.0, "date": "2026-11-20", "airline": "Myanmar Airways",
+     "airline_code": "8M", "transfers": 1, "found_at": "2026-10-19 09:30", "provider": "amadeus",
+     "is_amadeus": True},
+    {"origin": "MDL", "destination": "SIN", "price": 210.25, "date": "2026-12-01", "airline": "Singapore Airlines",
+     "airline_code": "SQ", "transfers": 1, "found_at": "2026-10-18 22:15", "currency": "USD",
+     "is_estimated": True},
+]
+
+
+@pytest.fixture
+def json_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "flight_data.json"
+    write_output_json(path, {"meta": {"updated_at": "2026-10-19 10:00"}, "routes": ROUTES})
+    write_binary_companion(ROUTES, path)
+    return path
+
+
+def test_round_trip(json_path):
+    deals = open_companion(json_path)
+    assert deals is not None
+    try:
+        assert len(deals) == len(ROUTES)
+        assert deals.to_routes() == ROUTES
+        assert deals.routes_at([2, 0]) == [ROUTES[2], ROUTES[0]]
+        assert deals.to_routes(min_date="2026-11-15") == ROUTES[1:]
+    finally:
+        deals.close()
+
+
+def test_last_fetched_map(json_path):
+    deals = open_companion(json_path)
+    try:
+        assert deals.last_fetched_map() == {
+            "RGN_BKK_2026-11": "2026-10-19 09:30",
+            "MDL_SIN_2026-12": "2026-10-18 22:15",
+        }
+    finally:
+        deals.close()
+
+
+def test_companion_goes_stale_with_the_json(json_path):
+    assert companion_is_fresh(json_path)
+
+    write_output_json(json_path, {"meta": {"updated_at": "2026-10-19 11:00"}, "routes": ROUTES[:1]})
+    assert not companion_is_fresh(json_path)
+    assert open_companion(json_path) is None
+
+
+def test_rewrite_with_same_content_stays_fresh(json_path):
+    # Only updated_at differs, so the content hash and the companion stay valid
+    assert not write_output_json(json_path, {"meta": {"updated_at": "2026-10-19 12:00"}, "routes": ROUTES})
+    assert companion_is_fresh(json_path)
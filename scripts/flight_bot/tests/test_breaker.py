@@ -0,0 +1,192 @@
+"""
+Circuit breaker transitions, and which provider failures count against it:
+only server errors (5xx) and network failures, never a 4xx.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+import requests
+
+from scripts.flight_bot.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from scripts.flight_bot.config import (
+    BREAKER_CONSECUTIVE_TIMEOUTS, BREAKER_COOLDOWN_SECONDS, BREAKER_MAX_COOLDOWN_SECONDS, BREAKER_MIN_CALLS,
+)
+from scripts.flight_bot.metro import MetroMap
+from scripts.flight_bot.models import FlightDeal, RouteTask, RuntimeConfig
+from scripts.flight_bot.providers.amadeus import AmadeusProvider
+from scripts.flight_bot.providers.base import BaseProvider
+from scripts.flight_bot.providers.travelpayouts import TravelPayoutsProvider
+
+TASK = RouteTask(origin="RGN", destination="BKK", month="2030-05", region="Thailand")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", clock=clock)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(BREAKER_CONSECUTIVE_TIMEOUTS):
+        breaker.record_failure(timeout=True)
+
+
+def test_consecutive_timeouts_open_the_circuit(breaker):
+    for _ in range(BREAKER_CONSECUTIVE_TIMEOUTS - 1):
+        breaker.record_failure(timeout=True)
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(timeout=True)
+
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+    assert breaker.trips == 1
+
+
+def test_error_rate_opens_the_circuit(breaker):
+    # Alternating outcomes never build a timeout streak; the rate does it
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED  # Below BREAKER_MIN_CALLS
+
+    for _ in range(BREAKER_MIN_CALLS - 4):
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(breaker, clock):
+    trip(breaker)
+    clock.now += BREAKER_COOLDOWN_SECONDS
+
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # The probe is still in flight
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.cooldown == BREAKER_COOLDOWN_SECONDS
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_with_a_doubled_cooldown(breaker, clock):
+    trip(breaker)
+    clock.now += BREAKER_COOLDOWN_SECONDS
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.cooldown == 2 * BREAKER_COOLDOWN_SECONDS
+    clock.now += BREAKER_COOLDOWN_SECONDS
+    assert not breaker.allow()
+    clock.now += BREAKER_COOLDOWN_SECONDS
+    assert breaker.allow()
+
+    # A long outage backs off up to the ceiling
+    for _ in range(20):
+        breaker.record_failure()
+        clock.now += breaker.cooldown
+        breaker.allow()
+    assert breaker.cooldown == BREAKER_MAX_COOLDOWN_SECONDS
+
+
+def test_state_survives_a_checkpoint(breaker, clock):
+    trip(breaker)
+    clock.now += 10
+    assert not breaker.allow()
+
+    resumed = CircuitBreaker("test", clock=clock)
+    resumed.restore(breaker.to_dict())
+
+    assert resumed.is_open()
+    clock.now += BREAKER_COOLDOWN_SECONDS
+    assert resumed.allow()
+
+
+class CountingProvider(BaseProvider):
+    key = "tp"
+
+    def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        return []
+
+
+def test_client_errors_never_open_the_circuit():
+    provider = CountingProvider(RuntimeConfig(tp_token="test"))
+
+    for _ in range(50):
+        assert provider.count_request()
+        provider.count_error(health=False)
+
+    assert provider.errors == 50
+    assert provider.breaker.state == CLOSED
+
+
+def sdk_error(name: str, status):
+    amadeus = pytest.importorskip("amadeus")
+    response = SimpleNamespace(status_code=status, parsed=False, result={}, body="")
+    return getattr(amadeus, name)(response)
+
+
+@pytest.mark.parametrize("name, status, timeout, health", [
+    ("ServerError", 500, False, True),
+    ("ServerError", 503, False, True),
+    ("NetworkError", None, True, True),
+    ("ClientError", 400, False, False),
+    ("NotFoundError", 404, False, False),
+    ("AuthenticationError", 401, False, False),
+    ("ParserError", 200, False, False),
+])
+def test_amadeus_failure_kind(name, status, timeout, health):
+    assert AmadeusProvider._failure_kind(sdk_error(name, status)) == {"timeout": timeout, "health": health}
+
+
+def tp_provider(monkeypatch, outcome) -> TravelPayoutsProvider:
+    provider = TravelPayoutsProvider(RuntimeConfig(tp_token="test"), fanin=False, metro=MetroMap({}, []))
+
+    def get(url, params):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(status_code=outcome, json=lambda: {"data": []})
+
+    monkeypatch.setattr(provider, "_get", get)
+    return provider
+
+
+@pytest.mark.parametrize("outcome, failure, opens", [
+    (404, "http", False),
+    (400, "http", False),
+    (500, "http", True),
+    (429, "transient", True),
+    (requests.Timeout("read timed out"), "transient", True),
+    (requests.ConnectionError("unreachable"), "transient", True),
+])
+def test_travelpayouts_failures(monkeypatch, outcome, failure, opens):
+    provider = tp_provider(monkeypatch, outcome)
+
+    assert provider._query(TASK, {"destination": "BKK"}) is None
+    assert provider._local.failure == failure
+    for _ in range(max(BREAKER_MIN_CALLS, BREAKER_CONSECUTIVE_TIMEOUTS)):
+        provider._query(TASK, {"destination": "BKK"})
+
+    assert provider.breaker.is_open() == opens
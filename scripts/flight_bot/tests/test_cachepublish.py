@@ -0,0 +1,164 @@
+"""
+Shared cache publishing against an in-memory stand-in for redis-py: keys
+the API reads, TTLs, and changed-only writes.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import json
+import math
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from scripts.flight_bot.cachepublish import CachePublisher, build_values
+from scripts.flight_bot.config import REDIS_TTL_SECONDS
+
+REPO = Path(__file__).resolve().parents[3]
+
+
+class FakeRedis:
+    """The redis-py calls CachePublisher makes, with TTLs tracked and writes counted."""
+
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+        self.ttls = {}
+        self.writes = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hgetall(self, name):
+        return {k.encode(): v.encode() for k, v in self.hashes.get(name, {}).items()}
+
+    # Commands, as queued on the pipeline
+    def mset(self, mapping):
+        self.data.update(mapping)
+        self.writes.extend(mapping)
+        for key in mapping:
+            self.ttls.pop(key, None)
+        return True
+
+    def expire(self, key, seconds):
+        if key not in self.data:
+            return False
+        self.ttls[key] = seconds
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.ttls.pop(key, None)
+        return len(keys)
+
+    def hset(self, name, mapping):
+        self.hashes.setdefault(name, {}).update(mapping)
+        return len(mapping)
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes.get(name, {}).pop(key, None)
+        return len(keys)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.queued.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+
+
+def fare(destination, price, date="2026-11-10", origin="RGN"):
+    return {"origin": origin, "destination": destination, "price": price, "date": date,
+            "airline": "Thai AirAsia", "airline_code": "FD", "transfers": 0, "flight_number": "FD252",
+            "found_at": "2026-10-19 08:00"}
+
+
+ROUTES = [fare("BKK", 89.5), fare("BKK", 80.0, date="2026-11-12"), fare("BKK", 95.0, origin="MDL"),
+          fare("SIN", 150.0)]
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def test_ttl_matches_the_api_cache():
+    source = (REPO / "api" / "_lib" / "cache.ts").read_text(encoding="utf-8")
+    match = re.search(r"CACHE_TTL_SECONDS\s*=\s*([\d\s*]+);", source)
+    assert match, "CACHE_TTL_SECONDS not found in api/_lib/cache.ts"
+    assert math.prod(int(factor) for factor in match.group(1).split("*")) == REDIS_TTL_SECONDS
+
+
+def test_keys_match_what_the_api_reads():
+    values = build_values(ROUTES)
+
+    # calendarPrices.ts: bot:route:${origin}-${destination} -> calendar[date]
+    calendar = values["route:RGN-BKK"]["calendar"]
+    assert calendar["2026-11-12"]["price"] == 80.0
+    assert calendar["2026-11-10"]["flight_number"] == "FD252"
+    # destination-landing.ts: bot:dest:${code or slug} -> byOrigin[origin][month]
+    for key in ("dest:BKK", "dest:thailand"):
+        by_origin = values[key]["byOrigin"]
+        assert [d["price"] for d in by_origin["RGN"]["2026-11"]] == [80.0, 89.5]
+        assert [d["price"] for d in by_origin["MDL"]["2026-11"]] == [95.0]
+        assert values[key]["priceMonths"] == [{"month": "Nov", "value": 80.0}]
+    assert set(values) == {"route:RGN-BKK", "route:MDL-BKK", "route:RGN-SIN",
+                           "dest:BKK", "dest:SIN", "dest:thailand", "dest:singapore"}
+
+
+def test_publish_writes_every_key_with_the_ttl(redis):
+    stats = CachePublisher(redis).publish(build_values(ROUTES))
+
+    assert stats["written"] == 7
+    assert json.loads(redis.data["bot:route:RGN-BKK"])["meta"]["count"] == 2
+    assert set(redis.ttls) == set(redis.data)
+    assert set(redis.ttls.values()) == {REDIS_TTL_SECONDS}
+
+
+def test_only_changed_keys_are_republished(redis):
+    CachePublisher(redis).publish(build_values(ROUTES))
+    redis.writes.clear()
+
+    # A new process (next run, shard or daemon) reads the digests from the store
+    stats = CachePublisher(redis).publish(build_values(ROUTES))
+    assert stats["written"] == 0 and stats["unchanged"] == 7
+    assert redis.writes == []
+
+    changed = ROUTES[:3] + [fare("SIN", 140.0)]
+    stats = CachePublisher(redis).publish(build_values(changed))
+    assert stats["written"] == 3
+    assert sorted(redis.writes) == ["bot:dest:SIN", "bot:dest:singapore", "bot:route:RGN-SIN"]
+
+
+def test_removed_aggregates_are_deleted(redis):
+    publisher = CachePublisher(redis)
+    publisher.publish(build_values(ROUTES))
+
+    stats = publisher.publish(build_values(ROUTES[:3]))
+
+    assert stats["deleted"] == 3
+    assert not any("SIN" in key or "singapore" in key for key in redis.data)
+    assert "bot:route:RGN-SIN" not in redis.hashes["bot:digests"]
+
+
+def test_expiry_is_pushed_back_and_lapsed_keys_rewritten(redis, monkeypatch):
+    CachePublisher(redis).publish(build_values(ROUTES))
+    redis.writes.clear()
+    redis.ttls.clear()
+    del redis.data["bot:route:RGN-SIN"]  # Expired in the store
+
+    later = time.time() + REDIS_TTL_SECONDS
+    monkeypatch.setattr("scripts.flight_bot.cachepublish.time.time", lambda: later)
+    stats = CachePublisher(redis).publish(build_values(ROUTES))
+
+    assert stats == {"written": 1, "refreshed": 6, "deleted": 0, "unchanged": 0}
+    assert redis.writes == ["bot:route:RGN-SIN"]
+    assert set(redis.ttls) == set(redis.data)
@@ -0,0 +1,82 @@
+"""
+Schema 2 (flight_data.v2.json) round trips: encode_columnar -> decode_columnar,
+and the CI gate on the written file.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import json
+
+from scripts.flight_bot.merger import decode_columnar, read_dataset
+from scripts.flight_bot.writer import encode_columnar, write_output_json
+from scripts.validate_json import validate_file
+
+META = {"updated_at": "2026-10-19 10:00", "count": 3}
+
+# Records as decode_columnar returns them, so the round trip must be exact
+ROUTES = [
+    {"origin": "RGN", "destination": "BKK", "price": 89.5, "date": "2026-11-03", "currency": "USD",
+     "airline": "Thai AirAsia", "airline_code": "FD", "transfers": 0, "found_at": "2026-10-19 08:00",
+     "fetchedAt": 1792396800123, "provider": "tp", "is_amadeus": False, "is_estimated": False,
+     "region": "Thailand", "flight_number": "FD252"},
+    {"origin": "MDL", "destination": "SIN", "price": 210.25, "date": "2026-12-01", "currency": "USD",
+     "airline": "SQ", "airline_code": "SQ", "transfers": 1, "found_at": "2026-10-18 22:15",
+     "fetchedAt": 0, "provider": "amadeus", "is_amadeus": True, "is_estimated": False,
+     "region": "Singapore", "flight_number": ""},
+    {"origin": "RGN", "destination": "BKK", "price": 95.0, "date": "2026-11-04", "currency": "USD",
+     "airline": "Thai AirAsia", "airline_code": "FD", "transfers": 0, "found_at": "",
+     "fetchedAt": 0, "provider": "tp", "is_amadeus": False, "is_estimated": True,
+     "region": "Thailand", "flight_number": ""},
+]
+
+
+def test_round_trip():
+    doc = encode_columnar(ROUTES, META)
+
+    assert decode_columnar(doc) == {"meta": META, "routes": ROUTES}
+
+
+def test_tables_and_offsets():
+    doc = encode_columnar(ROUTES, META)
+
+    assert doc["meta"]["schema"] == 2 and doc["meta"]["base_date"] == "2026-11-03"
+    assert doc["dict"]["airport"] == ["BKK", "MDL", "RGN", "SIN"]
+    # The name is only stored when it differs from the code
+    assert doc["dict"]["airline"] == [["FD", "Thai AirAsia"], ["SQ"]]
+    assert doc["routes"]["date"] == [0, 28, 1]
+    assert doc["routes"]["found_at"][2] is None
+    assert doc["routes"]["flags"] == [0, 1, 2]
+
+
+def test_sparse_records_get_the_v1_defaults():
+    sparse = {"origin": "RGN", "destination": "KUL", "price": 120.0, "date": "2026-11-20",
+              "airline_code": "AK", "flight_num": "AK1431"}
+
+    (route,) = decode_columnar(encode_columnar([sparse], {}))["routes"]
+
+    assert route == {
+        "origin": "RGN", "destination": "KUL", "price": 120.0, "date": "2026-11-20", "currency": "USD",
+        "airline": "", "airline_code": "AK", "transfers": 0, "found_at": "", "fetchedAt": 0,
+        "provider": "", "is_amadeus": False, "is_estimated": False, "region": "", "flight_number": "AK1431",
+    }
+
+
+def test_empty_dataset():
+    assert decode_columnar(encode_columnar([], META)) == {"meta": META, "routes": []}
+
+
+def test_written_file_reads_back_and_passes_validation(tmp_path):
+    path = tmp_path / "flight_data.v2.json"
+    write_output_json(path, encode_columnar(ROUTES, META), compact=True)
+
+    assert read_dataset(path)["routes"] == ROUTES
+    report = validate_file(path)
+    assert report.ok and report.records == len(ROUTES)
+
+
+def test_validation_rejects_bad_indexes(tmp_path):
+    doc = encode_columnar(ROUTES, META)
+    doc["routes"]["destination"][1] = len(doc["dict"]["airport"])
+    path = tmp_path / "flight_data.v2.json"
+    path.write_text(json.dumps(doc), encoding="utf-8")
+
+    assert not validate_file(path).ok
@@ -0,0 +1,77 @@
+"""
+Daemon cycles over a warm fetcher, with a fake TP provider instead of the network.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+from typing import List
+
+import pytest
+
+from scripts.flight_bot import config as settings
+from scripts.flight_bot import providers
+from scripts.flight_bot.daemon import FlightDaemon
+from scripts.flight_bot.models import FlightDeal, RouteTask, RuntimeConfig
+from scripts.flight_bot.providers.base import BaseProvider
+
+
+class FakeTPProvider(BaseProvider):
+    """One request per task; only routes to BKK have fares."""
+    key = "tp"
+
+    def __init__(self, config: RuntimeConfig):
+        super().__init__(config)
+        self.calls = 0
+
+    def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        if not self.count_request():
+            return []
+        self.calls += 1
+        self.count_success()
+        if task.destination != "BKK":
+            return []
+        return [FlightDeal(origin=task.origin, destination=task.destination, price=120.0,
+                           date=f"{task.month}-28", airline="Test Air", airline_code="TA",
+                           found_at="2026-01-01 00:00", fetchedAt=1, region=task.region)]
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(providers._loaded, "fake", FakeTPProvider)
+    for name, value in (("FLIGHT_BOT_HISTORY", "0"), ("FLIGHT_BOT_DESTINATIONS", "0"),
+                        ("FLIGHT_BOT_DAEMON_PUBLISH_CHANGES", "1000000")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("FLIGHT_BOT_REDIS_URL", raising=False)
+    monkeypatch.delenv("KV_URL", raising=False)
+    settings.reset_lazy("WRITE_HISTORY", "WRITE_DESTINATIONS", "DAEMON_PUBLISH_CHANGES", "REDIS_URL")
+    config = RuntimeConfig(
+        tp_token="test", providers=["fake"], fetch_workers=1,
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+        output_path=str(tmp_path / "client" / "public" / "data" / "flight_data.json"),
+    )
+    yield FlightDaemon(config)
+    settings.reset_lazy("WRITE_HISTORY", "WRITE_DESTINATIONS", "DAEMON_PUBLISH_CHANGES", "REDIS_URL")
+
+
+def test_every_cycle_spends_its_own_quota(daemon):
+    quotas = {"tp": 10, "amadeus": 0}
+
+    daemon.cycle(quotas)
+    provider = daemon.pipeline.stages[1].fetcher.providers[0]
+    first_calls = provider.calls
+    assert first_calls == 10
+
+    # Same warm provider, new planner: the second cycle must not see the first one's requests
+    daemon.cycle(quotas)
+    assert daemon.pipeline.stages[1].fetcher.providers[0] is provider
+    assert provider.calls - first_calls == 10
+    assert provider.requests == 10
+
+
+def test_only_route_months_with_deals_are_stamped(daemon):
+    daemon.cycle({"tp": 40, "amadeus": 0})
+    daemon.cycle({"tp": 40, "amadeus": 0})
+
+    stamped = [key for key, found_at in daemon.last_fetched_map.items() if found_at != "2000-01-01 00:00"]
+    assert stamped
+    assert all(key.split("_")[1] == "BKK" for key in stamped)
@@ -0,0 +1,73 @@
+"""
+Estimation engine curves, the per-route cap and the price bounds.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+from scripts.flight_bot.config import MAX_PRICE_USD
+from scripts.flight_bot.estimation import estimate_routes, with_estimates
+
+MONTH = "2030-05"
+
+
+def fare(day: int, price: float, month: str = MONTH, destination: str = "BKK") -> dict:
+    return {"origin": "RGN", "destination": destination, "price": price, "date": f"{month}-{day:02d}",
+            "airline": "Thai AirAsia", "airline_code": "FD", "transfers": 0, "provider": "tp"}
+
+
+def by_date(estimates):
+    return {e["date"]: e["price"] for e in estimates}
+
+
+def test_nearest_curve():
+    estimates = estimate_routes([fare(10, 100.0), fare(14, 200.0)], curve="nearest",
+                                max_gap=2, markup=0.02, max_per_route=100)
+
+    assert by_date(estimates) == {
+        f"{MONTH}-08": 104.0, f"{MONTH}-09": 102.0,
+        f"{MONTH}-11": 102.0, f"{MONTH}-12": 104.0,  # Equidistant days take the earlier fare
+        f"{MONTH}-13": 204.0, f"{MONTH}-15": 204.0, f"{MONTH}-16": 208.0,
+    }
+    assert all(e["is_estimated"] and e["airline_code"] == "FD" for e in estimates)
+
+
+def test_linear_curve_interpolates_between_fares():
+    estimates = estimate_routes([fare(10, 100.0), fare(14, 200.0)], curve="linear",
+                                max_gap=2, markup=0.02, max_per_route=100)
+
+    prices = by_date(estimates)
+    assert prices[f"{MONTH}-11"] == 127.5
+    assert prices[f"{MONTH}-12"] == 156.0
+    assert prices[f"{MONTH}-13"] == 178.5
+    # Past the last fare the curve falls back to the nearest one
+    assert prices[f"{MONTH}-09"] == 102.0
+    assert prices[f"{MONTH}-16"] == 208.0
+
+
+def test_per_route_cap_keeps_the_closest_days():
+    real = [fare(10, 100.0), fare(14, 200.0), fare(3, 150.0, month="2030-06")]
+    estimates = estimate_routes(real, curve="nearest", max_gap=2, markup=0.02, max_per_route=4)
+
+    # Six days sit one day from a fare across both months; the earliest four win
+    assert sorted(by_date(estimates)) == [f"{MONTH}-09", f"{MONTH}-11", f"{MONTH}-13", f"{MONTH}-15"]
+
+    other = estimate_routes(real + [fare(10, 90.0, destination="SIN")], curve="nearest",
+                            max_gap=2, markup=0.02, max_per_route=4)
+    assert sum(e["destination"] == "SIN" for e in other) == 4
+
+
+def test_estimates_stay_within_price_bounds():
+    estimates = estimate_routes([fare(10, MAX_PRICE_USD - 100)], curve="nearest",
+                                max_gap=2, markup=0.02, max_per_route=100)
+
+    # +2% is still in bounds, +4% is not
+    assert sorted(by_date(estimates)) == [f"{MONTH}-09", f"{MONTH}-11"]
+    assert all(e["price"] <= MAX_PRICE_USD for e in estimates)
+
+
+def test_with_estimates_replaces_stale_estimates():
+    stale = {**fare(20, 50.0), "is_estimated": True}
+    routes = with_estimates([fare(10, 100.0), stale])
+
+    assert stale not in routes
+    assert all(r["date"] != f"{MONTH}-20" for r in routes)
+    assert sum(not r.get("is_estimated") for r in routes) == 1
@@ -0,0 +1,121 @@
+"""
+Price history: append -> observations, compaction, rollups and the trends export.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import json
+import time
+
+import numpy as np
+import pytest
+
+from scripts.flight_bot.history import (
+    OBS_DTYPE, ROLLUP_DTYPE, PriceHistory, _merge_rollups, _save, daily_rollup,
+)
+from scripts.flight_bot.models import FlightDeal
+from scripts.validate_json import validate_file
+
+DAY = 86400
+NOW = int(time.time())
+
+
+def deal(price, date="2030-05-10", destination="BKK", observed=NOW - 3600, **kwargs) -> FlightDeal:
+    return FlightDeal(origin="RGN", destination=destination, price=price, date=date, airline_code="FD",
+                      fetchedAt=observed * 1000, **kwargs)
+
+
+@pytest.fixture
+def history(tmp_path):
+    return PriceHistory(tmp_path / "price_history")
+
+
+def test_append_round_trip(history):
+    deals = [deal(120.0), deal(100.0, observed=NOW - 7200), deal(300.0, destination="SIN"),
+             deal(90.0, is_estimated=True)]
+
+    assert history.append(deals) == 3
+
+    obs = history.observations("RGN", "BKK")
+    assert obs["price"].tolist() == [100.0, 120.0]  # Oldest first
+    assert obs["observed"].tolist() == [NOW - 7200, NOW - 3600]
+    assert obs["depart"].tolist() == [(np.datetime64("2030-05-10") - np.datetime64("1970-01-01")).astype(int)] * 2
+    assert obs["airline"].tolist() == [b"FD", b"FD"]
+
+
+def test_compact_merges_a_month_into_one_file(history):
+    history.append([deal(120.0)])
+    history.append([deal(100.0)])
+    assert len(list(history.raw_dir.glob("*/*.npz"))) == 2
+
+    history.compact()
+
+    files = list(history.raw_dir.glob("*/*.npz"))
+    assert [p.name for p in files] == ["compact.npz"]
+    assert sorted(history.observations("RGN", "BKK")["price"].tolist()) == [100.0, 120.0]
+
+
+def test_daily_rollup_groups_by_departure_date_and_day():
+    obs = np.zeros(5, dtype=OBS_DTYPE)
+    obs["route"] = b"RGN-BKK"
+    obs["depart"] = [100, 100, 100, 101, 100]
+    obs["observed"] = [DAY * 10, DAY * 10 + 60, DAY * 10 + 120, DAY * 10, DAY * 11]
+    obs["price"] = [140.0, 100.0, 120.0, 80.0, 90.0]
+
+    rows = daily_rollup(obs)
+
+    assert rows[["depart", "day"]].tolist() == [(100, 10), (100, 11), (101, 10)]
+    assert rows["min"].tolist() == [100.0, 90.0, 80.0]
+    assert rows["median"].tolist() == [120.0, 90.0, 80.0]
+    assert rows["count"].tolist() == [3, 1, 1]
+
+
+def test_merge_rollups_combines_the_same_key():
+    part = np.zeros(1, dtype=ROLLUP_DTYPE)
+    part[0] = (b"RGN-BKK", 100, 10, 100.0, 110.0, 1)
+    late = np.zeros(1, dtype=ROLLUP_DTYPE)
+    late[0] = (b"RGN-BKK", 100, 10, 90.0, 130.0, 3)
+
+    rows = _merge_rollups([part, late])
+
+    assert len(rows) == 1
+    assert rows["min"][0] == 90.0
+    assert rows["count"][0] == 4
+    assert rows["median"][0] == pytest.approx(125.0)
+
+
+def test_old_months_are_rolled_up_and_dropped(history):
+    old = NOW - 120 * DAY
+    history.append([deal(100.0, observed=old), deal(140.0, observed=old + 60),
+                    deal(500.0, destination="SIN", observed=old)])
+    history.append([deal(110.0)])
+
+    history.compact(retain_days=30)
+
+    assert len(list(history.rollup_dir.glob("*.npz"))) == 1
+    assert history.observations("RGN", "BKK")["price"].tolist() == [110.0]
+
+    rows = history.scan("RGN", "BKK")
+    assert rows["day"].tolist() == [old // DAY, (NOW - 3600) // DAY]
+    assert rows["min"].tolist() == [100.0, 110.0]
+    assert rows["median"].tolist() == [120.0, 110.0]
+    assert rows["count"].tolist() == [2, 1]
+
+
+def test_export_trends_nests_departure_months(history, tmp_path):
+    history.append([deal(120.0, date="2030-05-10"), deal(100.0, date="2030-05-20"),
+                    deal(90.0, date="2030-06-01")])
+    legacy = np.zeros(1, dtype=[(name, ROLLUP_DTYPE[name]) for name in ROLLUP_DTYPE.names if name != "depart"])
+    legacy[0] = (b"RGN-BKK", NOW // DAY - 1, 50.0, 50.0, 1)
+    _save(history.rollup_dir / f"{np.datetime64(NOW - DAY, 's').astype('datetime64[M]')}.npz", legacy)
+
+    path = tmp_path / "price_trends.json"
+    assert history.export_trends(path) == 1
+
+    doc = json.loads(path.read_text())
+    day = str(np.datetime64(NOW - 3600, "s").astype("datetime64[D]"))
+    # Rollups written before departure dates were kept cannot be placed in a month
+    assert doc["routes"] == {"RGN-BKK": {
+        "2030-05": [[day, 100.0, 110.0, 2]],
+        "2030-06": [[day, 90.0, 90.0, 1]],
+    }}
+    assert validate_file(path).ok
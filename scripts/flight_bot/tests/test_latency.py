@@ -0,0 +1,124 @@
+"""
+Latency-derived timeouts and hedged TravelPayouts requests, with a fake
+session instead of the network.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from scripts.flight_bot.config import (
+    LATENCY_MIN_SAMPLES, LATENCY_MIN_TIMEOUT, LATENCY_TIMEOUT_FACTOR, REQUEST_TIMEOUT,
+)
+from scripts.flight_bot.metro import MetroMap
+from scripts.flight_bot.models import RuntimeConfig
+from scripts.flight_bot.providers.travelpayouts import TravelPayoutsProvider
+from scripts.flight_bot.session import LatencyTracker, RateLimiter
+
+URL = "https://api.travelpayouts.com/test"
+PARAMS = {"origin": "RGN", "destination": "BKK"}
+
+
+def tracker(*samples: float) -> LatencyTracker:
+    latency = LatencyTracker()
+    for seconds in samples:
+        latency.record(seconds)
+    return latency
+
+
+def test_defaults_until_warmed_up():
+    latency = tracker(*[0.2] * (LATENCY_MIN_SAMPLES - 1))
+
+    assert latency.timeout() == REQUEST_TIMEOUT
+    assert latency.hedge_delay() is None
+
+
+def test_timeout_follows_the_p99_within_bounds():
+    samples = [0.1 * i for i in range(1, 101)]
+    assert tracker(*samples).hedge_delay() == pytest.approx(9.6)
+    assert tracker(*samples).timeout() == REQUEST_TIMEOUT  # 2 x 10s, capped
+
+    fast = [0.01] * LATENCY_MIN_SAMPLES
+    assert tracker(*fast).timeout() == LATENCY_MIN_TIMEOUT
+
+    steady = [2.0] * LATENCY_MIN_SAMPLES
+    assert tracker(*steady).timeout() == 2.0 * LATENCY_TIMEOUT_FACTOR
+
+
+class FakeSession:
+    """Answers in order; a call listed in ``stall`` blocks until released."""
+
+    def __init__(self, *outcomes, stall=()):
+        self.outcomes = list(outcomes)
+        self.stall = set(stall)
+        self.release = threading.Event()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        if call in self.stall:
+            self.release.wait(5)
+        outcome = self.outcomes[call]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def provider():
+    provider = TravelPayoutsProvider(RuntimeConfig(tp_token="test"), fanin=False, metro=MetroMap({}, []))
+    provider.limiter = RateLimiter(0)
+    provider.hedging = True
+    yield provider
+    if provider._pool is not None:
+        provider.session.release.set()
+        provider._pool.shutdown(wait=True)
+
+
+def test_timed_out_request_is_recorded_at_the_timeout(provider):
+    provider.session = FakeSession(requests.Timeout("read timed out"), requests.ConnectionError("refused"))
+
+    with pytest.raises(requests.Timeout):
+        provider._timed_get(URL, PARAMS, timeout=4.0)
+    with pytest.raises(requests.ConnectionError):
+        provider._timed_get(URL, PARAMS, timeout=4.0)
+
+    samples = list(provider.latency._samples)
+    assert samples[0] == 4.0
+    assert 0 <= samples[1] < 4.0
+
+
+def test_slow_primary_is_hedged(provider):
+    provider.latency = tracker(*[0.01] * LATENCY_MIN_SAMPLES)
+    primary, hedge = SimpleNamespace(status_code=200), SimpleNamespace(status_code=200)
+    provider.session = FakeSession(primary, hedge, stall={0})
+
+    assert provider._get(URL, PARAMS) is hedge
+    assert provider.hedges == 1 and provider.hedge_wins == 1
+    assert provider.requests == 1  # The hedge took its own slot of the run quota
+
+
+def test_fast_primary_is_not_hedged(provider):
+    provider.latency = tracker(*[1.0] * LATENCY_MIN_SAMPLES)
+    response = SimpleNamespace(status_code=200)
+    provider.session = FakeSession(response)
+
+    assert provider._get(URL, PARAMS) is response
+    assert provider.hedges == 0
+    assert provider.session.calls == 1
+
+
+def test_failed_hedge_falls_back_to_the_primary(provider):
+    provider.latency = tracker(*[0.01] * LATENCY_MIN_SAMPLES)
+    primary = SimpleNamespace(status_code=200)
+    provider.session = FakeSession(primary, requests.ConnectionError("refused"), stall={0})
+
+    threading.Timer(0.2, provider.session.release.set).start()
+    assert provider._get(URL, PARAMS) is primary
+    assert provider.hedges == 1 and provider.hedge_wins == 0
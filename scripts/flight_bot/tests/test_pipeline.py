@@ -0,0 +1,87 @@
+"""
+Pipeline exit status, with fake TP providers instead of the network.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+from typing import List, Tuple
+
+import pytest
+
+from scripts.flight_bot import config as settings
+from scripts.flight_bot import providers
+from scripts.flight_bot.models import FlightDeal, RouteTask, RuntimeConfig
+from scripts.flight_bot.pipeline import ALL_PROVIDERS_DOWN, Pipeline
+from scripts.flight_bot.providers.base import BaseProvider
+
+
+class AnsweringProvider(BaseProvider):
+    """Every task gets one fare."""
+    key = "tp"
+
+    def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        if not self.count_request():
+            return []
+        self.count_success()
+        return [FlightDeal(origin=task.origin, destination=task.destination, price=120.0,
+                           date=f"{task.month}-28", airline_code="TA", region=task.region)]
+
+
+class RejectedProvider(BaseProvider):
+    """Every call is refused with a 4xx: errors, but the circuit stays closed."""
+    key = "tp"
+
+    def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        if self.count_request():
+            self.count_error(health=False)
+        return []
+
+
+class UnreachableProvider(BaseProvider):
+    """Every call times out, which opens the circuit."""
+    key = "tp"
+
+    def fetch_deals(self, task: RouteTask) -> List[FlightDeal]:
+        if self.count_request():
+            self.count_error(timeout=True)
+        return []
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, value in (("FLIGHT_BOT_HISTORY", "0"), ("FLIGHT_BOT_DESTINATIONS", "0")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("FLIGHT_BOT_REDIS_URL", raising=False)
+    monkeypatch.delenv("KV_URL", raising=False)
+    settings.reset_lazy("WRITE_HISTORY", "WRITE_DESTINATIONS", "REDIS_URL")
+
+    def run(provider_cls) -> Tuple[Pipeline, int]:
+        monkeypatch.setitem(providers._loaded, "fake", provider_cls)
+        config = RuntimeConfig(
+            tp_token="test", providers=["fake"], fetch_workers=1, max_requests=8, amadeus_max_requests=0,
+            checkpoint_path=str(tmp_path / "checkpoint.json"),
+            output_path=str(tmp_path / "client" / "public" / "data" / "flight_data.json"),
+        )
+        pipeline = Pipeline(config)
+        return pipeline, pipeline.run()
+
+    yield run
+    settings.reset_lazy("WRITE_HISTORY", "WRITE_DESTINATIONS", "REDIS_URL")
+
+
+def test_run_with_deals_succeeds(run):
+    _, code = run(AnsweringProvider)
+    assert code == 0
+
+
+def test_run_where_every_fetch_fails_exits_non_zero(run):
+    _, code = run(RejectedProvider)
+    assert code == 1
+
+
+def test_run_stopped_by_open_circuits_exits_non_zero(run, caplog):
+    pipeline, code = run(UnreachableProvider)
+
+    assert code == 1
+    assert pipeline.stages[1].fetcher.all_down()
+    assert ALL_PROVIDERS_DOWN in caplog.text
@@ -0,0 +1,128 @@
+"""
+DealIndex lookups against a linear scan of the same routes, from the JSON
+and from the binary companion.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+import numpy as np
+import pytest
+
+from scripts.flight_bot.binstore import write_binary_companion
+from scripts.flight_bot.query import DealIndex
+from scripts.flight_bot.writer import write_output_json
+
+
+def make_routes(n: int = 400):
+    rng = np.random.default_rng(7)
+    airports = ["RGN", "MDL", "BKK", "SIN", "KUL"]
+    # Distinct prices, so "cheapest" has exactly one right answer
+    prices = 30 + 0.5 * rng.permutation(n)
+    routes = []
+    for i in range(n):
+        origin, destination = rng.choice(airports, size=2, replace=False).tolist()
+        month = ["2026-11", "2026-12", "2027-01"][int(rng.integers(3))]
+        routes.append({
+            "origin": origin, "destination": destination, "price": float(prices[i]),
+            "date": f"{month}-{int(rng.integers(1, 29)):02d}", "airline": "Test Air",
+            "airline_code": ["FD", "8M", "SQ", ""][int(rng.integers(4))], "transfers": 0,
+            "found_at": "2026-10-19 08:00", "provider": "tp",
+            **({"is_estimated": True} if rng.random() < 0.2 else {}),
+        })
+    return routes
+
+
+ROUTES = make_routes()
+
+
+@pytest.fixture(params=["json", "companion"])
+def index(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "flight_data.json"
+    write_output_json(path, {"meta": {"updated_at": "2026-10-19 10:00"}, "routes": ROUTES})
+    if request.param == "companion":
+        write_binary_companion(ROUTES, path)
+    return DealIndex.load(path)
+
+
+def scan(origin=None, destination=None, start=None, end=None, month=None, airline=None, include_estimated=True):
+    return [r for r in ROUTES
+            if (not origin or r["origin"] == origin)
+            and (not destination or r["destination"] == destination)
+            and (not start or r["date"] >= start)
+            and (not end or r["date"][:len(end)] <= end)
+            and (not month or r["date"].startswith(month))
+            and (not airline or r["airline_code"] == airline)
+            and (include_estimated or not r.get("is_estimated"))]
+
+
+def test_loads_every_route(index):
+    assert len(index) == len(ROUTES)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"start": "2026-12-01"},
+    {"end": "2026-12"},
+    {"start": "2026-11-10", "end": "2026-12-15"},
+    {"airline": "8M"},
+    {"include_estimated": False},
+])
+def test_route(index, kwargs):
+    expected = sorted(scan("RGN", "BKK", **kwargs), key=lambda r: (r["date"], r["price"]))
+    assert expected
+    assert index.route("RGN", "BKK", **kwargs) == expected
+
+
+def test_unknown_route_is_empty(index):
+    assert index.route("RGN", "XXX") == []
+    assert index.calendar("RGN", "XXX") == {}
+
+
+def test_calendar_keeps_the_cheapest_per_day(index):
+    expected = {}
+    for r in scan("MDL", "SIN", month="2026-12"):
+        if r["date"] not in expected or r["price"] < expected[r["date"]]["price"]:
+            expected[r["date"]] = r
+
+    calendar = index.calendar("MDL", "SIN", "2026-12")
+
+    assert calendar == expected
+    assert list(calendar) == sorted(calendar)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"origin": "RGN"},
+    {"destination": "BKK"},
+    {"origin": "RGN", "destination": "BKK"},
+    {"month": "2026-12"},
+    {"month": "2026-12", "destination": "SIN"},
+    {"month": "2026-12", "origin": "KUL"},
+    {"origin": "RGN", "destination": "BKK", "airline": "FD"},
+    {"destination": "KUL", "include_estimated": False},
+])
+def test_cheapest(index, kwargs):
+    expected = sorted(scan(**kwargs), key=lambda r: r["price"])[:5]
+    assert expected
+    assert index.cheapest(5, **kwargs) == expected
+
+
+def test_price_range(index):
+    expected = sorted(scan(include_estimated=False), key=lambda r: r["price"])
+    expected = [r for r in expected if 80 <= r["price"] <= 120]
+
+    assert index.price_range(80, 120, include_estimated=False) == expected
+    assert index.price_range(80, 120, limit=3, include_estimated=False) == expected[:3]
+
+
+def test_airlines(index):
+    best = {}
+    for r in scan("RGN", "BKK", month="2026-11"):
+        code = r["airline_code"]
+        if code and (code not in best or r["price"] < best[code]):
+            best[code] = r["price"]
+
+    airlines = index.airlines("RGN", "BKK", "2026-11")
+
+    assert airlines == best
+    assert list(airlines.values()) == sorted(best.values())
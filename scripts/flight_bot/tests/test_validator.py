@@ -0,0 +1,76 @@
+"""
+Validation stage: bounds and date checks agree with scripts/validate_json.py,
+and the outlier filter only judges against real fares.
+
+    PYTHONPATH=. python -m pytest scripts/flight_bot/tests
+"""
+from pathlib import Path
+
+import pytest
+
+from scripts.flight_bot.config import MAX_PRICE_USD, MIN_PRICE_USD
+from scripts.flight_bot.models import FlightDeal
+from scripts.flight_bot.validator import validate_deals
+from scripts.validate_json import Report, _route_checker
+
+
+def deal(price, date="2026-11-10", origin="RGN", destination="BKK", airline_code="FD", **kwargs) -> FlightDeal:
+    return FlightDeal(origin=origin, destination=destination, price=price, date=date,
+                      airline_code=airline_code, **kwargs)
+
+
+def published_ok(d: FlightDeal) -> bool:
+    """Whether the CI gate accepts the record as the writer would publish it."""
+    report = Report(Path("flight_data.json"))
+    _route_checker(report)(0, d.to_dict())
+    return not report.errors
+
+
+@pytest.mark.parametrize("price, date, field", [
+    (MIN_PRICE_USD, "2026-11-10", None),
+    (MAX_PRICE_USD, "2026-11-10", None),
+    (150.0, "2028-02-29", None),
+    (MIN_PRICE_USD - 0.01, "2026-11-10", "below_min"),
+    (MAX_PRICE_USD + 0.01, "2026-11-10", "above_max"),
+    (float("nan"), "2026-11-10", "malformed_price"),
+    (150.0, "2026-02-29", "malformed_date"),
+    (150.0, "2026-13-01", "malformed_date"),
+    (150.0, "26-11-10", "malformed_date"),
+    (150.0, "", "malformed_date"),
+])
+def test_single_record_matches_ci_gate(price, date, field):
+    d = deal(price, date=date)
+    kept, report = validate_deals([d], [])
+
+    assert (kept == [d]) == (field is None)
+    if field:
+        assert getattr(report, field) == 1
+    if price == price:  # validate_json rejects NaN before JSON can carry it
+        assert published_ok(d) == (field is None)
+
+
+def test_non_numeric_price_is_rejected():
+    kept, report = validate_deals([deal("n/a")], [])
+    assert kept == [] and report.malformed_price == 1
+
+
+def test_cheap_outlier_is_dropped_against_route_history():
+    reference = [deal(p, date=f"2026-11-{day:02d}") for day, p in enumerate((190, 200, 205, 210, 220), 1)]
+    cheap, normal, other_route = deal(40.0), deal(180.0), deal(40.0, destination="SIN")
+
+    kept, report = validate_deals([cheap, normal, other_route], reference)
+
+    assert kept == [normal, other_route]
+    assert report.outliers == 1
+    assert report.summary().startswith("kept 2/3")
+
+
+def test_estimates_do_not_count_as_route_history():
+    reference = [deal(p, date=f"2026-11-{day:02d}", is_estimated=True)
+                 for day, p in enumerate((190, 200, 205, 210, 220), 1)]
+    cheap = deal(40.0)
+
+    kept, report = validate_deals([cheap], reference)
+
+    assert kept == [cheap]
+    assert report.outliers == 0
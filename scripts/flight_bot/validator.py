@@ -0,0 +1,177 @@
+"""
+Vectorized validation stage that runs between fetch and merge.
+
+Each batch is checked column-wise with NumPy instead of per-dict:
+1. Malformed dates (not a real YYYY-MM-DD calendar day) are dropped.
+2. Prices outside MIN_PRICE_USD..MAX_PRICE_USD (or non-numeric) are dropped.
+3. Suspiciously cheap fares are dropped using the modified z-score over the
+   median/MAD of the batch plus the existing dataset's real (non-estimated)
+   fares for that route. Only the low side is filtered: expensive peak-date
+   fares are real, and MAX_PRICE_USD already catches junk on the high side.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from .config import (
+    MIN_PRICE_USD, MAX_PRICE_USD,
+    OUTLIER_MAD_THRESHOLD, OUTLIER_MAD_FLOOR, OUTLIER_MIN_SAMPLES,
+)
+from .models import FlightDeal
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Scales MAD to a standard deviation for normally distributed prices
+_MAD_SCALE = 0.6745
+
+
+@dataclass
+class ValidationReport:
+    """Row counts for one or more validated batches."""
+    total: int = 0
+    kept: int = 0
+    malformed_date: int = 0
+    malformed_price: int = 0
+    below_min: int = 0
+    above_max: int = 0
+    outliers: int = 0
+
+    @property
+    def rejected(self) -> int:
+        return self.total - self.kept
+
+    def add(self, other: "ValidationReport") -> None:
+        for name in self.__dataclass_fields__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def summary(self) -> str:
+        return (
+            f"kept {self.kept}/{self.total} "
+            f"(dates={self.malformed_date}, price={self.malformed_price}, "
+            f"<min={self.below_min}, >max={self.above_max}, outliers={self.outliers})"
+        )
+
+
+def _valid_dates(dates: Sequence[str]) -> np.ndarray:
+    """Mask of strings that are real calendar days in YYYY-MM-DD form."""
+    arr = np.array([d if isinstance(d, str) else "" for d in dates], dtype="U11")
+    codes = arr.view(np.uint32).reshape(len(arr), 11).astype(np.int64)
+    digits = codes - ord("0")
+    digit_pos = [0, 1, 2, 3, 5, 6, 8, 9]
+
+    ok = (np.char.str_len(arr) == 10)
+    ok &= (codes[:, 4] == ord("-")) & (codes[:, 7] == ord("-"))
+    ok &= ((digits[:, digit_pos] >= 0) & (digits[:, digit_pos] <= 9)).all(axis=1)
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    ok &= (month >= 1) & (month <= 12) & (day >= 1)
+
+    months = np.where(ok, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    days_in_month = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+    ok &= day <= days_in_month
+    return ok
+
+
+def _to_prices(prices: Sequence) -> np.ndarray:
+    try:
+        return np.asarray(prices, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(prices), np.nan)
+        for i, p in enumerate(prices):
+            try:
+                out[i] = float(p)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def _group_median(groups: np.ndarray, values: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Median and row count per group id, via a single lexsort."""
+    order = np.lexsort((values, groups))
+    g, v = groups[order], values[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    medians = np.full(n_groups, np.nan)
+    lo = starts[present] + (counts[present] - 1) // 2
+    hi = starts[present] + counts[present] // 2
+    medians[present] = (v[lo] + v[hi]) / 2
+    return medians, counts
+
+
+def _outlier_mask(route_keys: np.ndarray, prices: np.ndarray, candidate: np.ndarray,
+                  ref_keys: np.ndarray, ref_prices: np.ndarray) -> np.ndarray:
+    """Mask of batch rows priced more than OUTLIER_MAD_THRESHOLD robust deviations below their route median."""
+    n = len(prices)
+    flagged = np.zeros(n, dtype=bool)
+    ref_ok = np.isfinite(ref_prices)
+    pool_keys = np.concatenate((route_keys[candidate], ref_keys[ref_ok]))
+    pool_prices = np.concatenate((prices[candidate], ref_prices[ref_ok]))
+    if not len(pool_keys):
+        return flagged
+
+    uniq, pool_groups = np.unique(pool_keys, return_inverse=True)
+    medians, counts = _group_median(pool_groups, pool_prices, len(uniq))
+    mads, _ = _group_median(pool_groups, np.abs(pool_prices - medians[pool_groups]), len(uniq))
+
+    groups = pool_groups[:candidate.sum()]
+    med, cnt = medians[groups], counts[groups]
+    # Floor the MAD so tightly clustered routes don't flag ordinary promo fares
+    mad = np.maximum(mads[groups], OUTLIER_MAD_FLOOR * med)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = _MAD_SCALE * (med - prices[candidate]) / mad
+    flagged[np.flatnonzero(candidate)] = (cnt >= OUTLIER_MIN_SAMPLES) & (mad > 0) & (z > OUTLIER_MAD_THRESHOLD)
+    return flagged
+
+
+def _validate(items: List[T], reference: Sequence[T], get: Callable[[T, str], object]) -> Tuple[List[T], ValidationReport]:
+    report = ValidationReport(total=len(items))
+    if not items:
+        return [], report
+
+    origins = np.array([get(x, "origin") for x in items], dtype="U3")
+    dests = np.array([get(x, "destination") for x in items], dtype="U3")
+    prices = _to_prices([get(x, "price") for x in items])
+
+    date_ok = _valid_dates([get(x, "date") for x in items])
+    finite = np.isfinite(prices)
+    below = finite & (prices < MIN_PRICE_USD)
+    above = finite & (prices > MAX_PRICE_USD)
+
+    report.malformed_date = int((~date_ok).sum())
+    report.malformed_price = int((date_ok & ~finite).sum())
+    report.below_min = int((date_ok & below).sum())
+    report.above_max = int((date_ok & above).sum())
+    candidate = date_ok & finite & ~below & ~above
+
+    route_keys = np.char.add(np.char.add(origins, "-"), dests)
+    # Calendar estimates are derived from real fares; they must not judge them
+    reference = [x for x in reference if not get(x, "is_estimated")]
+    if reference:
+        ref_keys = np.char.add(
+            np.char.add(np.array([get(x, "origin") for x in reference], dtype="U3"), "-"),
+            np.array([get(x, "destination") for x in reference], dtype="U3"),
+        )
+        ref_prices = _to_prices([get(x, "price") for x in reference])
+    else:
+        ref_keys = np.array([], dtype="U7")
+        ref_prices = np.array([], dtype=np.float64)
+
+    outliers = _outlier_mask(route_keys, prices, candidate, ref_keys, ref_prices)
+    report.outliers = int(outliers.sum())
+    keep = candidate & ~outliers
+    report.kept = int(keep.sum())
+
+    kept = [items[i] for i in np.flatnonzero(keep)]
+    return kept, report
+
+
+def validate_deals(new_deals: List[FlightDeal], reference_deals: Sequence[FlightDeal]) -> Tuple[List[FlightDeal], ValidationReport]:
+    """Validate FlightDeal objects against the existing dataset."""
+    return _validate(new_deals, reference_deals, getattr)
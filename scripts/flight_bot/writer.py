@@ -1,12 +1,26 @@
+import calendar
+import gzip
+import hashlib
 import json
 import logging
 import os
+import re
+from datetime import date, datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .models import FlightDeal
+from . import config as settings
+from .merger import resolve_names
+from .profiling import phase
 
 logger = logging.getLogger(__name__)
 
+# Volatile meta fields left out of the content hash
+_UNHASHED_META = ("updated_at", "content_hash")
+_HASH_RE = re.compile(rb'"content_hash":\s*"([0-9a-f]{64})"')
+# meta is written first, so the stored hash is near the top of the file
+_HASH_SCAN_BYTES = 4096
+
 def write_atomic_json(path: Path, data: Any):
     """
     Writes data to a temporary file, flushes, fsyncs, and then renames it 
@@ -31,42 +45,232 @@ def write_atomic_json(path: Path, data: Any):
             temp_path.unlink()
         raise
 
-def finalize_outputs(deals: List[FlightDeal], flight_data_path: Path, transport_data_path: Path):
+def _write_atomic_bytes(path: Path, payload: bytes) -> None:
+    temp_path = path.with_name(path.name + ".tmp")
+    try:
+        with temp_path.open("wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(path)
+    except Exception:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+
+def content_hash(data: Any) -> str:
+    """SHA-256 of the serialized content, ignoring meta.updated_at (and the hash itself)."""
+    if isinstance(data, dict) and isinstance(data.get("meta"), dict):
+        meta = {k: v for k, v in data["meta"].items() if k not in _UNHASHED_META}
+        data = {**data, "meta": meta}
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stored_content_hash(path: Path) -> Optional[str]:
+    """The content_hash recorded in an existing output's meta, read from the file head only."""
+    try:
+        with Path(path).open("rb") as f:
+            match = _HASH_RE.search(f.read(_HASH_SCAN_BYTES))
+    except OSError:
+        return None
+    return match.group(1).decode("ascii") if match else None
+
+
+def write_compressed_variants(path: Path, payload: bytes) -> None:
+    """Precompressed ``.gz`` (and ``.br`` when brotli is installed) next to ``path`` for static serving."""
+    # mtime=0 keeps the gzip bytes deterministic
+    _write_atomic_bytes(path.with_name(path.name + ".gz"), gzip.compress(payload, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        logger.debug("brotli not installed; skipping .br variant")
+        return
+    _write_atomic_bytes(path.with_name(path.name + ".br"), brotli.compress(payload, quality=11))
+
+
+def write_output_json(path: Path, data: Any, compact: bool = False) -> bool:
     """
-    Validates deals, generates transport records, and writes final production JSONs.
+    Write a published output only if its content changed, plus its compressed
+    variants. Dict outputs carry the hash in ``meta.content_hash``, so an
+    unchanged file keeps its bytes, mtime and ``updated_at``. Other outputs
+    are compared byte for byte. ``compact`` drops the indentation (columnar
+    files would otherwise put every value on its own line). Returns True if
+    the file was written.
     """
-    # 1. Prepare flight_data.json
-    # Sort deals by origin, destination, then price for consistency
-    sorted_deals = sorted(
-        [d.to_dict() for d in deals],
-        key=lambda x: (x['origin'], x['destination'], x['price'])
+    path = Path(path)
+    has_meta = isinstance(data, dict) and isinstance(data.get("meta"), dict)
+    if has_meta:
+        digest = content_hash(data)
+        data = {**data, "meta": {**data["meta"], "content_hash": digest}}
+        unchanged = stored_content_hash(path) == digest
+    if compact:
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    if not has_meta:
+        unchanged = path.exists() and path.read_bytes() == payload
+
+    gz_missing = not path.with_name(path.name + ".gz").exists()
+    if unchanged:
+        logger.info(f"{path.name} unchanged; skipping write")
+        if gz_missing:
+            write_compressed_variants(path, path.read_bytes())
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic_bytes(path, payload)
+    write_compressed_variants(path, payload)
+    return True
+
+
+def v2_path(json_path: Path) -> Path:
+    """flight_data.json -> flight_data.v2.json"""
+    json_path = Path(json_path)
+    return json_path.with_name(f"{json_path.stem}.v2.json")
+
+
+def _utc_minutes(found_at: str) -> Optional[int]:
+    try:
+        return calendar.timegm(datetime.strptime(found_at, "%Y-%m-%d %H:%M").timetuple()) // 60
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_columnar(routes: List[Dict], meta: Dict) -> Dict:
+    """
+    The schema 2 document for ``routes`` (flight_data.v2.json): one array
+    per field under ``routes``, in record order. Airports, airlines,
+    providers, regions and currencies are indexes into the ``dict`` tables;
+    an airline is ``[code]`` or ``[code, name]`` when the name differs.
+    ``date`` is a day offset from ``meta.base_date``; ``found_at`` (minutes)
+    and ``fetchedAt`` (ms) are offsets from ``meta.base_time`` (unix
+    seconds), null when unset. ``flags``: 1 = Amadeus, 2 = estimated.
+    merger.decode_columnar is the inverse.
+    """
+    tables: Dict[str, Dict[Any, int]] = {name: {} for name in ("airport", "airline", "provider", "region", "currency")}
+
+    def index(table: str, value: Any) -> int:
+        return tables[table].setdefault(value, len(tables[table]))
+
+    for airport in sorted({r["origin"] for r in routes} | {r["destination"] for r in routes}):
+        index("airport", airport)
+    dates = [date.fromisoformat(r["date"]) for r in routes]
+    base_date = min(dates, default=date(1970, 1, 1))
+    found = [_utc_minutes(r.get("found_at") or "") for r in routes]
+    stamps = [m * 60 for m in found if m is not None] + [int(r["fetchedAt"]) // 1000 for r in routes if r.get("fetchedAt")]
+    base_time = min(stamps, default=0) // 60 * 60
+
+    columns: Dict[str, List[Any]] = {name: [] for name in (
+        "origin", "destination", "date", "price", "airline", "transfers", "flight_number",
+        "found_at", "fetchedAt", "provider", "region", "currency", "flags",
+    )}
+    for r, day, minutes in zip(routes, dates, found):
+        code, name = r.get("airline_code") or "", r.get("airline") or ""
+        columns["origin"].append(index("airport", r["origin"]))
+        columns["destination"].append(index("airport", r["destination"]))
+        columns["date"].append((day - base_date).days)
+        columns["price"].append(r["price"])
+        columns["airline"].append(index("airline", (code,) if name == code else (code, name)))
+        columns["transfers"].append(int(r.get("transfers") or 0))
+        columns["flight_number"].append(str(r.get("flight_number") or r.get("flight_num") or ""))
+        columns["found_at"].append(None if minutes is None else minutes - base_time // 60)
+        columns["fetchedAt"].append(int(r["fetchedAt"]) - base_time * 1000 if r.get("fetchedAt") else None)
+        columns["provider"].append(index("provider", r.get("provider") or ""))
+        columns["region"].append(index("region", r.get("region") or ""))
+        columns["currency"].append(index("currency", r.get("currency") or "USD"))
+        columns["flags"].append((1 if r.get("is_amadeus") else 0) | (2 if r.get("is_estimated") else 0))
+
+    return {
+        "meta": {**meta, "schema": 2, "base_date": base_date.isoformat(), "base_time": base_time},
+        "dict": {name: [list(v) if isinstance(v, tuple) else v for v in table]
+                 for name, table in tables.items()},
+        "routes": columns,
+    }
+
+
+def _canonical_key(route: Dict) -> tuple:
+    """Total order over output records, so identical data always serializes to identical bytes."""
+    return (
+        route["origin"], route["destination"], route["price"], route["date"],
+        route.get("airline_code") or "", route.get("provider") or "",
+        int(route.get("transfers") or 0), route.get("flight_number") or "",
+        route.get("airline") or "", route.get("found_at") or "",
+        int(route.get("fetchedAt") or 0), bool(route.get("is_estimated")),
     )
+
+
+def finalize_outputs(deals: List[FlightDeal], flight_data_path: Path,
+                     transport_data_path: Optional[Path] = None, error_count: int = 0):
+    """
+    Estimates calendar gaps, resolves airline names, and writes the production
+    flight_data.json (plus its binary companion), the columnar
+    flight_data.v2.json and, if requested, flight records in transport.json
+    format. Either dataset file can be switched off (WRITE_V1/WRITE_V2).
+    Destination payloads and the shared API cache are refreshed from the same
+    records when enabled.
+    """
+    # NumPy-backed; deferred so write_atomic_json users don't import it
+    from .binstore import companion_is_fresh, write_binary_companion
+    from .estimation import with_estimates
+
+    # 1. Prepare flight_data.json
+    # Re-estimate calendar gaps once here, then sort canonically (origin, destination, price, then every other field)
+    with phase("estimate"):
+        # Canonical input order too: estimates copy fields from neighbouring deals, and ties must resolve the same way
+        routes = with_estimates(sorted((d.to_dict() for d in deals), key=_canonical_key))
+    with phase("resolve_names"):
+        resolve_names(routes)
+    sorted_deals = sorted(routes, key=_canonical_key)
     
     flight_output = {
         "meta": {
-            "updated_at": deals[0].found_at if deals else "",
-            "count": len(deals),
-            "currency": "USD"
+            "updated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M"),
+            "count": len(sorted_deals),
+            "currency": "USD",
+            "errors": error_count,
         },
         "routes": sorted_deals
     }
     
-    # 2. Prepare transport.json
+    # 2. Write files atomically, skipping any whose content is unchanged
+    changed = False
+    if settings.WRITE_V1:
+        changed = write_output_json(flight_data_path, flight_output)
+        # The companion mirrors the v1 file (it records the file's content hash)
+        if settings.WRITE_BINARY_COMPANION and (changed or not companion_is_fresh(flight_data_path)):
+            write_binary_companion(sorted_deals, flight_data_path)
+    if settings.WRITE_V2:
+        with phase("encode_v2"):
+            columnar = encode_columnar(sorted_deals, flight_output["meta"])
+        changed |= write_output_json(v2_path(flight_data_path), columnar, compact=True)
+    if transport_data_path:
+        write_output_json(transport_data_path, _transport_records(sorted_deals))
+    if settings.WRITE_DESTINATIONS:
+        from .destinations import write_destination_payloads
+        with phase("destinations"):
+            write_destination_payloads(sorted_deals)
+    if settings.REDIS_URL:
+        from .cachepublish import publish_cache
+        with phase("cache_publish"):
+            publish_cache(sorted_deals)
+    
+    if changed:
+        logger.info(f"Successfully finalized outputs: {len(sorted_deals)} records written.")
+
+def _transport_records(sorted_deals: List[Dict]) -> List[Dict]:
     transport_output = []
-    for d in deals:
+    for d in sorted_deals:
         transport_output.append({
-            "id": f"flight-{d.origin}-{d.destination}-{d.date}-{d.airline_code}",
+            "id": f"flight-{d['origin']}-{d['destination']}-{d['date']}-{d['airline_code']}",
             "type": "flight",
-            "origin": d.origin,
-            "destination": d.destination,
-            "price": d.price,
+            "origin": d['origin'],
+            "destination": d['destination'],
+            "price": d['price'],
             "currency": "USD",
-            "provider": d.provider,
-            "updated_at": d.found_at
+            "provider": d['provider'],
+            "updated_at": d['found_at']
         })
 
-    # 3. Write files atomically
-    write_atomic_json(flight_data_path, flight_output)
-    write_atomic_json(transport_data_path, transport_output)
-    
-    logger.info(f"Successfully finalized outputs: {len(deals)} records written.")
+    return transport_output
@@ -1,33 +1,404 @@
+"""
+Streaming validator for the bot's published JSON files (CI gate in update_flights.yml).
+
+Records are decoded one at a time, with ijson when it is installed and an
+incremental ``json.JSONDecoder.raw_decode`` reader otherwise, so memory
+stays flat as the files grow. Each file is checked in its own process:
+
+    flight_data.json   every route against the FlightDeal schema: IATA codes,
+                       ISO dates, price bounds (config.MIN/MAX_PRICE_USD),
+                       unique idempotency keys, meta.count
+    flight_data.v2.json  the columnar schema: equal column lengths and
+                       in-range dict indexes, then the same route checks
+                       on the decoded records (loaded whole, not streamed)
+    transport.json     12Go routes: from/to, options with type, price, currency
+    price_trends.json  per route and departure month, rows of
+                       [day, min, median, count]
+
+Errors are counted per field. The exit status is 1 if any file has one.
+
+    python scripts/validate_json.py [FILE ...]
+"""
 import json
+import re
 import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-def validate():
-    paths = [
-        'client/public/data/flight_data.json',
-        'client/public/data/transport.json'
-    ]
-    
-    has_error = False
-    
-    for relative_path in paths:
-        path = Path(relative_path).resolve()
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            if not isinstance(data, (list, dict)) or len(data) == 0:
-                print(f"❌ {path.name} — empty or invalid format")
-                has_error = True
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scripts.flight_bot.config import MIN_PRICE_USD, MAX_PRICE_USD  # noqa: E402
+
+DEFAULT_PATHS = [
+    'client/public/data/flight_data.json',
+    'client/public/data/transport.json',
+]
+OPTIONAL_PATHS = [
+    'client/public/data/flight_data.v2.json',
+    'client/public/data/price_trends.json',
+]
+
+CHUNK_SIZE = 1 << 16
+MAX_EXAMPLES = 3
+
+IATA_RE = re.compile(r"^[A-Z]{3}$")
+AIRLINE_RE = re.compile(r"^[A-Z0-9]{2,3}$")
+
+
+# ─── Streaming ─────────────────────────────────────────────────────────────
+class _Reader:
+    """Incremental JSON reader: walks one level of containers, decoding members one by one."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer stays about one record long
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"expected {' or '.join(repr(c) for c in chars)}, got {ch or 'end of file'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self) -> Iterator[Tuple[Any, Any]]:
+        """(key, value) of the object, or (index, value) of the array, starting at the cursor."""
+        opening = self.expect("{[")
+        closing = "}" if opening == "{" else "]"
+        if self.peek() == closing:
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            if opening == "{":
+                key = self.value()
+                self.expect(":")
             else:
-                print(f"✅ {path.name} — {len(data)} records")
-                
-        except Exception as e:
-            print(f"❌ {path.name} — failed to parse: {e}")
-            has_error = True
+                key = index
+            yield key, self
+            index += 1
+            if self.expect("," + closing) == closing:
+                return
+
+
+def _ijson():
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+
+def stream_document(path: Path, container: str,
+                    on_member: Callable[[Any, Any], None]) -> Dict[str, Any]:
+    """
+    Call ``on_member(key, value)`` for every member of the top-level ``container``
+    (an array or object); returns the document's other top-level members.
+    A document that is itself an array is streamed directly. With ijson the
+    container is handed to it, and only members before it are returned
+    (the writers put meta first).
+    """
+    ijson = _ijson()
+    header: Dict[str, Any] = {}
+    with path.open("r", encoding="utf-8") as f:
+        reader = _Reader(f)
+        if reader.peek() == "[":
+            for key, r in reader.members():
+                on_member(key, r.value())
+        else:
+            for key, r in reader.members():
+                if key != container:
+                    header[key] = r.value()
+                elif ijson is not None:
+                    _stream_ijson(ijson, path, container, reader.peek() == "{", on_member)
+                    return header
+                else:
+                    for member_key, mr in r.members():
+                        on_member(member_key, mr.value())
+        if reader.peek():
+            raise ValueError("trailing data after the JSON document")
+    return header
+
+
+def _stream_ijson(ijson, path: Path, container: str, is_object: bool,
+                  on_member: Callable[[Any, Any], None]) -> None:
+    with path.open("rb") as raw:
+        if is_object:
+            for key, value in ijson.kvitems(raw, container, use_float=True):
+                on_member(key, value)
+        else:
+            for index, value in enumerate(ijson.items(raw, f"{container}.item", use_float=True)):
+                on_member(index, value)
+
+
+# ─── Reports ───────────────────────────────────────────────────────────────
+class Report:
+    def __init__(self, path: Path, allow_empty: bool = False):
+        self.path = path
+        self.allow_empty = allow_empty
+        self.records = 0
+        self.errors: Counter = Counter()
+        self.examples: Dict[str, List[str]] = defaultdict(list)
+        self.fatal: Optional[str] = None
+        self.seconds = 0.0
+
+    def error(self, field: str, where: Any, detail: str) -> None:
+        self.errors[field] += 1
+        if len(self.examples[field]) < MAX_EXAMPLES:
+            self.examples[field].append(f"#{where}: {detail}")
+
+    @property
+    def ok(self) -> bool:
+        return not self.fatal and not self.errors and (self.records > 0 or self.allow_empty)
+
+    def render(self) -> str:
+        name = self.path.name
+        if self.fatal:
+            return f"❌ {name} — {self.fatal}"
+        if not self.records and not self.allow_empty:
+            return f"❌ {name} — no records"
+        if not self.errors:
+            return f"✅ {name} — {self.records} records valid ({self.seconds:.2f}s)"
+        lines = [f"❌ {name} — {sum(self.errors.values())} errors in {self.records} records"]
+        for field, count in self.errors.most_common():
+            lines.append(f"   {field:<16} {count:>7}   e.g. {'; '.join(self.examples[field])}")
+        return "\n".join(lines)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_date(report: Report, field: str, where: Any, value: Any) -> None:
+    try:
+        date.fromisoformat(value)
+    except (TypeError, ValueError):
+        report.error(field, where, f"not an ISO date: {value!r}")
+
+
+# ─── Schemas ───────────────────────────────────────────────────────────────
+def _route_checker(report: Report) -> Callable[[Any, Any], None]:
+    """Per-record check of flight_data routes (both schemas, v2 after decoding)."""
+    seen = set()
+
+    def check(i: Any, r: Any) -> None:
+        report.records += 1
+        if not isinstance(r, dict):
+            report.error("record", i, f"not an object: {type(r).__name__}")
+            return
+        for field in ("origin", "destination"):
+            if not IATA_RE.match(str(r.get(field, ""))):
+                report.error(field, i, f"not an IATA code: {r.get(field)!r}")
+        if r.get("origin") == r.get("destination"):
+            report.error("route", i, f"origin equals destination: {r.get('origin')!r}")
+        _check_date(report, "date", i, r.get("date"))
+        price = r.get("price")
+        if not _is_number(price):
+            report.error("price", i, f"not a number: {price!r}")
+        elif not MIN_PRICE_USD <= price <= MAX_PRICE_USD:
+            report.error("price", i, f"{price} outside {MIN_PRICE_USD}-{MAX_PRICE_USD}")
+        code = r.get("airline_code") or ""
+        if code and not AIRLINE_RE.match(code):
+            report.error("airline_code", i, f"not an airline code: {code!r}")
+        transfers = r.get("transfers", 0)
+        if not isinstance(transfers, int) or isinstance(transfers, bool) or transfers < 0:
+            report.error("transfers", i, f"not a non-negative integer: {transfers!r}")
+        found_at = r.get("found_at")
+        if found_at:
+            try:
+                datetime.strptime(found_at, "%Y-%m-%d %H:%M")
+            except (TypeError, ValueError):
+                report.error("found_at", i, f"not 'YYYY-MM-DD HH:MM': {found_at!r}")
+        fetched_at = r.get("fetchedAt", 0)
+        if not isinstance(fetched_at, int) or fetched_at < 0:
+            report.error("fetchedAt", i, f"not a unix ms timestamp: {fetched_at!r}")
+
+        # FlightDeal.get_idempotency_key
+        key = f"{r.get('origin')}-{r.get('destination')}-{r.get('date')}-{code}"
+        if key in seen:
+            report.error("idempotency_key", i, f"duplicate {key}")
+        seen.add(key)
+
+    return check
+
+
+def _validate_flight_data(path: Path, report: Report) -> None:
+    header = stream_document(path, "routes", _route_checker(report))
+    count = (header.get("meta") or {}).get("count")
+    if count is not None and count != report.records:
+        report.error("meta.count", "meta", f"{count} != {report.records} records")
+
+
+def _validate_flight_data_v2(path: Path, report: Report) -> None:
+    # Columns cannot be checked record by record while streaming; the compact file is small enough to load
+    from scripts.flight_bot.merger import decode_columnar
+
+    with path.open("r", encoding="utf-8") as f:
+        doc = json.load(f)
+    meta, tables, columns = doc.get("meta") or {}, doc.get("dict") or {}, doc.get("routes") or {}
+    if meta.get("schema") != 2:
+        report.error("meta.schema", "meta", f"{meta.get('schema')!r} != 2")
+        return
+    lengths = {name: len(values) for name, values in columns.items()}
+    if len(set(lengths.values())) > 1:
+        report.error("columns", "routes", f"unequal lengths: {lengths}")
+        return
+    for column, table in (("origin", "airport"), ("destination", "airport"), ("airline", "airline"),
+                          ("provider", "provider"), ("region", "region"), ("currency", "currency")):
+        size = len(tables.get(table) or [])
+        bad = [i for i in columns.get(column, []) if not isinstance(i, int) or not 0 <= i < size]
+        if bad:
+            report.error(column, "routes", f"{len(bad)} indexes outside dict.{table} ({size} entries)")
+    if report.errors:
+        return
+
+    check = _route_checker(report)
+    for i, r in enumerate(decode_columnar(doc)["routes"]):
+        check(i, r)
+    count = meta.get("count")
+    if count is not None and count != report.records:
+        report.error("meta.count", "meta", f"{count} != {report.records} records")
+
+
+def _validate_transport(path: Path, report: Report) -> None:
+    def check(i: int, r: Any) -> None:
+        report.records += 1
+        if not isinstance(r, dict):
+            report.error("record", i, f"not an object: {type(r).__name__}")
+            return
+        for field in ("from", "to"):
+            if not isinstance(r.get(field), str) or not r.get(field):
+                report.error(field, i, f"missing or empty: {r.get(field)!r}")
+        options = r.get("options")
+        if not isinstance(options, list) or not options:
+            report.error("options", i, "missing or empty")
+            return
+        for option in options:
+            if not isinstance(option, dict) or not option.get("type"):
+                report.error("options.type", i, f"missing in {option!r:.60}")
+                continue
+            price = option.get("price")
+            if not _is_number(price) or price < 0:
+                report.error("options.price", i, f"not a non-negative number: {price!r}")
+            if not isinstance(option.get("currency"), str) or len(option["currency"]) != 3:
+                report.error("options.currency", i, f"not a currency code: {option.get('currency')!r}")
+
+    header = stream_document(path, "routes", check)
+    total = header.get("totalRoutes")
+    if total is not None and total != report.records:
+        report.error("totalRoutes", "header", f"{total} != {report.records} routes")
+
+
+def _validate_trends(path: Path, report: Report) -> None:
+    def check(route: str, months: Any) -> None:
+        report.records += 1
+        parts = str(route).split("-")
+        if len(parts) != 2 or not all(IATA_RE.match(p) for p in parts):
+            report.error("route", route, "not ORIGIN-DEST")
+        if not isinstance(months, dict):
+            report.error("months", route, "not an object keyed by departure month")
+            return
+        for month, rows in months.items():
+            where = f"{route} {month}"
+            _check_date(report, "month", where, f"{month}-01")
+            if not isinstance(rows, list):
+                report.error("rows", where, "not a list")
+                continue
+            for row in rows:
+                if not isinstance(row, list) or len(row) != 4:
+                    report.error("rows", where, f"not [day, min, median, count]: {row!r}")
+                    continue
+                _check_date(report, "day", where, row[0])
+                if not (_is_number(row[1]) and _is_number(row[2]) and row[1] <= row[2]):
+                    report.error("min/median", where, f"{row[1]!r} / {row[2]!r}")
+
+    stream_document(path, "routes", check)
+
+
+def _validator_for(path: Path) -> Callable[[Path, Report], None]:
+    if path.name.startswith("transport"):
+        return _validate_transport
+    if path.name.startswith("price_trends"):
+        return _validate_trends
+    if path.name.endswith(".v2.json"):
+        return _validate_flight_data_v2
+    return _validate_flight_data
+
+
+def validate_file(path: Path) -> Report:
+    # A fresh price history has no trends yet
+    report = Report(path, allow_empty=_validator_for(path) is _validate_trends)
+    started = time.monotonic()
+    try:
+        _validator_for(path)(path, report)
+    except FileNotFoundError:
+        report.fatal = "file not found"
+    except Exception as e:
+        report.fatal = f"failed to parse after {report.records} records: {e}"
+    report.seconds = time.monotonic() - started
+    return report
+
+
+def validate(paths: Optional[List[str]] = None):
+    if paths:
+        files = [Path(p).resolve() for p in paths]
+    else:
+        files = [(ROOT / p) for p in DEFAULT_PATHS]
+        files += [ROOT / p for p in OPTIONAL_PATHS if (ROOT / p).exists()]
+
+    with ProcessPoolExecutor(max_workers=len(files)) as pool:
+        reports = list(pool.map(validate_file, files))
+
+    has_error = False
+    for report in reports:
+        print(report.render())
+        has_error |= not report.ok
 
     if has_error:
         sys.exit(1)
 
 if __name__ == '__main__':
-    validate()
+    validate(sys.argv[1:])